@@ -0,0 +1,65 @@
+import os
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from ..database import db
+
+JOURNAL_TOKEN = os.getenv("JOURNAL_TOKEN")
+
+def require_journal_token(x_journal_token: Optional[str] = Header(None)):
+    """The audit trail is off unless JOURNAL_TOKEN is set, and then needs it in X-Journal-Token"""
+    if not JOURNAL_TOKEN:
+        raise HTTPException(status_code=404, detail="Event journal endpoints are disabled (set JOURNAL_TOKEN)")
+    if not x_journal_token or not secrets.compare_digest(x_journal_token, JOURNAL_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid journal token")
+
+router = APIRouter(dependencies=[Depends(require_journal_token)])
+
+@router.get("/events")
+def list_events(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    reg_no: Optional[str] = None,
+    event_type: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=10000)
+):
+    """
+    Most recent journal events matching the filters, oldest first.
+    start/end are ISO datetimes. Plain def: journal reads run in the threadpool,
+    off the event loop that serves /api/verify.
+    """
+    try:
+        events = db.query_events(start, end, reg_no, event_type, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"count": len(events), "events": events}
+
+@router.get("/events/export")
+def export_events(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    reg_no: Optional[str] = None,
+    event_type: Optional[str] = None,
+    format: str = Query("jsonl", pattern="^(jsonl|csv)$")
+):
+    """
+    Streams every matching event as JSON lines or CSV.
+    """
+    try:
+        chunks = db.export_events(fmt=format, start=start, end=end, reg_no=reg_no, event_type=event_type)
+        first = next(chunks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def body():
+        yield first
+        yield from chunks
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type,
+                             headers={"Content-Disposition": f"attachment; filename=events.{format}"})
+
+@router.get("/events/stats")
+def event_stats():
+    return db.journal.stats()
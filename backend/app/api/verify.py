@@ -46,7 +46,7 @@ async def verify_gatepass(
             "confidence": f"{1 - score_or_reason:.2f}" if isinstance(score_or_reason, float) else "N/A"
         }
     else:
-        db.log_event("VERIFY_FAIL", {"user": user_name, "reason": "FACE_MISMATCH"})
+        db.log_event("VERIFY_FAIL", {"user": user_name, "roll": user_roll, "reason": "FACE_MISMATCH"})
         return {
             "status": "FAIL",
             "reason": "FACE_MISMATCH",
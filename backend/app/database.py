@@ -1,14 +1,33 @@
 # database.py - Placeholder for database integration (PostgreSQL/Supabase)
 import logging
+import os
+
+from .event_journal import EventJournal
 
 logger = logging.getLogger(__name__)
 
 class Database:
     def __init__(self):
         self.connected = True
+        self.journal = EventJournal(
+            os.getenv("EVENT_JOURNAL_DIR", "Storage/Events"),
+            segment_bytes=int(os.getenv("EVENT_SEGMENT_MB", "64")) * 1024 * 1024,
+            retention_days=int(os.getenv("EVENT_RETENTION_DAYS", "90")),
+        )
         logger.info("Connected to placeholder database")
 
     def log_event(self, event_type, data):
-        logger.info(f"EVENT [{event_type}]: {data}")
+        # Buffered append only; the journal thread does the file I/O
+        self.journal.append(event_type, data, reg_no=data.get("roll") or data.get("reg_no"))
+        logger.debug(f"EVENT [{event_type}]: {data}")
+
+    def query_events(self, start=None, end=None, reg_no=None, event_type=None, limit=100):
+        return self.journal.query(start, end, reg_no, event_type, limit)
+
+    def export_events(self, fmt="jsonl", **filters):
+        return self.journal.export_chunks(fmt=fmt, **filters)
+
+    def close(self):
+        self.journal.close()
 
 db = Database()
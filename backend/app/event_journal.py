@@ -0,0 +1,378 @@
+# event_journal.py - Append-only audit journal with group commit
+"""
+Events are appended to an in-memory buffer (a deque append, a few
+microseconds) and written by a background thread in batches: one write and
+one fsync per flush_interval or flush_records, whichever comes first.
+
+Files live in <directory>/:
+    events-<first ts ms>.jsonl   one JSON object per line {"ts", "type", "reg_no", "data"}
+    events-<first ts ms>.idx     sidecar index written when a segment is sealed:
+                                 time range, count, sparse (ts, offset) marks and
+                                 the byte offsets of every event per reg_no
+
+A segment is sealed once it passes segment_bytes or gets older than
+segment_seconds; sealed segments older than retention_days are deleted. A crash loses at most the last unflushed batch;
+a torn final line is truncated and a missing index rebuilt on start-up.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+SPARSE_EVERY = 256  # one (ts, offset) mark per this many events
+
+
+def _to_epoch(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.fromisoformat(value).timestamp()
+
+
+class _SegmentIndex:
+    def __init__(self, first_ts=None):
+        self.first_ts = first_ts
+        self.last_ts = None
+        self.count = 0
+        self.marks = []  # [(ts, offset)] every SPARSE_EVERY events
+        self.reg_nos = {}  # reg_no -> [offset, ...]
+
+    def add(self, ts, reg_no, offset):
+        if self.first_ts is None:
+            self.first_ts = ts
+        if self.count % SPARSE_EVERY == 0:
+            self.marks.append((ts, offset))
+        self.last_ts = ts
+        self.count += 1
+        if reg_no:
+            self.reg_nos.setdefault(reg_no, []).append(offset)
+
+    def overlaps(self, start, end):
+        if self.first_ts is None:
+            return False
+        return (start is None or self.last_ts >= start) and (end is None or self.first_ts <= end)
+
+    def start_offset(self, start):
+        """Byte offset from which every event at or after start is reached"""
+        offset = 0
+        for ts, mark in self.marks:
+            if start is not None and ts < start:
+                offset = mark
+            else:
+                break
+        return offset
+
+    def to_dict(self):
+        return {"first_ts": self.first_ts, "last_ts": self.last_ts, "count": self.count,
+                "marks": self.marks, "reg_nos": self.reg_nos}
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls(data["first_ts"])
+        index.last_ts = data["last_ts"]
+        index.count = data["count"]
+        index.marks = [tuple(mark) for mark in data["marks"]]
+        index.reg_nos = data["reg_nos"]
+        return index
+
+
+class EventJournal:
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, segment_seconds=86400,
+                 flush_interval=0.05, flush_records=1000, retention_days=90):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.retention_days = retention_days
+        os.makedirs(directory, exist_ok=True)
+
+        self._buffer = deque()
+        self._wakeup = threading.Event()
+        self._flushed = threading.Condition()
+        self._appended = 0
+        self._written = 0
+        self._closed = False
+        self._io_lock = threading.Lock()  # writer vs readers of the active segment
+        self._sealed = {}  # segment name -> _SegmentIndex
+        self._active_name = None
+        self._active = None
+        self._active_index = None
+
+        self._recover()
+        self._writer = threading.Thread(target=self._run, name="event-journal", daemon=True)
+        self._writer.start()
+
+    # Hot path
+
+    def append(self, event_type, data, reg_no=None):
+        """Queue an event; never blocks on I/O"""
+        self._buffer.append((time.time(), event_type, reg_no, data))
+        self._appended += 1
+        if len(self._buffer) >= self.flush_records:
+            self._wakeup.set()
+
+    # Writer
+
+    def _segments(self):
+        return sorted(name[:-len(".jsonl")] for name in os.listdir(self.directory)
+                      if name.startswith("events-") and name.endswith(".jsonl"))
+
+    def _path(self, name, ext):
+        return os.path.join(self.directory, f"{name}.{ext}")
+
+    def _recover(self):
+        segments = self._segments()
+        for name in segments:
+            idx_path = self._path(name, "idx")
+            if os.path.exists(idx_path):
+                with open(idx_path) as f:
+                    self._sealed[name] = _SegmentIndex.from_dict(json.load(f))
+            else:
+                self._sealed[name] = self._rebuild_index(name)
+        # Keep appending to the newest segment if it has room
+        if segments and os.path.getsize(self._path(segments[-1], "jsonl")) < self.segment_bytes:
+            name = segments[-1]
+            self._active_index = self._sealed.pop(name)
+            self._open_active(name)
+            idx_path = self._path(name, "idx")
+            if os.path.exists(idx_path):
+                os.remove(idx_path)
+        self._apply_retention()
+
+    def _rebuild_index(self, name):
+        """Scan a segment left without an index, truncating a torn final line"""
+        path = self._path(name, "jsonl")
+        index = _SegmentIndex()
+        offset = 0
+        with open(path, "rb+") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    f.truncate(offset)
+                    logger.warning(f"Truncated a torn event record at {path}:{offset}")
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    f.truncate(offset)
+                    logger.warning(f"Truncated a corrupt event record at {path}:{offset}")
+                    break
+                index.add(record["ts"], record.get("reg_no"), offset)
+                offset += len(line)
+        return index
+
+    def _open_active(self, name):
+        self._active_name = name
+        self._active = open(self._path(name, "jsonl"), "ab")
+
+    def _seal_active(self):
+        self._active.close()
+        with open(self._path(self._active_name, "idx.tmp"), "w") as f:
+            json.dump(self._active_index.to_dict(), f)
+        os.replace(self._path(self._active_name, "idx.tmp"), self._path(self._active_name, "idx"))
+        self._sealed[self._active_name] = self._active_index
+        self._active = self._active_name = self._active_index = None
+
+    def _apply_retention(self):
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        for name, index in list(self._sealed.items()):
+            if index.last_ts is not None and index.last_ts < cutoff:
+                for ext in ("jsonl", "idx"):
+                    if os.path.exists(self._path(name, ext)):
+                        os.remove(self._path(name, ext))
+                del self._sealed[name]
+                logger.info(f"Event segment {name} removed by retention")
+
+    def _write_batch(self):
+        batch = []
+        while self._buffer:
+            batch.append(self._buffer.popleft())
+        if not batch:
+            return
+        try:
+            with self._io_lock:
+                if self._active is None:
+                    self._active_index = _SegmentIndex()
+                    self._open_active(f"events-{int(batch[0][0] * 1000)}")
+                offset = self._active.tell()
+                chunks = []
+                for ts, event_type, reg_no, data in batch:
+                    line = json.dumps({"ts": round(ts, 6), "type": event_type, "reg_no": reg_no, "data": data},
+                                      separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+                    self._active_index.add(ts, reg_no, offset)
+                    offset += len(line)
+                    chunks.append(line)
+                self._active.write(b"".join(chunks))
+                self._active.flush()
+                os.fsync(self._active.fileno())  # group commit: one fsync per batch
+                if offset >= self.segment_bytes or time.time() - self._active_index.first_ts >= self.segment_seconds:
+                    self._seal_active()
+                    self._apply_retention()
+        finally:
+            # Counted even on failure so flush() callers are not left waiting
+            with self._flushed:
+                self._written += len(batch)
+                self._flushed.notify_all()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self._write_batch()
+            except Exception as e:
+                logger.error(f"Event journal write failed: {e}")
+        self._write_batch()
+
+    def flush(self, timeout=5.0):
+        """Block until everything appended so far is on disk"""
+        target = self._appended
+        self._wakeup.set()
+        with self._flushed:
+            return self._flushed.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self):
+        self.flush()
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join(timeout=5.0)
+        with self._io_lock:
+            if self._active is not None:
+                self._active.close()
+
+    # Queries
+
+    def _read_segment(self, name, index, start, end, reg_no, event_type):
+        path = self._path(name, "jsonl")
+        with open(path, "rb") as f:
+            if reg_no:
+                offsets = index.reg_nos.get(reg_no, [])
+                lines = []
+                for offset in offsets:
+                    f.seek(offset)
+                    lines.append(f.readline())
+            else:
+                f.seek(index.start_offset(start))
+                lines = f
+            for line in lines:
+                if not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                if start is not None and record["ts"] < start:
+                    continue
+                if end is not None and record["ts"] > end:
+                    if not reg_no:
+                        break
+                    continue
+                if event_type and record["type"] != event_type:
+                    continue
+                record["time"] = datetime.fromtimestamp(record["ts"]).isoformat()
+                yield record
+
+    def _read_segment_reverse(self, name, index, size, start, end, reg_no, event_type):
+        """Like _read_segment but newest first, one sparse-mark block at a time"""
+        with open(self._path(name, "jsonl"), "rb") as f:
+            if reg_no:
+                blocks = [[offset] for offset in reversed(index.reg_nos.get(reg_no, []))]
+            else:
+                bounds = [offset for _, offset in index.marks] + [size]
+                blocks = [(index.marks[i][0], bounds[i], bounds[i + 1]) for i in reversed(range(len(index.marks)))]
+            for block in blocks:
+                if reg_no:
+                    f.seek(block[0])
+                    lines = [f.readline()]
+                else:
+                    first_ts, begin, stop = block
+                    if end is not None and first_ts > end:
+                        continue
+                    f.seek(begin)
+                    lines = f.read(stop - begin).splitlines(keepends=True)
+                for line in reversed(lines):
+                    if not line.endswith(b"\n"):
+                        continue
+                    record = json.loads(line)
+                    if start is not None and record["ts"] < start:
+                        if not reg_no:
+                            return  # everything earlier in the segment is older still
+                        continue
+                    if end is not None and record["ts"] > end:
+                        continue
+                    if event_type and record["type"] != event_type:
+                        continue
+                    record["time"] = datetime.fromtimestamp(record["ts"]).isoformat()
+                    yield record
+
+    def _snapshot(self):
+        """[(name, index, bytes on disk)] oldest first, including the active segment"""
+        self.flush()
+        with self._io_lock:
+            segments = [(name, index, None) for name, index in sorted(self._sealed.items())]
+            if self._active_index is not None:
+                # Snapshot of the active segment's index up to what is already on disk
+                active = _SegmentIndex.from_dict(json.loads(json.dumps(self._active_index.to_dict())))
+                segments.append((self._active_name, active, self._active.tell()))
+        return segments
+
+    def iter_events(self, start=None, end=None, reg_no=None, event_type=None):
+        """Events in time order; start/end are epoch seconds or ISO datetimes"""
+        start, end = _to_epoch(start), _to_epoch(end)
+        for name, index, _ in self._snapshot():
+            if index.overlaps(start, end) and (not reg_no or reg_no in index.reg_nos):
+                yield from self._read_segment(name, index, start, end, reg_no, event_type)
+
+    def iter_events_reverse(self, start=None, end=None, reg_no=None, event_type=None):
+        """Events newest first, so recent-history queries stop after the last segment or two"""
+        start, end = _to_epoch(start), _to_epoch(end)
+        for name, index, size in reversed(self._snapshot()):
+            if index.overlaps(start, end) and (not reg_no or reg_no in index.reg_nos):
+                if size is None:
+                    size = os.path.getsize(self._path(name, "jsonl"))
+                yield from self._read_segment_reverse(name, index, size, start, end, reg_no, event_type)
+
+    def query(self, start=None, end=None, reg_no=None, event_type=None, limit=100):
+        """Newest-last list of at most limit matching events (the most recent ones)"""
+        result = list(islice(self.iter_events_reverse(start, end, reg_no, event_type), limit))
+        result.reverse()
+        return result
+
+    def export(self, out, fmt="jsonl", **filters):
+        """Write matching events to a text stream as JSON lines or CSV"""
+        for chunk in self.export_chunks(fmt=fmt, **filters):
+            out.write(chunk)
+
+    def export_chunks(self, fmt="jsonl", chunk_events=500, **filters):
+        """Export text in chunks of chunk_events events, for streaming responses"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer:
+            writer.writerow(["time", "type", "reg_no", "data"])
+        for i, record in enumerate(self.iter_events(**filters), start=1):
+            if writer:
+                writer.writerow([record["time"], record["type"], record["reg_no"] or "",
+                                 json.dumps(record["data"], default=str)])
+            else:
+                buffer.write(json.dumps(record, default=str) + "\n")
+            if i % chunk_events == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def stats(self):
+        with self._io_lock:
+            indexes = list(self._sealed.values()) + ([self._active_index] if self._active_index else [])
+        return {
+            "segments": len(indexes),
+            "events": sum(index.count for index in indexes),
+            "buffered": len(self._buffer),
+            "bytes": sum(os.path.getsize(self._path(name, "jsonl")) for name in self._segments()),
+        }
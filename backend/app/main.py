@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .api import verify
+from .api import verify, events
+from .database import db
 
 app = FastAPI(
     title="IoT Smart Gate Pass API",
@@ -19,6 +20,11 @@ app.add_middleware(
 
 # Include routers
 app.include_router(verify.router, prefix="/api", tags=["Verification"])
+app.include_router(events.router, prefix="/api", tags=["Events"])
+
+@app.on_event("shutdown")
+def flush_event_journal():
+    db.close()
 
 @app.get("/")
 async def root():
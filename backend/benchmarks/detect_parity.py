@@ -0,0 +1,113 @@
+"""
+Latency and accuracy of capped-resolution face detection against full-resolution MTCNN.
+
+Run from the backend folder:
+    python -m benchmarks.detect_parity --faces path/to/photos
+    python -m benchmarks.detect_parity --long-sides 640,1920,4000 --caps 0,480,640,960
+
+Every photo is resized to each long side (4000 is a 12 MP phone shot, 1920 a
+1080p gate frame), JPEG encoded and embedded through FaceService.get_embedding
+once per detection cap (0 = full resolution, the reference). For each cap the
+report shows median latency, detections found vs the reference, and the cosine
+distance between its embedding and the reference embedding of the same image.
+Distances far below the 0.6 match threshold mean the same accept/reject
+decisions. Needs torch and facenet-pytorch; without --faces synthetic faces are
+used, which MTCNN may not detect.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from scipy.spatial.distance import cosine
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.hot_paths import load_face_images  # noqa: E402
+from benchmarks.storage_latency import percentile  # noqa: E402
+from services.image_decode import decode_image  # noqa: E402
+
+
+def resized_jpeg(rgb, long_side):
+    height, width = rgb.shape[:2]
+    scale = long_side / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    img = cv2.resize(rgb, size, interpolation=interpolation)
+    return cv2.imencode(".jpg", cv2.cvtColor(img, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes()
+
+
+def run(service, images, long_sides, caps, repeats):
+    results = {}
+    for long_side in long_sides:
+        inputs = [resized_jpeg(img, long_side) for img in images]
+        reference = {}
+        for cap in caps:
+            service.detect_max_side = cap
+            samples, embeddings = [], []
+            for data in inputs:
+                service.get_embedding(data)  # warm-up
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    embedding = service.get_embedding(data)
+                samples.append((time.perf_counter() - start) * 1000 / repeats)
+                embeddings.append(embedding)
+            if cap == 0:
+                reference = embeddings
+            distances = [cosine(e.flatten(), r.flatten()) for e, r in zip(embeddings, reference)
+                         if e is not None and r is not None]
+            results[f"{long_side}px/cap={cap or 'full'}"] = {
+                "median_ms": round(percentile(samples, 50), 2),
+                "p95_ms": round(percentile(samples, 95), 2),
+                "detected": sum(e is not None for e in embeddings),
+                "reference_detected": sum(r is not None for r in reference),
+                "median_distance": round(float(np.median(distances)), 4) if distances else None,
+                "max_distance": round(float(max(distances)), 4) if distances else None,
+            }
+    return results
+
+
+def print_report(results, total):
+    print("\n" + "=" * 92)
+    print(f"{'case':<26}{'median ms':>11}{'p95 ms':>10}{'detected':>12}{'median dist':>14}{'max dist':>12}")
+    print("-" * 92)
+    for case, row in results.items():
+        detected = f"{row['detected']}/{total}"
+        median = "-" if row["median_distance"] is None else f"{row['median_distance']:.4f}"
+        worst = "-" if row["max_distance"] is None else f"{row['max_distance']:.4f}"
+        print(f"{case:<26}{row['median_ms']:>11.1f}{row['p95_ms']:>10.1f}{detected:>12}{median:>14}{worst:>12}")
+    print("=" * 92)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", help="directory of real face photos (default: synthetic faces)")
+    parser.add_argument("--long-sides", default="640,1920,4000", help="input resolutions to test")
+    parser.add_argument("--caps", default="0,480,640,960", help="detection caps; 0 is the full-resolution reference")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    caps = [int(c) for c in args.caps.split(",")]
+    if caps[0] != 0:
+        caps.insert(0, 0)
+
+    from services.face_service import FaceService
+    service = FaceService(known_faces_dir=tempfile.mkdtemp(prefix="bench_faces_"))
+    # Full-resolution sources, so every long side is resampled from the same pixels
+    images = [decode_image(data, max_side=100000) for data in load_face_images(args)]
+    print(f"Embedding {len(images)} photo(s) at {args.long_sides} px with caps {caps}...")
+
+    results = run(service, images, [int(s) for s in args.long_sides.split(",")], caps, args.repeats)
+    print_report(results, len(images))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Speed versus detection rate of the interchangeable face detectors.
+
+Run from the backend folder:
+    python -m benchmarks.detectors --faces path/to/photos
+    python -m benchmarks.detectors --faces photos --negatives no_faces \\
+        --detectors mtcnn,haar,lbp,dnn --model lbp=lbpcascade_frontalface_improved.xml \\
+        --model dnn=face_detection_yunet_2023mar.onnx
+
+Every photo is scaled to --long-side (the gate camera frame) and run through
+each detector from services/face_detectors.py. The report shows median/p95
+latency per frame, frames per second, the share of --faces photos with a
+face found and, with --negatives, the share of face-free photos where one
+was reported anyway. MTCNN is the reference: "IoU" is the median overlap of
+each detector's largest box with MTCNN's, which matters because MTCNN.extract
+crops the FaceNet input from that box. Detectors whose model file or OpenCV
+support is missing are skipped with a note; MTCNN needs torch and
+facenet-pytorch. Without --faces synthetic faces are used.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.hot_paths import load_face_images  # noqa: E402
+from benchmarks.storage_latency import percentile  # noqa: E402
+from services.face_detectors import DETECTORS, make_detector  # noqa: E402
+from services.image_decode import decode_image  # noqa: E402
+
+
+def load_frames(data, long_side):
+    frames = []
+    for item in data:
+        img = decode_image(item, max_side=100000)
+        scale = long_side / max(img.shape[:2])
+        if scale != 1:
+            size = (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale)))
+            img = cv2.resize(img, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC)
+        frames.append(np.ascontiguousarray(img))
+    return frames
+
+
+def load_negatives(directory):
+    paths = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                   if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    return [open(path, "rb").read() for path in paths[:64]]
+
+
+def build_detectors(names, models):
+    detectors = {}
+    for name in names:
+        mtcnn = None
+        try:
+            if name == "mtcnn":
+                from facenet_pytorch import MTCNN
+                mtcnn = MTCNN(image_size=160, margin=20, min_face_size=40, thresholds=[0.6, 0.7, 0.7],
+                              factor=0.709, post_process=True, device="cpu")
+            detectors[name] = make_detector(name, models.get(name), mtcnn=mtcnn)
+        except (ImportError, ValueError, RuntimeError, OSError, cv2.error) as e:
+            print(f"⚠️  Skipping {name}: {e}")
+    return detectors
+
+
+def iou(a, b):
+    width = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    height = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    overlap = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - overlap
+    return overlap / union if union > 0 else 0.0
+
+
+def run(detectors, faces, negatives, repeats):
+    results, largest = {}, {}
+    for name, detector in detectors.items():
+        samples, found = [], []
+        for frame in faces + negatives:
+            detector.detect(frame)  # warm-up
+            start = time.perf_counter()
+            for _ in range(repeats):
+                result = detector.detect(frame)
+            samples.append((time.perf_counter() - start) * 1000 / repeats)
+            found.append(result)
+        largest[name] = [None if r is None else r[0][0] for r in found[:len(faces)]]
+        median = percentile(samples, 50)
+        results[name] = {
+            "median_ms": round(median, 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+            "fps": round(1000 / median, 1) if median else None,
+            "detection_rate": round(sum(r is not None for r in found[:len(faces)]) / len(faces), 3),
+            "false_positive_rate": (round(sum(r is not None for r in found[len(faces):]) / len(negatives), 3)
+                                    if negatives else None),
+            "landmarks": any(r is not None and r[2] is not None for r in found),
+        }
+    reference = largest.get("mtcnn")
+    for name, row in results.items():
+        overlaps = [iou(box, ref) for box, ref in zip(largest[name], reference or [])
+                    if box is not None and ref is not None]
+        row["median_iou"] = round(float(np.median(overlaps)), 3) if overlaps else None
+    return results
+
+
+def print_report(results, total, negatives):
+    print("\n" + "=" * 84)
+    print(f"{'detector':<10}{'median ms':>11}{'p95 ms':>10}{'fps':>8}{'detected':>12}"
+          f"{'false pos':>12}{'IoU':>9}{'landmarks':>12}")
+    print("-" * 84)
+    for name, row in results.items():
+        detected = f"{round(row['detection_rate'] * total)}/{total}"
+        false_pos = "-" if row["false_positive_rate"] is None else f"{round(row['false_positive_rate'] * negatives)}/{negatives}"
+        overlap = "-" if row["median_iou"] is None else f"{row['median_iou']:.3f}"
+        print(f"{name:<10}{row['median_ms']:>11.1f}{row['p95_ms']:>10.1f}{row['fps'] or 0:>8.1f}{detected:>12}"
+              f"{false_pos:>12}{overlap:>9}{'yes' if row['landmarks'] else 'no':>12}")
+    print("=" * 84)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", help="directory of photos with a face each (default: synthetic faces)")
+    parser.add_argument("--negatives", help="directory of photos without faces, for the false positive rate")
+    parser.add_argument("--detectors", default=",".join(DETECTORS), help="detectors to compare")
+    parser.add_argument("--model", action="append", default=[], metavar="NAME=PATH",
+                        help="model file for a detector (lbp cascade .xml, dnn .onnx/.caffemodel)")
+    parser.add_argument("--long-side", type=int, default=640, help="frame size the detectors see")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    models = dict(m.split("=", 1) for m in args.model)
+
+    detectors = build_detectors([d.strip() for d in args.detectors.split(",") if d.strip()], models)
+    if not detectors:
+        print("❌ No detector could be loaded")
+        return
+    faces = load_frames(load_face_images(args), args.long_side)
+    negatives = load_frames(load_negatives(args.negatives), args.long_side) if args.negatives else []
+    print(f"Running {', '.join(detectors)} on {len(faces)} face and {len(negatives)} negative frame(s) "
+          f"at {args.long_side} px...")
+
+    results = run(detectors, faces, negatives, args.repeats)
+    print_report(results, len(faces), len(negatives))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Offline benchmark of the face, QR and gallery hot paths, checked against a baseline.
+
+Run from the backend folder:
+    python -m benchmarks.hot_paths                              # every suite, compare to the baseline
+    python -m benchmarks.hot_paths --suites gallery --sizes 1000,10000,100000
+    python -m benchmarks.hot_paths --suites face --faces path/to/photos --batch-sizes 1,8,32
+    python -m benchmarks.hot_paths --save-baseline              # record this machine's numbers
+    python -m benchmarks.hot_paths --output results.json
+
+Every case reports median/p95 latency and ops/s. When the baseline file exists,
+cases whose ops/s dropped by more than --tolerance are listed and the run exits
+with status 1. It also exits 1 up front when iot-edge's vendored copies of
+the shared modules differ from backend/services. Baselines are machine
+specific: record one on the box that runs the comparison. Inputs are synthetic and seeded, so runs are reproducible.
+"""
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.ann_recall import noisy_queries, synthetic_gallery  # noqa: E402
+from benchmarks.storage_latency import percentile  # noqa: E402
+from services.ann_index import IVFIndex  # noqa: E402
+from services.gallery import Gallery, write_gallery  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline_hot_paths.json")
+EDGE_DIR = os.path.join(os.path.dirname(os.path.dirname(BENCH_DIR)), "iot-edge")
+
+
+def measure(fn, iterations, warmup=3, items=1):
+    """Latency of fn() over iterations calls; items is the work done per call (e.g. batch size)"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    median = percentile(samples, 50)
+    return {
+        "median_ms": round(median, 4),
+        "p95_ms": round(percentile(samples, 95), 4),
+        "ops_per_sec": round(items * 1000 / median, 2) if median else 0.0,
+    }
+
+
+def measure_threads(fn, threads, iterations):
+    """Aggregate throughput of fn() called from a pool of threads"""
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: fn(), range(threads)))  # warm every worker
+        start = time.perf_counter()
+        list(pool.map(lambda _: fn(), range(iterations)))
+        elapsed = time.perf_counter() - start
+    return {
+        "median_ms": round(elapsed * 1000 * threads / iterations, 4),
+        "p95_ms": None,
+        "ops_per_sec": round(iterations / elapsed, 2),
+    }
+
+
+def synthetic_face(seed, size=(640, 480)):
+    """A frontal cartoon face on a noisy background, as JPEG bytes"""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(60, 200, (size[1], size[0], 3), dtype=np.uint8)
+    img = Image.fromarray(background)
+    draw = ImageDraw.Draw(img)
+    cx, cy = size[0] // 2 + int(rng.integers(-40, 40)), size[1] // 2 + int(rng.integers(-30, 30))
+    w, h = 90 + int(rng.integers(0, 30)), 120 + int(rng.integers(0, 30))
+    skin = tuple(int(c) for c in rng.integers([170, 120, 90], [240, 190, 160]))
+    draw.ellipse([cx - w, cy - h, cx + w, cy + h], fill=skin)
+    for dx in (-w // 2.5, w // 2.5):
+        draw.ellipse([cx + dx - 14, cy - h // 3 - 8, cx + dx + 14, cy - h // 3 + 8], fill=(255, 255, 255))
+        draw.ellipse([cx + dx - 6, cy - h // 3 - 6, cx + dx + 6, cy - h // 3 + 6], fill=(40, 30, 20))
+    draw.polygon([(cx, cy - 15), (cx - 12, cy + 25), (cx + 12, cy + 25)], fill=tuple(c - 30 for c in skin))
+    draw.chord([cx - 35, cy + 35, cx + 35, cy + 75], 0, 180, fill=(150, 50, 50))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def load_face_images(args):
+    if args.faces:
+        paths = sorted(os.path.join(args.faces, f) for f in os.listdir(args.faces)
+                       if f.lower().endswith((".jpg", ".jpeg", ".png")))
+        if paths:
+            return [open(path, "rb").read() for path in paths[:64]]
+        print(f"⚠️  No photos in {args.faces}, using synthetic faces")
+    return [synthetic_face(seed) for seed in range(16)]
+
+
+# Suites
+
+def bench_qr(args, results):
+    try:
+        from services.qr_service import QRService
+    except ImportError as e:
+        print(f"⚠️  Skipping qr suite: {e}")
+        return
+
+    service = QRService(storage_path=tempfile.mkdtemp(prefix="bench_qr_"))
+    counter = iter(range(10 ** 9))
+    results["qr.generate_gatepass"] = measure(
+        lambda: service.generate_gatepass({"name": "Bench User", "roll": f"BENCH{next(counter):06d}"}),
+        args.iterations
+    )
+    content = f"GATEPASS|{next(iter(service.active_qrs))}|BENCH000000|Bench User"
+    results["qr.validate_qr"] = measure(lambda: service.validate_qr(content), args.iterations * 10)
+
+    # Edge decoder on a camera-sized frame with the pass held at arm's length
+    try:
+        spec = importlib.util.spec_from_file_location("edge_qr_scanner", os.path.join(EDGE_DIR, "qr_scanner.py"))
+        edge_qr = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(edge_qr)
+    except ImportError as e:
+        print(f"⚠️  Skipping qr.scan: {e}")
+        return
+    scanner = edge_qr.QRScanner()
+    code = Image.open(next(iter(service.active_qrs.values()))["file_path"]).convert("RGB").resize((200, 200))
+    canvas = Image.new("RGB", (640, 480), (128, 128, 128))
+    canvas.paste(code, (220, 140))
+    frame = np.asarray(canvas)[:, :, ::-1].copy()
+    for threads in args.threads:
+        key = "qr.scan" if threads == 1 else f"qr.scan[threads={threads}]"
+        results[key] = (measure(lambda: scanner.scan(frame), args.iterations) if threads == 1
+                        else measure_threads(lambda: scanner.scan(frame), threads, args.iterations * threads))
+
+
+def bench_face(args, results):
+    try:
+        import torch
+        from services.face_service import face_service as service
+    except ImportError as e:
+        print(f"⚠️  Skipping face suite: {e}")
+        return
+
+    images = load_face_images(args)
+    detected = [service.get_embedding(data) for data in images]
+    found = [e for e in detected if e is not None]
+    print(f"Face detector found faces in {len(found)}/{len(images)} benchmark images")
+    template = found[0] if found else np.ones((1, 512), dtype=np.float32) / np.sqrt(512)
+
+    default_threads = torch.get_num_threads()
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        cycle = iter(range(10 ** 9))
+        suffix = "" if threads == args.threads[0] else f"[torch_threads={threads}]"
+        results[f"face.get_embedding{suffix}"] = measure(
+            lambda: service.get_embedding(images[next(cycle) % len(images)]), args.iterations
+        )
+        results[f"face.verify_embedding{suffix}"] = measure(
+            lambda: service.verify_embedding(images[next(cycle) % len(images)], template), args.iterations
+        )
+    torch.set_num_threads(default_threads)
+
+    # Recognition network alone on aligned 160x160 crops, per batch size
+    generator = torch.Generator().manual_seed(0)
+    for batch_size in args.batch_sizes:
+        batch = torch.randn(batch_size, 3, 160, 160, generator=generator).to(service.device)
+
+        def embed():
+            with torch.no_grad():
+                service.model(batch)
+        results[f"face.embed[batch={batch_size}]"] = measure(embed, max(5, args.iterations // batch_size),
+                                                           items=batch_size)
+
+    pil_images = [Image.open(io.BytesIO(data)).convert("RGB") for data in images]
+    for batch_size in args.batch_sizes:
+        chunk = (pil_images * (batch_size // len(pil_images) + 1))[:batch_size]
+        results[f"face.get_embeddings_batch[batch={batch_size}]"] = measure(
+            lambda: service.get_embeddings_batch(chunk, batch_size=batch_size),
+            max(3, args.iterations // batch_size), items=batch_size
+        )
+
+
+def bench_gallery(args, results):
+    workdir = tempfile.mkdtemp(prefix="bench_gallery_")
+    for size in args.sizes:
+        ids, matrix = synthetic_gallery(size, args.dim)
+        queries = noisy_queries(matrix, 256)
+        cycle = iter(range(10 ** 9))
+
+        def query():
+            return queries[next(cycle) % len(queries)]
+
+        path = os.path.join(workdir, f"gallery_{size}.bin")
+        write_gallery(path, ids, ids, matrix)
+        gallery = Gallery(path, dim=args.dim)
+        results[f"gallery.search[n={size}]"] = measure(lambda: gallery.search(query(), k=1), args.iterations)
+
+        # The 1:N match GateScanner.handle_face_scan runs per face
+        index = IVFIndex.build(ids, matrix, nprobe=args.nprobe)
+        results[f"ann.search[n={size}]"] = measure(lambda: index.search(query(), k=1), args.iterations)
+        for threads in args.threads[1:]:
+            results[f"ann.search[n={size},threads={threads}]"] = measure_threads(
+                lambda: index.search(query(), k=1), threads, args.iterations * threads
+            )
+
+
+SUITES = {"qr": bench_qr, "face": bench_face, "gallery": bench_gallery}
+
+
+# Baseline
+
+def environment():
+    info = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import torch
+        info["torch"] = torch.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def compare(results, baseline, tolerance):
+    """Cases whose throughput fell more than tolerance below the baseline"""
+    regressions = []
+    for case, stats in results.items():
+        before = baseline.get("results", {}).get(case)
+        if not before or not before.get("ops_per_sec"):
+            continue
+        change = stats["ops_per_sec"] / before["ops_per_sec"] - 1
+        stats["vs_baseline"] = round(change, 4)
+        if change < -tolerance:
+            regressions.append((case, before["ops_per_sec"], stats["ops_per_sec"], change))
+    return regressions
+
+
+def print_report(results):
+    print("\n" + "=" * 88)
+    print(f"{'Case':<44}{'median ms':>11}{'p95 ms':>10}{'ops/s':>12}{'vs base':>11}")
+    print("-" * 88)
+    for case, stats in results.items():
+        p95 = f"{stats['p95_ms']:.3f}" if stats["p95_ms"] is not None else "-"
+        change = f"{stats['vs_baseline']:+.1%}" if "vs_baseline" in stats else "-"
+        print(f"{case:<44}{stats['median_ms']:>11.3f}{p95:>10}{stats['ops_per_sec']:>12.1f}{change:>11}")
+    print("=" * 88)
+
+
+def check_edge_copies():
+    """Exit 1 when a vendored iot-edge copy of a shared module no longer matches backend/services"""
+    spec = importlib.util.spec_from_file_location("edge_shared_modules", os.path.join(EDGE_DIR, "shared_modules.py"))
+    shared = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(shared)
+    drifted = [name for name in shared.stale_modules() if os.path.exists(os.path.join(EDGE_DIR, name))]
+    if drifted:
+        print(f"❌ iot-edge copies differ from backend/services: {', '.join(drifted)} "
+              "(run python shared_modules.py in iot-edge)")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", default="qr,face,gallery", help="comma separated: " + ",".join(SUITES))
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="gallery sizes")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--threads", default="1,2,4", help="thread counts to sweep (first is the baseline case)")
+    parser.add_argument("--batch-sizes", default="1,8,32", help="face batch sizes to sweep")
+    parser.add_argument("--faces", help="directory of real face photos (default: synthetic faces)")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed ops/s drop before failing")
+    args = parser.parse_args()
+    args.sizes = [int(s) for s in args.sizes.split(",")]
+    args.threads = [int(t) for t in args.threads.split(",")]
+    args.batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    check_edge_copies()
+
+    results = {}
+    for suite in args.suites.split(","):
+        print(f"Benchmarking {suite}...")
+        SUITES[suite.strip()](args, results)
+
+    regressions = []
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    print_report(results)
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}")
+    elif not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for case, before, after, change in regressions:
+            print(f"   {case:<44} {before:>10.1f} -> {after:>10.1f} ops/s ({change:+.1%})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
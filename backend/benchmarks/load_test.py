@@ -0,0 +1,370 @@
+"""
+End-to-end load test of the FastAPI app on one box, with no Firebase involved.
+
+Run from the backend folder:
+    python -m benchmarks.load_test                                  # real face model
+    python -m benchmarks.load_test --stub-face --face-latency-ms 40  # storage/HTTP only
+    python -m benchmarks.load_test --gates 4 --mobiles 8 --sensors 16 --steps 1,2,4,8,16 --duration 20
+
+The app runs in a uvicorn subprocess (in a temporary working directory) with
+STORAGE_BACKEND=sqlite, DEVICE_STORE=local and AUTH_BACKEND=local, seeded with
+--users students, each with a face template and a registered gate QR. Closed-loop
+virtual clients then drive it:
+  gates    - POST /api/gatepass/verify with the student's QR and a face image
+  mobiles  - POST /api/gate-pass/request, then GET /api/gate-pass/my-passes three times
+  sensors  - POST /api/sensors
+Each step multiplies the client counts by the next --steps factor and runs for
+--duration seconds. The report lists throughput and p50/p95/p99 per route and
+the step where throughput stopped scaling (the saturation point).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import zlib
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.hot_paths import synthetic_face  # noqa: E402
+from benchmarks.storage_latency import percentile  # noqa: E402
+
+ROUTES = (
+    "POST /api/gatepass/verify",
+    "POST /api/gate-pass/request",
+    "GET /api/gate-pass/my-passes",
+    "POST /api/sensors",
+)
+# Throughput gain below which the next step counts as saturated
+SATURATION_GAIN = 0.10
+
+
+def load_faces(faces_dir):
+    if faces_dir:
+        paths = sorted(os.path.join(faces_dir, f) for f in os.listdir(faces_dir)
+                       if f.lower().endswith((".jpg", ".jpeg", ".png")))
+        if paths:
+            return [open(path, "rb").read() for path in paths[:64]]
+    return [synthetic_face(seed) for seed in range(16)]
+
+
+# Server side
+
+class StubFaceService:
+    """Fixed-cost stand-in for FaceService, so a run measures HTTP and storage without inference"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def _vector(self, data):
+        rng = np.random.default_rng(zlib.crc32(bytes(data[:4096])))
+        vector = rng.standard_normal(512).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).reshape(1, -1)
+
+    def get_embedding(self, image_input):
+        time.sleep(self.latency)
+        data = image_input if isinstance(image_input, bytes) else open(image_input, "rb").read()
+        return self._vector(data)
+
+    def get_embeddings_batch(self, images, batch_size=32):
+        time.sleep(self.latency * len(images) / 4)
+        return [self._vector(img.tobytes()) for img in images]
+
+    def verify_embedding(self, target_face_bytes, known_embedding_list):
+        # Same cost profile as the real check: runs inline on the event loop
+        time.sleep(self.latency)
+        return True, 0.2
+
+    def verify_vector(self, embedding, known_embedding_list):
+        return True, 0.2
+
+    def verify_face(self, face_image_bytes, expected_name):
+        return self.verify_embedding(face_image_bytes, None)
+
+
+def serve(args):
+    """Seed the local stores, write the scenario file and run the app"""
+    if args.stub_face:
+        stub = types.ModuleType("services.face_service")
+        stub.face_service = StubFaceService(args.face_latency_ms / 1000)
+        stub.FaceService = StubFaceService
+        sys.modules["services.face_service"] = stub
+
+    import uvicorn
+    import main
+    from services.embedding_codec import encode_embedding
+    from services.face_service import face_service
+    from services.qr_service import qr_service
+    from services.repository import get_repository
+
+    faces = load_faces(args.faces)
+    templates = []
+    for data in faces:
+        embedding = face_service.get_embedding(data)
+        if embedding is None:
+            # No detectable face: the gate request still exercises QR, storage and MTCNN
+            embedding = np.random.default_rng(len(templates)).standard_normal(512)
+        templates.append(encode_embedding(np.asarray(embedding).reshape(-1)))
+
+    students = []
+
+    async def seed():
+        repo = get_repository()
+        users = {}
+        face_templates = {}
+        for i in range(args.users):
+            reg_no = f"LOAD{i:05d}"
+            users[reg_no] = {
+                "reg_no": reg_no, "email": f"{reg_no.lower()}@example.com", "password": "password123",
+                "class": "CS-A", "department": "Computer Science", "image_filename": f"{reg_no}.jpg",
+            }
+            face_templates[reg_no] = templates[i % len(templates)]
+            qr = qr_service.generate_gatepass({"name": reg_no, "roll": reg_no})
+            students.append({
+                "reg_no": reg_no,
+                "qr_content": f"GATEPASS|{qr['qr_id']}|{reg_no}|{reg_no}",
+                "face": i % len(faces),
+            })
+        await repo.create_users_batch(users, face_templates)
+
+    asyncio.run(seed())
+    with open(args.scenario, "w") as f:
+        json.dump({"students": students}, f)
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+
+# Client side
+
+class Recorder:
+    def __init__(self):
+        self.samples = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+        self.recording = False
+
+    def add(self, route, elapsed_ms, ok):
+        if not self.recording:
+            return
+        self.samples[route].append(elapsed_ms)
+        if not ok:
+            self.errors[route] += 1
+
+
+async def timed_call(recorder, route, request):
+    start = time.perf_counter()
+    try:
+        response = await request
+        ok = response.status_code < 400 and not (
+            route == ROUTES[0] and response.json().get("reason") == "QR_INVALID"
+        )
+    except Exception:
+        ok = False
+    recorder.add(route, (time.perf_counter() - start) * 1000, ok)
+
+
+async def gate_client(client, recorder, students, faces, think, stop):
+    while not stop.is_set():
+        student = random.choice(students)
+        await timed_call(recorder, ROUTES[0], client.post(
+            "/api/gatepass/verify",
+            data={"qr_content": student["qr_content"]},
+            files={"face_image": ("face.jpg", faces[student["face"]], "image/jpeg")},
+        ))
+        await asyncio.sleep(think)
+
+
+async def mobile_client(client, recorder, students, proof, think, stop):
+    while not stop.is_set():
+        reg_no = random.choice(students)["reg_no"]
+        await timed_call(recorder, ROUTES[1], client.post(
+            "/api/gate-pass/request",
+            data={"reg_no": reg_no, "purpose": "Load test", "leave_time": "10:00", "return_time": "18:00"},
+            files={"proof": ("proof.jpg", proof, "image/jpeg")},
+        ))
+        for _ in range(3):
+            await asyncio.sleep(think)
+            await timed_call(recorder, ROUTES[2], client.get(f"/api/gate-pass/my-passes/{reg_no}"))
+        await asyncio.sleep(think)
+
+
+async def sensor_client(client, recorder, device_id, think, stop):
+    while not stop.is_set():
+        await timed_call(recorder, ROUTES[3], client.post("/api/sensors/", json={
+            "device_id": device_id, "sensor_type": "temperature",
+            "value": round(random.uniform(18, 30), 2), "unit": "C",
+        }))
+        await asyncio.sleep(think)
+
+
+async def run_step(base_url, students, faces, proof, counts, args):
+    import httpx
+
+    recorder = Recorder()
+    stop = asyncio.Event()
+    think = args.think_ms / 1000
+    limits = httpx.Limits(max_connections=sum(counts.values()) + 10, max_keepalive_connections=sum(counts.values()))
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        tasks = [gate_client(client, recorder, students, faces, think, stop) for _ in range(counts["gates"])]
+        tasks += [mobile_client(client, recorder, students, proof, think, stop) for _ in range(counts["mobiles"])]
+        tasks += [sensor_client(client, recorder, f"LOAD_SENSOR_{i:03d}", think, stop)
+                  for i in range(counts["sensors"])]
+        running = [asyncio.create_task(task) for task in tasks]
+
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        recorder.recording = False
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.wait(running, timeout=args.timeout)
+        for task in running:
+            task.cancel()
+
+    step = {"clients": counts, "routes": {}}
+    total = 0
+    for route in ROUTES:
+        samples = recorder.samples[route]
+        if not samples:
+            continue
+        total += len(samples)
+        step["routes"][route] = {
+            "requests": len(samples),
+            "rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+            "errors": recorder.errors[route],
+        }
+    everything = [ms for samples in recorder.samples.values() for ms in samples]
+    step["rps"] = round(total / elapsed, 1)
+    step["p95_ms"] = round(percentile(everything, 95), 2) if everything else None
+    return step
+
+
+def saturation_point(steps):
+    """Index of the first step that added clients without adding SATURATION_GAIN throughput"""
+    for i in range(1, len(steps)):
+        if steps[i]["rps"] < steps[i - 1]["rps"] * (1 + SATURATION_GAIN):
+            return i - 1
+    return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, workdir):
+    scenario = os.path.join(workdir, "scenario.json")
+    port = args.port or free_port()
+    env = {
+        **os.environ,
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": os.path.join(workdir, "loadtest.db"),
+        "DEVICE_STORE": "local",
+        "AUTH_BACKEND": "local",
+    }
+    command = [sys.executable, os.path.abspath(__file__), "serve", "--port", str(port),
+               "--users", str(args.users), "--scenario", scenario,
+               "--face-latency-ms", str(args.face_latency_ms)]
+    if args.stub_face:
+        command.append("--stub-face")
+    if args.faces:
+        command += ["--faces", os.path.abspath(args.faces)]
+    server = subprocess.Popen(command, cwd=workdir, env=env)
+
+    import httpx
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited during startup (code {server.returncode})")
+        try:
+            if os.path.exists(scenario) and httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                with open(scenario) as f:
+                    return server, f"http://127.0.0.1:{port}", json.load(f)["students"]
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("Server did not become healthy in time")
+
+
+def print_report(steps, saturated):
+    print("\n" + "=" * 96)
+    for i, step in enumerate(steps):
+        clients = ", ".join(f"{n} {kind}" for kind, n in step["clients"].items())
+        marker = "  <- saturation" if i == saturated else ""
+        print(f"Step {i + 1}: {clients} -> {step['rps']} req/s, p95 {step['p95_ms']} ms{marker}")
+        print(f"  {'Route':<32}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}")
+        for route, stats in step["routes"].items():
+            print(f"  {route:<32}{stats['rps']:>9.1f}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+                  f"{stats['p99_ms']:>10.1f}{stats['errors']:>9}")
+    print("=" * 96)
+    if saturated is None:
+        print("Throughput still scaling at the last step; add larger --steps to find the saturation point")
+    else:
+        peak = max(steps, key=lambda step: step["rps"])
+        print(f"Saturation at step {saturated + 1}: more clients only added latency (peak {peak['rps']} req/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", nargs="?", default="run", choices=["run", "serve"], help=argparse.SUPPRESS)
+    parser.add_argument("--users", type=int, default=500, help="seeded students")
+    parser.add_argument("--gates", type=int, default=2, help="gate clients at step factor 1")
+    parser.add_argument("--mobiles", type=int, default=4, help="mobile clients at step factor 1")
+    parser.add_argument("--sensors", type=int, default=4, help="sensor devices at step factor 1")
+    parser.add_argument("--steps", default="1,2,4,8,16", help="client count multipliers")
+    parser.add_argument("--duration", type=float, default=15.0, help="measured seconds per step")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before each step")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between a client's requests")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout (seconds)")
+    parser.add_argument("--faces", help="directory of face photos for the gate requests (default: synthetic)")
+    parser.add_argument("--stub-face", action="store_true", help="replace the face model with a fixed delay")
+    parser.add_argument("--face-latency-ms", type=float, default=30.0, help="stub face model cost")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        serve(args)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="gatepass_load_")
+    print(f"Starting the app in {workdir} with {args.users} seeded students...")
+    server, base_url, students = start_server(args, workdir)
+    faces = load_faces(args.faces)
+    proof = synthetic_face(999, size=(320, 240))
+
+    steps = []
+    try:
+        for factor in (int(s) for s in args.steps.split(",")):
+            counts = {"gates": args.gates * factor, "mobiles": args.mobiles * factor,
+                      "sensors": args.sensors * factor}
+            print(f"Running step x{factor}: {counts}...")
+            steps.append(asyncio.run(run_step(base_url, students, faces, proof, counts, args)))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    saturated = saturation_point(steps)
+    print_report(steps, saturated)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"steps": steps, "saturation_step": saturated}, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
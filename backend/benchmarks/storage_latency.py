@@ -0,0 +1,140 @@
+"""
+Compare p50/p99 latency of the main routes' data access across storage backends.
+
+Run from the backend folder:
+    python -m benchmarks.storage_latency --backends sqlite,firestore --iterations 200
+
+The Firestore run writes BENCH_* users, passes and sensor readings into the
+configured project; point FIREBASE_CREDENTIALS_PATH at a test project.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.repository import (  # noqa: E402
+    create_repository, USER_EMBEDDING_FIELDS, USER_LOGIN_FIELDS, USER_PROFILE_FIELDS
+)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def seed(repo, users, passes_per_user):
+    for i in range(users):
+        reg_no = f"BENCH_{i:05d}"
+        await repo.create_user(reg_no, {
+            "reg_no": reg_no,
+            "password": "password123",
+            "email": f"{reg_no.lower()}@example.com",
+            "class": "CS-A",
+            "department": "Computer Science",
+            "image_filename": f"{reg_no}.jpg",
+            "face_embedding": [random.uniform(-0.1, 0.1) for _ in range(512)],
+        })
+        for _ in range(passes_per_user):
+            pass_id = str(uuid.uuid4())
+            await repo.create_pass(pass_id, {
+                "pass_id": pass_id,
+                "reg_no": reg_no,
+                "status": "APPROVED",
+                "created_at": datetime.now().isoformat(),
+            })
+
+
+def route_scenarios(repo, users):
+    """One coroutine factory per route, doing the same data access the route does"""
+    def reg_no():
+        return f"BENCH_{random.randrange(users):05d}"
+
+    async def verify():
+        await repo.get_user(reg_no(), fields=USER_EMBEDDING_FIELDS)
+
+    async def login():
+        await repo.get_user(reg_no(), fields=USER_LOGIN_FIELDS)
+
+    async def request_pass():
+        user = reg_no()
+        await repo.get_user(user, fields=USER_PROFILE_FIELDS)
+        pass_id = str(uuid.uuid4())
+        await repo.create_pass(pass_id, {"pass_id": pass_id, "reg_no": user, "status": "APPROVED",
+                                         "created_at": datetime.now().isoformat()})
+        await repo.update_pass(pass_id, {"qr_code_path": "QR_images/bench.png"})
+
+    async def my_passes():
+        await repo.list_passes(reg_no())
+
+    async def sensor_ingest():
+        await repo.add_sensor_reading({"device_id": "BENCH_GATE", "sensor_type": "temperature",
+                                       "value": 21.5, "unit": "C", "metadata": None,
+                                       "timestamp": datetime.utcnow().isoformat()})
+
+    async def sensor_latest():
+        await repo.list_sensor_readings("BENCH_GATE", limit=1)
+
+    return {
+        "POST /api/gatepass/verify": verify,
+        "POST /api/users/login": login,
+        "POST /api/gate-pass/request": request_pass,
+        "GET /api/gate-pass/my-passes": my_passes,
+        "POST /api/sensors": sensor_ingest,
+        "GET /api/sensors/latest": sensor_latest,
+    }
+
+
+async def run_backend(backend, args):
+    repo = create_repository(backend)
+    await seed(repo, args.users, args.passes)
+    results = {}
+    for route, scenario in route_scenarios(repo, args.users).items():
+        for _ in range(min(10, args.iterations)):
+            await scenario()
+        samples = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            await scenario()
+            samples.append((time.perf_counter() - start) * 1000)
+        results[route] = (percentile(samples, 50), percentile(samples, 99))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="sqlite", help="comma separated: sqlite,firestore")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--passes", type=int, default=5, help="seeded passes per user")
+    args = parser.parse_args()
+
+    if "SQLITE_PATH" not in os.environ:
+        os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="gatepass_bench_"), "bench.db")
+
+    report = {}
+    for backend in args.backends.split(","):
+        print(f"Benchmarking {backend}...")
+        report[backend] = asyncio.run(run_backend(backend.strip(), args))
+
+    print("\n" + "=" * 78)
+    print(f"{'Route':<32}" + "".join(f"{b + ' p50/p99 (ms)':>23}" for b in report))
+    print("-" * 78)
+    for route in next(iter(report.values())):
+        row = f"{route:<32}"
+        for backend in report:
+            p50, p99 = report[backend][route]
+            row += f"{p50:>11.2f} /{p99:>9.2f}"
+        print(row)
+    print("=" * 78)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+# Add current directory to path to import config and services
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config.firebase_config import get_auth_client
+from services.bulk_enrollment import BulkEnroller, MAX_BATCH_SIZE
+from services.face_service import face_service
+from services.repository import create_repository
+from services.upload_storage import image_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll a whole roster of students in one run")
+    parser.add_argument("roster", help="CSV or JSONL with reg_no, email, password and profile columns")
+    parser.add_argument("photos", help="directory or .zip of photos named <reg_no>.jpg (or a 'photo' column)")
+    parser.add_argument("--batch-size", type=int, default=32, help=f"faces per MTCNN/ResNet batch (1-{MAX_BATCH_SIZE})")
+    parser.add_argument("--workers", type=int, default=None, help="photo decode threads (default: CPU count)")
+    parser.add_argument("--checkpoint", default="bulk_import.checkpoint", help="resume file of enrolled reg_nos")
+    parser.add_argument("--report", default="bulk_import_failures.csv", help="CSV report of failed rows")
+    args = parser.parse_args()
+    if not 1 <= args.batch_size <= MAX_BATCH_SIZE:
+        parser.error(f"--batch-size must be between 1 and {MAX_BATCH_SIZE}")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    enroller = BulkEnroller(
+        face_service, create_repository(), get_auth_client(), image_store,
+        batch_size=args.batch_size, workers=args.workers,
+        checkpoint_path=args.checkpoint, report_path=args.report
+    )
+    progress = asyncio.run(enroller.run(args.roster, args.photos))
+
+    print("\n" + "=" * 50)
+    print("📊 BULK IMPORT SUMMARY")
+    print("=" * 50)
+    print(f"Roster rows       : {progress['total']}")
+    print(f"Already enrolled  : {progress['skipped']}")
+    print(f"✅ Enrolled       : {progress['enrolled']}")
+    print(f"❌ Failed         : {progress['failed']}")
+    print(f"Throughput        : {progress['images_per_sec']} images/sec")
+    if progress["failed"]:
+        print(f"\n⚠️  Failure report: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import firebase_admin
-from firebase_admin import credentials, firestore, auth
+from firebase_admin import credentials, firestore, firestore_async, auth
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+_async_client = None
+
 def initialize_firebase():
     """Initialize Firebase Admin SDK"""
     if not firebase_admin._apps:
@@ -18,7 +20,24 @@ def get_firestore_client():
     initialize_firebase()
     return firestore.client()
 
+def get_async_firestore_client():
+    """Get the application-wide Firestore AsyncClient (one gRPC channel pool per process)"""
+    global _async_client
+    if _async_client is None:
+        initialize_firebase()
+        _async_client = firestore_async.client()
+    return _async_client
+
 def get_auth_client():
-    """Get Firebase Auth client"""
+    """Get Firebase Auth client (AUTH_BACKEND=local selects the in-memory stand-in)"""
+    if os.getenv("AUTH_BACKEND", "firebase") == "local":
+        from services.local_auth import local_auth
+        return local_auth
     initialize_firebase()
     return auth
+
+def firebase_in_use():
+    """False when storage, the device registry and auth all run without Firebase"""
+    storage = os.getenv("STORAGE_BACKEND", "firestore")
+    devices = os.getenv("DEVICE_STORE") or storage
+    return "firestore" in (storage, devices) or os.getenv("AUTH_BACKEND", "firebase") != "local"
@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import os
+import sys
+
+import numpy as np
+
+# Add current directory to path to import config and services
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.embedding_codec import decode_embedding
+from services.gallery import write_gallery
+from services.repository import create_repository
+
+
+async def collect(repo):
+    # Display names (emails) come from the profiles, which also hold embeddings not yet moved to face_templates
+    display_names, legacy = {}, {}
+    async for reg_no, data in repo.stream_users(fields=["email", "face_embedding"]):
+        display_names[reg_no] = data.get("email") or reg_no
+        if data.get("face_embedding"):
+            legacy[reg_no] = data["face_embedding"]
+    ids, names, vectors = [], [], []
+    async for reg_no, template in repo.stream_face_templates():
+        ids.append(reg_no)
+        names.append(display_names.get(reg_no, reg_no))
+        vectors.append(decode_embedding(template))
+        legacy.pop(reg_no, None)
+    for reg_no, value in legacy.items():
+        ids.append(reg_no)
+        names.append(display_names[reg_no])
+        vectors.append(decode_embedding(value))
+    return ids, names, vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every registered face embedding as a gallery file for edge devices")
+    parser.add_argument("output", help="gallery file to write, e.g. gallery.bin")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float16",
+                        help="float16 halves the file and page-cache size on the Pi")
+    args = parser.parse_args()
+
+    ids, names, vectors = asyncio.run(collect(create_repository()))
+    if not ids:
+        print("❌ No users with face embeddings found")
+        return
+    matrix = np.stack(vectors)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    write_gallery(args.output, ids, names, matrix, args.dtype)
+    print(f"✅ Exported {len(ids)} face(s) to {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+    print("📦 Copy it to the edge device as embeddings/gallery.bin")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,9 +28,12 @@ class GatePassEmulator:
         self.last_status_time = 0
         
     def fetch_user_data(self, reg_no):
-        """Fetch user embedding from Firestore"""
+        """Fetch the user's face template from Firestore (legacy users doc as fallback)"""
         try:
-            doc = db.collection('users').document(reg_no).get()
+            doc = db.collection('face_templates').document(reg_no).get(field_paths=['embedding'])
+            if doc.exists:
+                return {'face_embedding': doc.get('embedding')}
+            doc = db.collection('users').document(reg_no).get(field_paths=['face_embedding'])
             if doc.exists:
                 return doc.to_dict()
         except Exception as e:
@@ -40,12 +43,8 @@ class GatePassEmulator:
     def verify_identity(self, frame, stored_embedding):
         """Compare live frame with stored embedding using FaceService"""
         try:
-            # Convert frame to bytes for face_service (it normally takes bytes)
-            _, img_encoded = cv2.imencode('.jpg', frame)
-            face_bytes = img_encoded.tobytes()
-            
-            # Use the existing verify_embedding logic
-            is_match = face_service.verify_embedding(face_bytes, stored_embedding)
+            # FaceService takes the BGR frame directly, no JPEG round trip
+            is_match = face_service.verify_embedding(frame, stored_embedding)
             return is_match
         except Exception as e:
             print(f"Face verification error: {e}")
@@ -2,9 +2,15 @@ import cv2
 import numpy as np
 import torch
 from services.face_service import face_service
+from services.ann_index import load_or_build
+from services.embedding_codec import decode_embedding
 from config.firebase_config import initialize_firebase, get_firestore_client
 import time
 import json
+import os
+
+ANN_INDEX_PATH = os.getenv("ANN_INDEX_PATH", "Storage/face_index.npz")
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
 
 # Initialize Firebase
 initialize_firebase()
@@ -15,7 +21,8 @@ class GateScanner:
         self.cap = cv2.VideoCapture(0) # Use laptop webcam
         self.qr_detector = cv2.QRCodeDetector()
         
-        self.known_users = [] # List of {reg_no: str, embedding: np.array, name: str}
+        self.known_users = {} # reg_no -> {reg_no: str, embedding: np.array, name: str}
+        self.index = None
         self.load_users()
         
         self.state = "SCAN_FACE" # SCAN_FACE -> SCAN_QR -> VERIFIED
@@ -26,16 +33,31 @@ class GateScanner:
 
     def load_users(self):
         print("Fetching registered users for local recognition...")
-        users_ref = db.collection('users').stream()
+        for doc in db.collection('face_templates').select(['embedding']).stream():
+            self.known_users[doc.id] = {
+                "reg_no": doc.id,
+                "name": 'Unknown',
+                "embedding": decode_embedding(doc.get('embedding'))
+            }
+        # Display names come from the profile; only users not yet migrated still carry an embedding there
+        users_ref = db.collection('users').select(['email', 'face_embedding']).stream()
         for doc in users_ref:
             data = doc.to_dict()
-            if 'face_embedding' in data and data['face_embedding']:
-                self.known_users.append({
-                    "reg_no": data.get('reg_no'),
+            if doc.id in self.known_users:
+                self.known_users[doc.id]["name"] = data.get('email', 'Unknown')
+            elif 'face_embedding' in data and data['face_embedding']:
+                self.known_users[doc.id] = {
+                    "reg_no": doc.id,
                     "name": data.get('email', 'Unknown'),
-                    "embedding": np.array(data['face_embedding'])
-                })
+                    "embedding": decode_embedding(data['face_embedding'])
+                }
         print(f"Loaded {len(self.known_users)} users with face data.")
+        if self.known_users:
+            # IVF index on disk; only new or changed users are inserted on restart
+            ids = list(self.known_users)
+            self.index = load_or_build(ANN_INDEX_PATH, ids, np.stack([self.known_users[i]['embedding'] for i in ids]),
+                                       nprobe=ANN_NPROBE)
+            print(f"Face index ready: {len(self.index)} faces in {self.index.nlist} cell(s), nprobe={ANN_NPROBE}")
 
     def run(self):
         while True:
@@ -73,26 +95,17 @@ class GateScanner:
         if time.time() - self.last_face_check > 2.0:
             self.last_face_check = time.time()
             
-            # Convert frame to bytes for face_service
-            _, buffer = cv2.imencode('.jpg', frame)
-            face_bytes = buffer.tobytes()
-            
-            embedding = face_service.get_embedding(face_bytes)
-            if embedding is not None:
-                # Compare against all known users
+            # FaceService takes the BGR frame directly, no JPEG round trip
+            embedding = face_service.get_embedding(frame)
+            if embedding is not None and self.index is not None:
+                # Approximate nearest neighbour over the probed IVF cells only
                 best_match = None
                 min_dist = 1.0
                 
-                for user in self.known_users:
-                    dist = np.linalg.norm(embedding.flatten() - user['embedding'].flatten()) # L2 or use cosine from service
-                    # Using Euclidean or Cosine distance. face_service uses Cosine < 0.6
-                    # Let's use the actual cosine from service logic
-                    from scipy.spatial.distance import cosine
-                    dist = cosine(embedding.flatten(), user['embedding'].flatten())
-                    
-                    if dist < min_dist:
-                        min_dist = dist
-                        best_match = user
+                matches = self.index.search(embedding, k=1)
+                if matches:
+                    reg_no, min_dist = matches[0]
+                    best_match = self.known_users[reg_no]
                 
                 if best_match and min_dist < 0.6:
                     self.detected_user = best_match
@@ -112,7 +125,7 @@ class GateScanner:
                 # In index.tsx/two.tsx we used `pass_id` in QR.
                 
                 # Fetch pass from firestore
-                pass_doc = db.collection('gate_passes').document(data).get()
+                pass_doc = db.collection('gate_passes').document(data).get(field_paths=['reg_no'])
                 if pass_doc.exists:
                     pass_info = pass_doc.to_dict()
                     if pass_info['reg_no'] == self.detected_user['reg_no']:
@@ -1,10 +1,22 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from config.firebase_config import initialize_firebase
-from routes import devices, sensors, auth, verify, user_routes, gate_pass_routes
+from config.firebase_config import initialize_firebase, firebase_in_use
+from routes import devices, sensors, auth, verify, user_routes, gate_pass_routes, debug, gate_channel
+from services.device_registry import get_device_registry, close_device_registry
+from services.repository import get_repository
+from services.metrics import metrics, MetricsMiddleware
+from services.registration_jobs import registration_jobs
+from services.profiling import ProfilingMiddleware, memory_tracker
+from services.qr_service import qr_service
+from services.pass_cache import pass_cache
+from services.face_service import face_service
+from services.gate_channel import gate_hub
+from services.upload_storage import UploadLimitMiddleware
 
-# Initialize Firebase on startup
-initialize_firebase()
+# Initialize Firebase on startup (skipped when every backend is local, e.g. load tests)
+if firebase_in_use():
+    initialize_firebase()
 
 app = FastAPI(
     title="IoT System API",
@@ -12,6 +24,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Oversized multipart bodies are refused before they are spooled to disk (inside CORS, so
+# the browser can read the 413)
+app.add_middleware(UploadLimitMiddleware)
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -19,7 +34,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Per-stage latency histograms (/metrics) and Server-Timing headers
+app.add_middleware(MetricsMiddleware)
+# Sampling profiler, switched on at runtime through /api/debug/profiling
+app.add_middleware(ProfilingMiddleware)
+
+metrics.gauge("registration_queue_depth", registration_jobs.queue_depth,
+              "Registration jobs queued or processing")
+metrics.gauge("registration_jobs", registration_jobs.status_counts,
+              "Retained registration jobs by status")
+metrics.gauge("registration_executor_backlog", lambda: registration_jobs.executor._work_queue.qsize(),
+              "Face embedding calls waiting for a registration worker thread")
+metrics.gauge("gate_channel_connections", lambda: len(gate_hub.connections),
+              "Edge devices connected over the gate channel WebSocket")
+
+# Long-lived containers reported by /api/debug/memory/*
+memory_tracker.watch("qr_service.active_qrs", lambda: len(qr_service.active_qrs))
+memory_tracker.watch("face_service.gallery", lambda: len(face_service.gallery))
+memory_tracker.watch("face_service.gallery_log_records", lambda: face_service.gallery.log_records)
+memory_tracker.watch("pass_cache.users", lambda: len(pass_cache._users))
+memory_tracker.watch("registration_jobs", lambda: len(registration_jobs._jobs))
 
 from fastapi.staticfiles import StaticFiles
 import os
@@ -34,8 +70,19 @@ app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(devices.router, prefix="/api/devices", tags=["Devices"])
 app.include_router(sensors.router, prefix="/api/sensors", tags=["Sensors"])
 app.include_router(verify.router, prefix="/api/gatepass", tags=["GatePass"])
+app.include_router(gate_channel.router, prefix="/api/gatepass", tags=["GatePass"])
 app.include_router(user_routes.router, prefix="/api/users", tags=["Users"])
 app.include_router(gate_pass_routes.router, prefix="/api/gate-pass", tags=["Gate Pass"])
+app.include_router(debug.router, prefix="/api/debug", tags=["Debug"])
+
+@app.on_event("startup")
+async def warm_device_registry():
+    # Start the devices snapshot listener before the first request arrives
+    get_device_registry()
+
+@app.on_event("shutdown")
+async def stop_device_registry():
+    close_device_registry()
 
 @app.get("/")
 async def root():
@@ -44,3 +91,13 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/storage")
+async def storage_timings():
+    """Per-call Firestore timings recorded by the repository layer"""
+    return get_repository().timings.snapshot()
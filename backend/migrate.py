@@ -0,0 +1,135 @@
+"""
+Data migrations for existing user documents and face templates.
+
+Run from the backend folder, against the configured STORAGE_BACKEND:
+    python migrate.py embeddings --dtype float32 --batch-size 400
+    python migrate.py embeddings --dry-run
+    python migrate.py face-templates --batch-size 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Add current directory to path to import config and services
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.embedding_codec import (
+    EMBEDDING_DTYPE, EMBEDDING_MODEL, decode_embedding, encode_embedding, embedding_info, needs_reencoding
+)
+from services.repository import create_repository, FIRESTORE_BATCH_LIMIT
+
+
+def stored_size(value):
+    """Approximate stored size: Firestore bills 8 bytes per array double"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return 8 * len(value)
+
+
+def reencode(value, dtype, stats):
+    model = embedding_info(value)["model"] or EMBEDDING_MODEL
+    encoded = encode_embedding(decode_embedding(value), dtype, model)
+    stats["bytes_before"] += stored_size(value)
+    stats["bytes_after"] += len(encoded)
+    return encoded
+
+
+async def migrate_embeddings(repo, dtype, batch_size, dry_run):
+    """
+    Rewrite face_templates entries and legacy users.face_embedding fields
+    that are float lists or encoded with another dtype in the binary format
+    """
+    stats = {"scanned": 0, "rewritten": 0, "bytes_before": 0, "bytes_after": 0}
+    pending_templates, pending_users = {}, {}
+
+    async def flush():
+        if pending_templates and not dry_run:
+            await repo.set_face_templates_batch(dict(pending_templates))
+        if pending_users and not dry_run:
+            await repo.update_users_batch(dict(pending_users))
+        stats["rewritten"] += len(pending_templates) + len(pending_users)
+        pending_templates.clear()
+        pending_users.clear()
+
+    async def progress():
+        if len(pending_templates) + len(pending_users) >= batch_size:
+            await flush()
+            print(f"   ... {stats['rewritten']} rewritten / {stats['scanned']} scanned")
+
+    async for reg_no, template in repo.stream_face_templates():
+        stats["scanned"] += 1
+        if needs_reencoding(template, dtype):
+            pending_templates[reg_no] = reencode(template, dtype, stats)
+            await progress()
+    async for reg_no, data in repo.stream_users(fields=["face_embedding"]):
+        value = data.get("face_embedding")
+        if not value:
+            continue
+        stats["scanned"] += 1
+        if needs_reencoding(value, dtype):
+            pending_users[reg_no] = {"face_embedding": reencode(value, dtype, stats)}
+            await progress()
+    await flush()
+    return stats
+
+
+async def migrate_face_templates(repo, batch_size, keep_source, dry_run):
+    """Backfill face_templates/{reg_no} from users.face_embedding and drop the field from the profile"""
+    stats = {"scanned": 0, "moved": 0, "bytes_moved": 0}
+    pending = {}
+
+    async def flush():
+        if pending and not dry_run:
+            await repo.set_face_templates_batch(dict(pending), clear_user_embedding=not keep_source)
+        stats["moved"] += len(pending)
+        pending.clear()
+
+    async for reg_no, data in repo.stream_users(fields=["face_embedding"]):
+        stats["scanned"] += 1
+        value = data.get("face_embedding")
+        if not value:
+            continue
+        if not isinstance(value, (bytes, bytearray)):
+            # Legacy float list: encode on the way over
+            value = encode_embedding(decode_embedding(value), EMBEDDING_DTYPE)
+        stats["bytes_moved"] += len(value)
+        pending[reg_no] = value
+        if len(pending) >= batch_size:
+            await flush()
+            print(f"   ... {stats['moved']} moved / {stats['scanned']} scanned")
+    await flush()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate existing user documents")
+    sub = parser.add_subparsers(dest="command", required=True)
+    embeddings = sub.add_parser("embeddings", help="encode face templates (and legacy face_embedding) as versioned binary")
+    embeddings.add_argument("--dtype", choices=["float32", "float16", "int8"], default=EMBEDDING_DTYPE)
+    embeddings.add_argument("--batch-size", type=int, default=400, help=f"users per batched write (max {FIRESTORE_BATCH_LIMIT})")
+    embeddings.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    templates = sub.add_parser("face-templates", help="move face embeddings from users into face_templates")
+    templates.add_argument("--batch-size", type=int, default=200, help="users per batch (two writes each)")
+    templates.add_argument("--keep-source", action="store_true", help="leave users.face_embedding in place")
+    templates.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+
+    repo = create_repository()
+    batch_size = min(args.batch_size, FIRESTORE_BATCH_LIMIT)
+    if args.command == "embeddings":
+        print(f"🔄 Re-encoding face embeddings as {args.dtype}{' (dry run)' if args.dry_run else ''}...")
+        stats = asyncio.run(migrate_embeddings(repo, args.dtype, batch_size, args.dry_run))
+        print(f"✅ Scanned {stats['scanned']} embedding(s), rewrote {stats['rewritten']}")
+        if stats["rewritten"]:
+            print(f"📦 Embedding storage: {stats['bytes_before'] / 1024:.1f} KB -> {stats['bytes_after'] / 1024:.1f} KB")
+    elif args.command == "face-templates":
+        print(f"🔄 Moving face embeddings into face_templates{' (dry run)' if args.dry_run else ''}...")
+        stats = asyncio.run(migrate_face_templates(repo, min(batch_size, FIRESTORE_BATCH_LIMIT // 2),
+                                                   args.keep_source, args.dry_run))
+        print(f"✅ Scanned {stats['scanned']} user(s), moved {stats['moved']} template(s) "
+              f"({stats['bytes_moved'] / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
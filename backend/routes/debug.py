@@ -0,0 +1,68 @@
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+from services.profiling import profiler, memory_tracker
+import os
+import secrets
+
+router = APIRouter()
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def require_admin(x_admin_token: str | None = Header(None)):
+    """Debug endpoints are off unless ADMIN_TOKEN is set, and then need it in X-Admin-Token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Debug endpoints are disabled (set ADMIN_TOKEN)")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+class ProfilingConfig(BaseModel):
+    enabled: bool
+    sample_rate: float | None = None   # fraction of requests to profile
+    slow_ms: float | None = None       # or: keep only requests slower than this (0 clears)
+    interval_ms: float | None = None   # sampling interval
+
+@router.get("/profiling", dependencies=[Depends(require_admin)])
+async def profiling_status():
+    """Current profiler settings"""
+    return profiler.status()
+
+@router.post("/profiling", dependencies=[Depends(require_admin)])
+async def configure_profiling(config: ProfilingConfig):
+    """Switch the sampling profiler on or off at runtime"""
+    return profiler.configure(config.enabled, config.sample_rate, config.slow_ms, config.interval_ms)
+
+@router.get("/profiling/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Collapsed-stack files written so far, newest first"""
+    return sorted(profiler.list_profiles(), reverse=True)
+
+@router.get("/profiling/profiles/{name}", dependencies=[Depends(require_admin)])
+async def download_profile(name: str):
+    """One collapsed-stack file (feed it to flamegraph.pl or speedscope)"""
+    if name != os.path.basename(name) or name not in profiler.list_profiles():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(os.path.join(profiler.output_dir, name), media_type="text/plain")
+
+@router.post("/memory/snapshot", dependencies=[Depends(require_admin)])
+async def memory_snapshot(frames: int = Query(25, ge=1, le=100)):
+    """Start tracemalloc (if needed) and record the baseline for /memory/diff"""
+    return await run_in_threadpool(memory_tracker.snapshot, frames)
+
+@router.get("/memory/diff", dependencies=[Depends(require_admin)])
+async def memory_diff(
+    limit: int = Query(25, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    """Allocation growth since the baseline snapshot"""
+    result = await run_in_threadpool(memory_tracker.diff, limit, group_by)
+    if result is None:
+        raise HTTPException(status_code=409, detail="Take a baseline with POST /memory/snapshot first")
+    return result
+
+@router.delete("/memory/snapshot", dependencies=[Depends(require_admin)])
+async def memory_stop():
+    """Drop the baseline and stop tracemalloc (it slows allocations while on)"""
+    memory_tracker.stop()
+    return {"status": "stopped"}
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from config.firebase_config import get_firestore_client
+from services.device_registry import DeviceNotFound, get_device_registry, MAX_BATCH_WRITES
 from datetime import datetime
+import uuid
 
 router = APIRouter()
 
@@ -17,50 +19,81 @@ class DeviceUpdate(BaseModel):
     location: str | None = None
     status: str | None = None
 
+class BulkDeviceItem(DeviceUpdate):
+    id: str | None = None
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """If-None-Match check: weak comparison against each listed entity-tag, or "*" """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
 @router.get("/")
-async def get_all_devices():
+async def get_all_devices(request: Request, response: Response, registry=Depends(get_device_registry)):
     """Get all devices"""
-    db = get_firestore_client()
-    devices_ref = db.collection("devices")
-    docs = devices_ref.stream()
-    return [{"id": doc.id, **doc.to_dict()} for doc in docs]
+    etag = registry.etag
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return registry.list()
+
+@router.post("/bulk")
+async def bulk_upsert_devices(items: list[BulkDeviceItem], registry=Depends(get_device_registry)):
+    """Update or provision many devices in one batched commit"""
+    if len(items) > MAX_BATCH_WRITES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_WRITES} devices per request")
+    now = datetime.utcnow().isoformat()
+    upserts = {}
+    for item in items:
+        data = {k: v for k, v in item.model_dump(exclude={"id"}).items() if v is not None}
+        if item.id:
+            data["updated_at"] = now
+            upserts[item.id] = data
+        else:
+            data.setdefault("status", "inactive")
+            data["created_at"] = now
+            upserts[uuid.uuid4().hex[:20]] = data
+    await run_in_threadpool(registry.bulk_upsert, upserts)
+    return {"count": len(upserts), "ids": list(upserts)}
 
 @router.get("/{device_id}")
-async def get_device(device_id: str):
+async def get_device(device_id: str, request: Request, response: Response, registry=Depends(get_device_registry)):
     """Get a specific device"""
-    db = get_firestore_client()
-    doc = db.collection("devices").document(device_id).get()
-    if not doc.exists:
+    device = registry.get(device_id)
+    if device is None:
         raise HTTPException(status_code=404, detail="Device not found")
-    return {"id": doc.id, **doc.to_dict()}
+    etag = registry.device_etag(device_id)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return device
 
 @router.post("/")
-async def create_device(device: Device):
+async def create_device(device: Device, registry=Depends(get_device_registry)):
     """Create a new device"""
-    db = get_firestore_client()
     device_data = device.model_dump()
     device_data["created_at"] = datetime.utcnow().isoformat()
-    doc_ref = db.collection("devices").add(device_data)
-    return {"id": doc_ref[1].id, **device_data}
+    device_id = await run_in_threadpool(registry.create, device_data)
+    return {"id": device_id, **device_data}
 
 @router.put("/{device_id}")
-async def update_device(device_id: str, device: DeviceUpdate):
+async def update_device(device_id: str, device: DeviceUpdate, registry=Depends(get_device_registry)):
     """Update a device"""
-    db = get_firestore_client()
-    doc_ref = db.collection("devices").document(device_id)
-    if not doc_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Device not found")
     update_data = {k: v for k, v in device.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow().isoformat()
-    doc_ref.update(update_data)
+    try:
+        await run_in_threadpool(registry.update, device_id, update_data)
+    except DeviceNotFound:
+        raise HTTPException(status_code=404, detail="Device not found")
     return {"id": device_id, **update_data}
 
 @router.delete("/{device_id}")
-async def delete_device(device_id: str):
+async def delete_device(device_id: str, registry=Depends(get_device_registry)):
     """Delete a device"""
-    db = get_firestore_client()
-    doc_ref = db.collection("devices").document(device_id)
-    if not doc_ref.get().exists:
+    try:
+        await run_in_threadpool(registry.delete, device_id)
+    except DeviceNotFound:
         raise HTTPException(status_code=404, detail="Device not found")
-    doc_ref.delete()
     return {"message": "Device deleted successfully"}
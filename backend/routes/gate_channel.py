@@ -0,0 +1,101 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from services.repository import get_repository
+from services.gate_channel import gate_hub, GateConnection, HEARTBEAT_SECONDS
+from services import gate_protocol as protocol
+from routes.debug import require_admin
+from routes.verify import verify_access
+import asyncio
+import logging
+import numpy as np
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+HELLO_TIMEOUT_SECONDS = 5
+
+@router.websocket("/channel")
+async def gate_channel(websocket: WebSocket, repo=Depends(get_repository)):
+    """
+    Long-lived channel for one edge device (framing in services/gate_protocol.py).
+    VERIFY requests run concurrently and are answered by request id; the
+    device sends PING at least every heartbeat or is dropped.
+    """
+    await websocket.accept()
+    try:
+        msg_type, _, meta, _ = protocol.decode(
+            await asyncio.wait_for(websocket.receive_bytes(), HELLO_TIMEOUT_SECONDS)
+        )
+    except (asyncio.TimeoutError, protocol.ProtocolError, WebSocketDisconnect, KeyError):
+        await websocket.close(code=1002)
+        return
+    device_id = meta.get("device_id")
+    if msg_type != protocol.HELLO or not gate_hub.authenticate(device_id, meta.get("token")):
+        await websocket.send_bytes(protocol.encode(protocol.ERROR, 0, {"message": "Authentication failed"}))
+        await websocket.close(code=1008)
+        return
+
+    connection = GateConnection(device_id)
+    previous = gate_hub.register(connection)
+    if previous is not None:
+        # The device reconnected before its old socket timed out
+        previous.send(None)
+    logger.info(f"Gate channel opened for {device_id}")
+    connection.send(protocol.encode(protocol.WELCOME, 0, {"heartbeat": HEARTBEAT_SECONDS}))
+
+    async def sender():
+        while True:
+            frame = await connection.outbox.get()
+            if frame is None:
+                await websocket.close()
+                return
+            await websocket.send_bytes(frame)
+
+    async def handle_verify(request_id, meta, payload):
+        async with connection.in_flight:
+            try:
+                if meta.get("kind") == protocol.KIND_EMBEDDING:
+                    embedding = np.frombuffer(payload, dtype="<f4")
+                    result = await verify_access(meta["qr"], repo, embedding=embedding)
+                else:
+                    result = await verify_access(meta["qr"], repo, frames=protocol.split_payload(meta, payload))
+                connection.send(protocol.encode(protocol.RESULT, request_id, result))
+            except Exception as e:
+                logger.error(f"Gate channel verify failed for {device_id}: {e}")
+                connection.send(protocol.encode(protocol.ERROR, request_id, {"message": str(e)}))
+
+    sending = asyncio.create_task(sender())
+    tasks = set()
+    try:
+        while True:
+            data = await asyncio.wait_for(websocket.receive_bytes(), HEARTBEAT_SECONDS * 3)
+            msg_type, request_id, meta, payload = protocol.decode(data)
+            if msg_type == protocol.PING:
+                connection.send(protocol.encode(protocol.PONG, request_id))
+            elif msg_type == protocol.VERIFY:
+                connection.requests += 1
+                task = asyncio.create_task(handle_verify(request_id, meta, payload))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            else:
+                connection.send(protocol.encode(protocol.ERROR, request_id, {"message": f"Unexpected frame {msg_type}"}))
+    except asyncio.TimeoutError:
+        logger.warning(f"Gate channel {device_id} missed its heartbeat, closing")
+    except (protocol.ProtocolError, KeyError) as e:
+        logger.warning(f"Gate channel {device_id} sent a bad frame: {e!r}")
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        gate_hub.unregister(connection)
+        for task in tasks:
+            task.cancel()
+        sending.cancel()
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass
+        logger.info(f"Gate channel closed for {device_id}")
+
+@router.get("/channel/status", dependencies=[Depends(require_admin)])
+async def channel_status():
+    """Connected gates"""
+    return {"enabled": gate_hub.enabled, "connections": gate_hub.status()}
@@ -1,23 +1,47 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
-from config.firebase_config import get_firestore_client
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status, Depends, Query, BackgroundTasks
+from services.repository import get_repository, USER_PROFILE_FIELDS, PASS_HISTORY_LIMIT
 from services.qr_service import qr_service
-from datetime import datetime
-import os
-import shutil
+from services.pass_cache import pass_cache
+from services.upload_storage import proof_store, UploadTooLarge
+from datetime import datetime, timedelta
+import asyncio
 import uuid
 
 router = APIRouter()
 
-PROOF_STORAGE_PATH = "Storage/Proofs"
-os.makedirs(PROOF_STORAGE_PATH, exist_ok=True)
+# Clock formats the request form sends ("05:00 PM") plus 24-hour "17:00"
+RETURN_TIME_FORMATS = ("%I:%M %p", "%I:%M%p", "%H:%M")
+
+def pass_expiry(return_time: str, created_at: datetime) -> str:
+    """
+    Resolve the free-form return time into an ISO expires_at for the
+    active/expired history filters: a full ISO datetime is used as-is, a clock
+    time (12- or 24-hour) means that time on the day of the request, anything
+    else ends the day.
+    """
+    return_time = return_time.strip()
+    try:
+        return datetime.fromisoformat(return_time).isoformat()
+    except ValueError:
+        pass
+    for fmt in RETURN_TIME_FORMATS:
+        try:
+            clock = datetime.strptime(return_time.upper(), fmt)
+        except ValueError:
+            continue
+        return created_at.replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0).isoformat()
+    end_of_day = created_at.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return end_of_day.isoformat()
 
 @router.post("/request")
 async def request_gate_pass(
+    background_tasks: BackgroundTasks,
     reg_no: str = Form(...),
     purpose: str = Form(...),
     leave_time: str = Form(...),
     return_time: str = Form(...),
-    proof: UploadFile = File(...)
+    proof: UploadFile = File(...),
+    repo=Depends(get_repository)
 ):
     """
     Request a gate pass.
@@ -26,28 +50,27 @@ async def request_gate_pass(
     3. Create Gate Pass entry (Auto-Approved).
     4. Generate and return QR Code content (or URL).
     """
-    db = get_firestore_client()
-    
-    # 1. Verify User exists
-    user_doc = db.collection('users').document(reg_no).get()
-    if not user_doc.exists:
+    # 1. Verify User exists, while 2. the proof is streamed to disk
+    user_data, stored_proof = await asyncio.gather(
+        repo.get_user(reg_no, fields=USER_PROFILE_FIELDS),
+        proof_store.save_upload(proof),
+        return_exceptions=True
+    )
+    # A proof saved for a failed request stays put: an identical upload may share the file.
+    # proof_store.collect_garbage() (python storage_gc.py) reclaims it once unreferenced.
+    if isinstance(user_data, Exception):
+        raise HTTPException(status_code=500, detail=f"Database error: {str(user_data)}")
+    if user_data is None:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    user_data = user_doc.to_dict()
-    
-    # 2. Save Proof
-    try:
-        file_ext = proof.filename.split(".")[-1]
-        proof_filename = f"proof_{reg_no}_{uuid.uuid4()}.{file_ext}"
-        proof_path = os.path.join(PROOF_STORAGE_PATH, proof_filename)
-        
-        with open(proof_path, "wb") as buffer:
-            shutil.copyfileobj(proof.file, buffer)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save proof: {str(e)}")
+    if isinstance(stored_proof, UploadTooLarge):
+        raise HTTPException(status_code=413, detail=str(stored_proof))
+    if isinstance(stored_proof, Exception):
+        raise HTTPException(status_code=500, detail=f"Failed to save proof: {str(stored_proof)}")
+    background_tasks.add_task(proof_store.make_variants, stored_proof.relpath)
 
     # 3. Create Gate Pass Record
     pass_id = str(uuid.uuid4())
+    created_at = datetime.now()
     gate_pass_data = {
         "pass_id": pass_id,
         "reg_no": reg_no,
@@ -58,10 +81,12 @@ async def request_gate_pass(
         "purpose": purpose,
         "leave_time": leave_time,
         "return_time": return_time,
-        "proof_path": proof_path,
-        "proof_filename": proof_filename,
+        "proof_path": stored_proof.path,
+        "proof_filename": stored_proof.relpath,
+        "proof_sha256": stored_proof.sha256,
         "status": "APPROVED",
-        "created_at": datetime.now().isoformat()
+        "created_at": created_at.isoformat(),
+        "expires_at": pass_expiry(return_time, created_at)
     }
     
     # Generate QR Content (Simple JSON for now)
@@ -74,15 +99,18 @@ async def request_gate_pass(
     
     # Save to Firestore
     try:
-        db.collection('gate_passes').document(pass_id).set(gate_pass_data)
-        
-        # Also generate visual QR code and save it (optional, but good for display)
-        qr_image_path = qr_service.generate_gatepass(qr_data) # Reusing existing service
-        
-        # Update record with QR path
-        db.collection('gate_passes').document(pass_id).update({
-            "qr_code_path": qr_image_path
-        })
+        await repo.create_pass(pass_id, gate_pass_data)
+        try:
+            # Also generate visual QR code and save it (optional, but good for display)
+            qr_image_path = qr_service.generate_gatepass(qr_data) # Reusing existing service
+            
+            # Update record with QR path
+            await repo.update_pass(pass_id, {
+                "qr_code_path": qr_image_path
+            })
+        finally:
+            # After the QR path is stored, so a read in between cannot cache the pass without it
+            pass_cache.invalidate(reg_no)
         
         return {
             "status": "success",
@@ -95,21 +123,20 @@ async def request_gate_pass(
          raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/my-passes/{reg_no}")
-async def get_my_passes(reg_no: str):
-    """Get all gate passes for a user"""
-    db = get_firestore_client()
+async def get_my_passes(
+    reg_no: str,
+    pass_status: str | None = Query(None, alias="status", pattern="^(active|expired)$"),
+    limit: int = Query(PASS_HISTORY_LIMIT, ge=1, le=100),
+    repo=Depends(get_repository)
+):
+    """Get a user's most recent gate passes, newest first"""
+    passes = pass_cache.get(reg_no, pass_status, limit)
+    if passes is not None:
+        return {"status": "success", "data": passes}
     try:
-        # Check without order_by first to see if it's an indexing issue
-        docs = db.collection('gate_passes').where('reg_no', '==', reg_no).stream()
-        
-        passes = []
-        for doc in docs:
-            data = doc.to_dict()
-            passes.append(data)
-        
-        # Sort in memory for now to avoid indexing requirement
-        passes.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-            
+        # Ordered and limited server side (see firestore.indexes.json)
+        passes = await repo.list_passes(reg_no, status=pass_status, limit=limit)
+        pass_cache.put(reg_no, pass_status, limit, passes)
         return {"status": "success", "data": passes}
     except Exception as e:
         print(f"Firestore Error: {str(e)}")
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Depends
 from pydantic import BaseModel
-from config.firebase_config import get_firestore_client
+from services.repository import get_repository
+from services.metrics import metrics
 from datetime import datetime
 from typing import Any
 
 router = APIRouter()
 
+MAX_BATCH_READINGS = 500
+
 class SensorData(BaseModel):
     device_id: str
     sensor_type: str
@@ -16,39 +19,45 @@ class SensorData(BaseModel):
 @router.get("/")
 async def get_sensor_data(
     device_id: str | None = Query(None),
-    limit: int = Query(100, le=1000)
+    limit: int = Query(100, le=1000),
+    repo=Depends(get_repository)
 ):
     """Get sensor data, optionally filtered by device"""
-    db = get_firestore_client()
-    query = db.collection("sensor_data")
-    
-    if device_id:
-        query = query.where("device_id", "==", device_id)
-    
-    docs = query.order_by("timestamp", direction="DESCENDING").limit(limit).stream()
-    return [{"id": doc.id, **doc.to_dict()} for doc in docs]
+    return await repo.list_sensor_readings(device_id, limit)
 
 @router.post("/")
-async def add_sensor_data(data: SensorData):
+async def add_sensor_data(data: SensorData, repo=Depends(get_repository)):
     """Add new sensor data"""
-    db = get_firestore_client()
+    metrics.stage_since_request()
     sensor_data = data.model_dump()
     sensor_data["timestamp"] = datetime.utcnow().isoformat()
-    doc_ref = db.collection("sensor_data").add(sensor_data)
-    return {"id": doc_ref[1].id, **sensor_data}
+    with metrics.stage("db.sensor_write"):
+        doc_id = await repo.add_sensor_reading(sensor_data)
+    return {"id": doc_id, **sensor_data}
+
+@router.post("/batch")
+async def add_sensor_data_batch(readings: list[SensorData], repo=Depends(get_repository)):
+    """Add many readings in one request (edge telemetry summaries); written in one batch"""
+    metrics.stage_since_request()
+    if not readings:
+        raise HTTPException(status_code=400, detail="No readings")
+    if len(readings) > MAX_BATCH_READINGS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_READINGS} readings per batch")
+    timestamp = datetime.utcnow().isoformat()
+    batch = []
+    for reading in readings:
+        sensor_data = reading.model_dump()
+        # Devices may stamp a summary with the end of its window
+        sensor_data["timestamp"] = (sensor_data.get("metadata") or {}).get("window_end", timestamp)
+        batch.append(sensor_data)
+    with metrics.stage("db.sensor_write"):
+        ids = await repo.add_sensor_readings(batch)
+    return {"count": len(ids), "ids": ids}
 
 @router.get("/latest/{device_id}")
-async def get_latest_sensor_data(device_id: str):
+async def get_latest_sensor_data(device_id: str, repo=Depends(get_repository)):
     """Get latest sensor data for a device"""
-    db = get_firestore_client()
-    docs = (
-        db.collection("sensor_data")
-        .where("device_id", "==", device_id)
-        .order_by("timestamp", direction="DESCENDING")
-        .limit(1)
-        .stream()
-    )
-    result = [{"id": doc.id, **doc.to_dict()} for doc in docs]
+    result = await repo.list_sensor_readings(device_id, limit=1)
     if not result:
         raise HTTPException(status_code=404, detail="No sensor data found")
     return result[0]
@@ -1,17 +1,21 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
-from config.firebase_config import get_firestore_client, get_auth_client
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status, Depends
+from config.firebase_config import get_auth_client
+from services.repository import get_repository, USER_LOGIN_FIELDS
+from services.upload_storage import image_store, UploadTooLarge
+from services.registration_jobs import registration_jobs, RegistrationError, QueueFull
+from services.bulk_enrollment import BulkEnroller, bulk_import_jobs, ImportAlreadyRunning, MAX_BATCH_SIZE
 from datetime import datetime
+from services.face_service import face_service
+from services.metrics import metrics
+import aiofiles
 import os
 import shutil
 import uuid
-from services.face_service import face_service
+import zipfile
 
 router = APIRouter()
 
-STORAGE_PATH = "Storage/Images"
-os.makedirs(STORAGE_PATH, exist_ok=True)
-
-@router.post("/register")
+@router.post("/register", status_code=status.HTTP_202_ACCEPTED)
 async def register_user(
     reg_no: str = Form(...),
     password: str = Form(...),
@@ -22,88 +26,36 @@ async def register_user(
     hod_name: str = Form(...),
     incharge_name: str = Form(...),
     valid_until: str = Form(...),
-    image: UploadFile = File(...)
+    image: UploadFile = File(...),
+    repo=Depends(get_repository)
 ):
     """
-    Register a new user with all details and save image to local storage.
-    Creates an account in Firebase Auth and stores details in Firestore.
+    Accept a registration: validate, persist the photo and queue a job that
+    computes the face embedding and creates the Firebase Auth and Firestore
+    records. Poll the returned status_url for the outcome.
     """
-    db = get_firestore_client()
-    auth = get_auth_client()
-    users_ref = db.collection('users')
-    
+    metrics.stage_since_request()
+
     # Check if user already exists in Firestore
-    docs = users_ref.where('reg_no', '==', reg_no).stream()
-    if any(docs):
+    with metrics.stage("db.user_exists"):
+        exists = await repo.user_exists(reg_no)
+    if exists:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User with this Registration Number already exists"
         )
 
-    # Create user in Firebase Auth
-    firebase_uid = None
-    try:
-        user_record = auth.create_user(
-            email=email,
-            password=password,
-            display_name=reg_no
-        )
-        firebase_uid = user_record.uid
-        print(f"Firebase Auth user created: {firebase_uid}")
-    except Exception as e:
-        # If email already exists or other auth error
-        raise HTTPException(status_code=400, detail=f"Firebase Auth Error: {str(e)}")
-
     # Save image
     try:
-        file_extension = image.filename.split(".")[-1]
-        image_filename = f"{reg_no}_{uuid.uuid4()}.{file_extension}"
-        file_path = os.path.join(STORAGE_PATH, image_filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-            
-        print(f"Image saved to {file_path}")
+        with metrics.stage("image.save"):
+            stored_image = await image_store.save_upload(image)
+        print(f"Image saved to {stored_image.path}")
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
-        # Clean up Auth user if image save fails? 
-        # For simplicity, we might leave the auth user or try to delete it.
-        if firebase_uid:
-            try:
-                auth.delete_user(firebase_uid)
-            except:
-                pass
         raise HTTPException(status_code=500, detail=f"Failed to save image: {str(e)}")
 
-    # ... (images save block)
-
-    # Generate Face Embedding
-    embedding_list = None
-    try:
-        embedding = face_service.get_embedding(file_path)
-        if embedding is None:
-             # Cleanup
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            if firebase_uid:
-                try: auth.delete_user(firebase_uid) 
-                except: pass
-            raise HTTPException(status_code=400, detail="No face detected in the image. Please upload a clear photo.")
-        
-        embedding_list = embedding.flatten().tolist()
-        print(f"Face embedding generated for {reg_no}")
-    except HTTPException:
-        raise
-    except Exception as e:
-        # Cleanup
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        if firebase_uid:
-            try: auth.delete_user(firebase_uid) 
-            except: pass
-        raise HTTPException(status_code=500, detail=f"Face processing error: {str(e)}")
-
     user_data = {
-        "uid": firebase_uid,
         "reg_no": reg_no,
         "password": password, 
         "email": email,
@@ -114,46 +66,100 @@ async def register_user(
         "incharge_name": incharge_name,
         "valid_until": valid_until,
         "created_at": datetime.now().isoformat(),
-        "image_path": file_path,
-        "image_filename": image_filename,
-        "face_embedding": embedding_list
+        "image_path": stored_image.path,
+        "image_filename": stored_image.relpath,
+        "image_sha256": stored_image.sha256
     }
 
     try:
-        # Use reg_no as document ID for easy lookup
-        users_ref.document(reg_no).set(user_data)
-        return {"status": "success", "message": "User registered successfully", "reg_no": reg_no, "uid": firebase_uid}
-    except Exception as e:
-        # Cleanup image and auth user if db fails
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        if firebase_uid:
-            try:
-                auth.delete_user(firebase_uid)
-            except:
-                pass
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        job = registration_jobs.submit(
+            reg_no, user_data, stored_image, image_store, repo, get_auth_client(), face_service
+        )
+    except (RegistrationError, QueueFull) as e:
+        status_code = e.status_code if isinstance(e, RegistrationError) else status.HTTP_503_SERVICE_UNAVAILABLE
+        raise HTTPException(status_code=status_code, detail=str(e))
+
+    return {
+        "status": "accepted",
+        "message": "Registration received and is being processed",
+        "job_id": job.job_id,
+        "status_url": f"/api/users/register/jobs/{job.job_id}"
+    }
+
+@router.get("/register/jobs/{job_id}")
+async def registration_status(job_id: str):
+    """Status of an asynchronous registration job"""
+    job = registration_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Registration job not found")
+    return job.to_dict()
+
+@router.post("/bulk-import", status_code=status.HTTP_202_ACCEPTED)
+async def bulk_import_users(
+    roster: UploadFile = File(...),
+    photos: UploadFile = File(...),
+    batch_size: int = Form(32, ge=1, le=MAX_BATCH_SIZE),
+    repo=Depends(get_repository)
+):
+    """
+    Enroll a roster (CSV/JSONL) with a zip of photos named <reg_no>.jpg.
+    Runs in the background; poll the returned status_url for progress.
+    """
+    # Cheap early refusal; start() repeats the check atomically once the uploads are on disk
+    if bulk_import_jobs.running():
+        raise HTTPException(status_code=409, detail="A bulk import is already running")
+
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(bulk_import_jobs.work_dir, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    roster_ext = ".jsonl" if roster.filename.lower().endswith((".jsonl", ".ndjson")) else ".csv"
+    roster_path = os.path.join(job_dir, "roster" + roster_ext)
+    photos_path = os.path.join(job_dir, "photos.zip")
+    for upload, path in ((roster, roster_path), (photos, photos_path)):
+        async with aiofiles.open(path, "wb") as out:
+            while chunk := await upload.read(1024 * 1024):
+                await out.write(chunk)
+    if not zipfile.is_zipfile(photos_path):
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail="photos must be a zip archive")
+
+    enroller = BulkEnroller(
+        face_service, repo, get_auth_client(), image_store, batch_size=batch_size,
+        checkpoint_path=os.path.join(job_dir, "checkpoint"),
+        report_path=os.path.join(job_dir, "failures.csv")
+    )
+    try:
+        bulk_import_jobs.start(enroller, roster_path, photos_path, job_id)
+    except ImportAlreadyRunning as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "accepted", "job_id": job_id, "status_url": f"/api/users/bulk-import/{job_id}"}
+
+@router.get("/bulk-import/{job_id}")
+async def bulk_import_status(job_id: str):
+    """Progress of a bulk import job"""
+    job = bulk_import_jobs.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Bulk import job not found")
+    return job
 
 @router.post("/login")
 async def login_user(
     reg_no: str = Form(...),
-    password: str = Form(...)
+    password: str = Form(...),
+    repo=Depends(get_repository)
 ):
     """
     Login with Registration Number and Password.
     """
-    db = get_firestore_client()
-    doc_ref = db.collection('users').document(reg_no)
-    doc = doc_ref.get()
+    user_data = await repo.get_user(reg_no, fields=USER_LOGIN_FIELDS)
 
-    if not doc.exists:
+    if user_data is None:
          raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid Registration Number or Password"
         )
     
-    user_data = doc.to_dict()
-    
     # Simple password check (plaintext as per assumed flow, normally use bcrypt)
     if user_data.get('password') != password:
         raise HTTPException(
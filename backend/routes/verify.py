@@ -1,25 +1,59 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from config.firebase_config import get_firestore_client
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Header
+from typing import List, Optional
+from services.repository import get_repository, USER_EMBEDDING_FIELDS
 from services.qr_service import qr_service
 from services.face_service import face_service
+from services.metrics import metrics
+import asyncio
 import logging
+import os
+import secrets
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+REVOCATION_TOKEN = os.getenv("REVOCATION_TOKEN")
+
+def require_revocation_token(x_revocation_token: str | None = Header(None)):
+    """QR revocation is off unless REVOCATION_TOKEN is set, and then needs it in X-Revocation-Token"""
+    if not REVOCATION_TOKEN:
+        raise HTTPException(status_code=404, detail="QR revocation is disabled (set REVOCATION_TOKEN)")
+    if not x_revocation_token or not secrets.compare_digest(x_revocation_token, REVOCATION_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid revocation token")
+
 @router.post("/verify")
 async def verify_gatepass(
     qr_content: str = Form(...),
-    face_image: UploadFile = File(...)
+    face_image: UploadFile = File(...),
+    face_images: Optional[List[UploadFile]] = File(None),
+    repo=Depends(get_repository)
 ):
     """
     Endpoint for IoT device to verify access.
     1. Validates QR code.
     2. Matches captured face against registered face for the user.
+       Extra burst frames in face_images are fused with face_image.
+    """
+    metrics.stage_since_request()
+    uploads = [face_image] + (face_images or [])
+    return await verify_access(qr_content, repo, frames=[upload.read() for upload in uploads])
+
+async def _frame_bytes(frame):
+    return frame if isinstance(frame, bytes) else await frame
+
+async def verify_access(qr_content, repo, frames=(), embedding=None):
+    """
+    Shared by the HTTP route and the gate channel. frames are JPEG bytes or
+    awaitables returning them (upload reads, overlapped with the template
+    fetch); embedding is a unit vector computed on the gate instead.
     """
     # 1. Validate QR
-    is_valid_qr, qr_info_or_error = qr_service.validate_qr(qr_content)
+    with metrics.stage("qr.validate"):
+        is_valid_qr, qr_info_or_error = qr_service.validate_qr(qr_content)
     if not is_valid_qr:
+        for frame in frames:
+            if not isinstance(frame, bytes):
+                frame.close()
         return {
             "status": "FAIL",
             "reason": "QR_INVALID",
@@ -30,28 +64,31 @@ async def verify_gatepass(
     user_roll = qr_info["roll"]
     user_name = qr_info["name"]
     
-    # 2. Capture face image bytes
-    face_bytes = await face_image.read()
+    # 2. Capture face image bytes while fetching only the face template
+    with metrics.stage("db.face_template"):
+        *frames, template = await asyncio.gather(
+            *(_frame_bytes(frame) for frame in frames),
+            repo.get_face_template(user_roll)
+        )
+    face_bytes = frames[0] if len(frames) == 1 else frames
+    if template is None:
+        # Users not yet moved to face_templates (migrate.py face-templates)
+        with metrics.stage("db.users"):
+            user_data = await repo.get_user(user_roll, fields=USER_EMBEDDING_FIELDS)
+        template = user_data.get("face_embedding") if user_data else None
     
     # 3. Verify Face
-    # Fetch user data to retrieve stored embedding
-    db = get_firestore_client()
-    user_doc = db.collection('users').document(user_roll).get()
-    
-    is_valid_face = False
-    score_or_reason = "User not found or no embedding"
-    
-    if user_doc.exists:
-        user_data = user_doc.to_dict()
-        if "face_embedding" in user_data and user_data["face_embedding"]:
-            logger.info(f"Verifying against stored embedding for {user_roll}")
-            is_valid_face, score_or_reason = face_service.verify_embedding(face_bytes, user_data["face_embedding"])
+    if embedding is not None:
+        if not template:
+            is_valid_face, score_or_reason = False, "User has no stored face embedding"
         else:
-            # Fallback to local known faces if any (legacy or backup)
-            logger.info(f"No embedding in DB for {user_roll}, trying name lookup {user_name}")
-            is_valid_face, score_or_reason = face_service.verify_face(face_bytes, user_name)
+            is_valid_face, score_or_reason = face_service.verify_vector(embedding, template)
+    elif template:
+        logger.info(f"Verifying against stored embedding for {user_roll}")
+        is_valid_face, score_or_reason = face_service.verify_embedding(face_bytes, template)
     else:
-        # Fallback to local
+        # Fallback to local known faces if any (legacy or backup)
+        logger.info(f"No embedding in DB for {user_roll}, trying name lookup {user_name}")
         is_valid_face, score_or_reason = face_service.verify_face(face_bytes, user_name)
 
     if is_valid_face:
@@ -71,6 +108,76 @@ async def verify_gatepass(
             "user": user_name
         }
 
+@router.post("/verify-group")
+async def verify_group(
+    face_image: UploadFile = File(...),
+    qr_contents: List[str] = Form([]),
+    repo=Depends(get_repository)
+):
+    """
+    Verifies a group walking through together from one frame.
+    Every face is matched one-to-one against the users of the scanned passes
+    in qr_contents, or against the local gallery when no pass was scanned.
+    Returns a decision per face and per pass.
+    """
+    metrics.stage_since_request()
+
+    passes = []
+    rolls = []
+    for qr_content in qr_contents:
+        with metrics.stage("qr.validate"):
+            is_valid_qr, qr_info_or_error = qr_service.validate_qr(qr_content)
+        if not is_valid_qr:
+            passes.append({"status": "FAIL", "reason": "QR_INVALID", "message": qr_info_or_error})
+        elif qr_info_or_error["roll"] in rolls:
+            # One person, one entry: a pass shown twice must not admit a second face
+            passes.append({"roll": qr_info_or_error["roll"], "status": "FAIL", "reason": "DUPLICATE_PASS"})
+        else:
+            rolls.append(qr_info_or_error["roll"])
+            passes.append({"roll": qr_info_or_error["roll"], "user": qr_info_or_error["name"]})
+
+    with metrics.stage("db.face_template"):
+        face_bytes, *templates = await asyncio.gather(
+            face_image.read(), *(repo.get_face_template(roll) for roll in rolls)
+        )
+    templates = dict(zip(rolls, templates))
+    missing = [roll for roll, template in templates.items() if template is None]
+    if missing:
+        # Users not yet moved to face_templates (migrate.py face-templates)
+        with metrics.stage("db.users"):
+            users = await asyncio.gather(*(repo.get_user(roll, fields=USER_EMBEDDING_FIELDS) for roll in missing))
+        for roll, user_data in zip(missing, users):
+            templates[roll] = user_data.get("face_embedding") if user_data else None
+
+    faces = face_service.verify_group(face_bytes, templates if qr_contents else None)
+
+    matched = {face["reg_no"]: face for face in faces if face["match"]}
+    for entry in passes:
+        if "roll" not in entry or "status" in entry:
+            continue
+        if templates.get(entry["roll"]) is None:
+            entry.update(status="FAIL", reason="NO_FACE_TEMPLATE")
+        elif entry["roll"] in matched:
+            entry.update(status="SUCCESS", confidence=f"{1 - matched[entry['roll']]['distance']:.2f}")
+        else:
+            entry.update(status="FAIL", reason="FACE_MISMATCH")
+    granted = len(matched)
+    logger.info(f"Group verify: {len(faces)} face(s), {len(passes)} pass(es), {granted} granted")
+
+    return {
+        "status": "SUCCESS" if faces and all(face["match"] for face in faces) else "FAIL",
+        "granted": granted,
+        "faces": faces,
+        "passes": passes
+    }
+
+@router.delete("/qr/{qr_id}", dependencies=[Depends(require_revocation_token)])
+async def revoke_qr(qr_id: str):
+    """Revoke a gate QR; connected gates are told over the gate channel"""
+    if not qr_service.revoke(qr_id):
+        raise HTTPException(status_code=404, detail="QR code not registered")
+    return {"status": "revoked", "qr_id": qr_id}
+
 @router.post("/register-qr")
 async def register_qr(name: str = Form(...), roll: str = Form(...)):
     """Helper endpoint to generate and register a QR for testing"""
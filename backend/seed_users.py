@@ -72,7 +72,7 @@ def seed():
     print("Seeding users...")
     for user in users_to_seed:
         reg_no = user['reg_no']
-        doc = users_ref.document(reg_no).get()
+        doc = users_ref.document(reg_no).get(field_paths=['reg_no'])
         if not doc.exists:
             print(f"Creating user {reg_no}...")
             file_path, filename = create_dummy_image(reg_no)
@@ -0,0 +1,344 @@
+"""
+Approximate nearest-neighbour index for 1:N face identification.
+
+IVF (inverted file) over L2-normalized embeddings: spherical k-means
+centroids split the gallery into `nlist` cells and a query only scans the
+`nprobe` cells whose centroids are closest. With pq_m > 0 each cell stores product-
+quantized residuals (pq_m bytes per face instead of 2 KB) and scores them
+through per-query lookup tables. Pure NumPy/SciPy, no native services.
+The same module ships on the edge devices (vendored by iot-edge/shared_modules.py).
+"""
+import io
+import json
+import os
+import time
+
+import numpy as np
+from scipy import sparse
+from scipy.cluster.vq import kmeans2
+
+# Below this many faces a single cell (exact search) is as fast as IVF
+MIN_TRAIN_SIZE = 1000
+TRAIN_SAMPLE_PER_CELL = 64
+KMEANS_ITERATIONS = 20
+# Rebuild once the gallery has grown this much past the size it was trained on
+RETRAIN_GROWTH = 4.0
+SIGNATURE_SEED = 1234
+
+
+def _normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def spherical_kmeans(sample, k, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    k-means on the unit sphere (assignment by inner product). Each step is one
+    BLAS matmul plus a sparse cluster sum, which is far faster than
+    scipy.cluster.vq at 512 dimensions and hundreds of cells.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        membership = sparse.csr_matrix(
+            (np.ones(len(sample), dtype=np.float32), (labels, np.arange(len(sample)))), shape=(k, len(sample))
+        )
+        sums = np.asarray(membership @ sample)
+        empty = np.flatnonzero(np.bincount(labels, minlength=k) == 0)
+        # Re-seed empty cells from random points so every cell stays in use
+        sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+def default_nlist(count):
+    if count < MIN_TRAIN_SIZE:
+        return 1
+    return int(min(count // 39, 4 * np.sqrt(count)))
+
+
+class IVFIndex:
+    """
+    Inverted-file index with optional product quantization.
+    Cells are swap-remove arrays, so add() and remove() are incremental;
+    re-adding an id replaces its previous vector.
+    """
+
+    def __init__(self, dim=512, nlist=1, nprobe=8, pq_m=0, pq_bits=8):
+        if pq_m and dim % pq_m:
+            raise ValueError(f"dim {dim} is not divisible into {pq_m} PQ sub-vectors")
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_bits = pq_bits
+        self.trained_size = 0
+        self.centroids = None
+        self.codebooks = None  # (pq_m, 2**pq_bits, dim // pq_m)
+        self._ids = [[] for _ in range(nlist)]
+        self._data = [self._empty() for _ in range(nlist)]
+        self._sigs = [np.zeros(0, dtype=np.float32) for _ in range(nlist)]
+        self._where = {}
+        self._sig_vector = np.random.default_rng(SIGNATURE_SEED).standard_normal(dim).astype(np.float32)
+
+    def _empty(self):
+        if self.pq_m:
+            return np.zeros((0, self.pq_m), dtype=np.uint8 if self.pq_bits <= 8 else np.uint16)
+        return np.zeros((0, self.dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, id_):
+        return id_ in self._where
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    @property
+    def needs_retrain(self):
+        # A single-cell index (built below MIN_TRAIN_SIZE) gets real cells as soon as the gallery allows them
+        if self.nlist == 1 and default_nlist(len(self)) > 1:
+            return True
+        return len(self) > RETRAIN_GROWTH * max(self.trained_size, 1)
+
+    def signatures(self, vectors):
+        """One float per vector that changes when the embedding changes (for sync)"""
+        return _normalize_rows(vectors) @ self._sig_vector
+
+    # Training
+
+    def train(self, vectors, seed=0):
+        """Fit the coarse centroids (and PQ codebooks) on a sample of the gallery"""
+        vectors = _normalize_rows(vectors)
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(vectors), max(self.nlist * TRAIN_SAMPLE_PER_CELL, 2 ** self.pq_bits * 40))
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+        if self.nlist == 1:
+            self.centroids = np.zeros((1, self.dim), dtype=np.float32)
+        else:
+            self.centroids = spherical_kmeans(sample, self.nlist, seed=seed)
+
+        if self.pq_m:
+            residuals = sample - self.centroids[self._assign(sample)]
+            sub = self.dim // self.pq_m
+            ksub = min(2 ** self.pq_bits, len(sample))
+            self.codebooks = np.stack([
+                kmeans2(residuals[:, m * sub:(m + 1) * sub], ksub, iter=KMEANS_ITERATIONS, minit="points", seed=seed)[0]
+                for m in range(self.pq_m)
+            ]).astype(np.float32)
+        self.trained_size = len(vectors)
+
+    def _assign(self, vectors):
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def _encode(self, residuals):
+        sub = self.dim // self.pq_m
+        codes = np.empty((len(residuals), self.pq_m), dtype=self._empty().dtype)
+        for m in range(self.pq_m):
+            part = residuals[:, m * sub:(m + 1) * sub]
+            book = self.codebooks[m]
+            # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2)
+            codes[:, m] = np.argmax(part @ book.T - 0.5 * np.sum(book ** 2, axis=1), axis=1)
+        return codes
+
+    # Mutation
+
+    def add(self, ids, vectors):
+        """Insert (or replace) embeddings; the index must be trained first"""
+        if not self.is_trained:
+            raise RuntimeError("Train the index before adding vectors")
+        vectors = _normalize_rows(vectors)
+        for id_ in ids:
+            if id_ in self._where:
+                self.remove(id_)
+        cells = self._assign(vectors)
+        payload = self._encode(vectors - self.centroids[cells]) if self.pq_m else vectors
+        sigs = vectors @ self._sig_vector
+        for cell in np.unique(cells):
+            rows = np.flatnonzero(cells == cell)
+            start = len(self._ids[cell])
+            self._data[cell] = np.concatenate([self._data[cell], payload[rows]])
+            self._sigs[cell] = np.concatenate([self._sigs[cell], sigs[rows]])
+            for offset, row in enumerate(rows):
+                self._ids[cell].append(ids[row])
+                self._where[ids[row]] = (cell, start + offset)
+
+    def remove(self, id_):
+        location = self._where.pop(id_, None)
+        if location is None:
+            return False
+        cell, row = location
+        last = len(self._ids[cell]) - 1
+        if row != last:
+            moved = self._ids[cell][last]
+            self._ids[cell][row] = moved
+            self._data[cell][row] = self._data[cell][last]
+            self._sigs[cell][row] = self._sigs[cell][last]
+            self._where[moved] = (cell, row)
+        self._ids[cell].pop()
+        self._data[cell] = self._data[cell][:last]
+        self._sigs[cell] = self._sigs[cell][:last]
+        return True
+
+    def sync(self, ids, vectors):
+        """Make the index hold exactly these embeddings; returns (added, removed) counts"""
+        wanted = dict(zip(ids, self.signatures(vectors)))
+        stale = [id_ for id_ in self._where if id_ not in wanted]
+        for id_ in stale:
+            self.remove(id_)
+        changed = []
+        for row, id_ in enumerate(ids):
+            location = self._where.get(id_)
+            if location is None or abs(self._sigs[location[0]][location[1]] - wanted[id_]) > 1e-4:
+                changed.append(row)
+        if changed:
+            self.add([ids[row] for row in changed], np.asarray(vectors)[changed])
+        return len(changed), len(stale)
+
+    # Search
+
+    def search(self, query, k=1, nprobe=None, rerank=None):
+        """
+        Top-k (id, cosine distance) pairs, nearest first. With PQ the distances
+        are approximate; pass rerank=gallery to rescore 4*k candidates exactly.
+        """
+        q = _normalize_rows(query)[0]
+        coarse = self.centroids @ q
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probe = np.argpartition(-coarse, nprobe - 1)[:nprobe] if nprobe < self.nlist else range(self.nlist)
+
+        ids, scores = [], []
+        tables = None
+        if self.pq_m:
+            sub = self.dim // self.pq_m
+            tables = np.einsum("mkd,md->mk", self.codebooks, q.reshape(self.pq_m, sub))
+        for cell in probe:
+            if not self._ids[cell]:
+                continue
+            if self.pq_m:
+                codes = self._data[cell]
+                cell_scores = coarse[cell] + tables[np.arange(self.pq_m), codes].sum(axis=1)
+            else:
+                cell_scores = self._data[cell] @ q
+            ids.extend(self._ids[cell])
+            scores.append(cell_scores)
+        if not ids:
+            return []
+        scores = np.concatenate(scores)
+
+        want = min(len(scores), k * 4 if rerank is not None and self.pq_m else k)
+        top = np.argpartition(-scores, want - 1)[:want]
+        if rerank is not None and self.pq_m:
+            exact = []
+            for i in top:
+                vector = rerank.get(ids[i])
+                if vector is not None:
+                    exact.append((ids[i], float(np.dot(_normalize_rows(vector)[0], q))))
+            exact.sort(key=lambda item: -item[1])
+            return [(id_, 1.0 - score) for id_, score in exact[:k]]
+        top = top[np.argsort(-scores[top])][:k]
+        return [(ids[i], float(1.0 - scores[i])) for i in top]
+
+    # Persistence
+
+    def save(self, path):
+        """Write the index to an .npz file atomically"""
+        sizes = np.array([len(ids) for ids in self._ids], dtype=np.int64)
+        meta = {"dim": self.dim, "nlist": self.nlist, "nprobe": self.nprobe, "pq_m": self.pq_m,
+                "pq_bits": self.pq_bits, "trained_size": self.trained_size}
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            meta=np.array(json.dumps(meta)),
+            centroids=self.centroids,
+            codebooks=self.codebooks if self.codebooks is not None else np.zeros(0, dtype=np.float32),
+            sizes=sizes,
+            ids=np.array([id_ for ids in self._ids for id_ in ids], dtype=str),
+            data=np.concatenate(self._data),
+            sigs=np.concatenate(self._sigs),
+        )
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as archive:
+            meta = json.loads(str(archive["meta"]))
+            index = cls(meta["dim"], meta["nlist"], meta["nprobe"], meta["pq_m"], meta["pq_bits"])
+            index.trained_size = meta["trained_size"]
+            index.centroids = archive["centroids"]
+            if index.pq_m:
+                index.codebooks = archive["codebooks"]
+            ids, data, sigs = archive["ids"].tolist(), archive["data"], archive["sigs"]
+            start = 0
+            for cell, size in enumerate(archive["sizes"]):
+                end = start + int(size)
+                index._ids[cell] = ids[start:end]
+                index._data[cell] = data[start:end].copy()
+                index._sigs[cell] = sigs[start:end].copy()
+                for row, id_ in enumerate(index._ids[cell]):
+                    index._where[id_] = (cell, row)
+                start = end
+        return index
+
+    @classmethod
+    def build(cls, ids, vectors, nlist=None, nprobe=8, pq_m=0, pq_bits=8, seed=0):
+        """Train on and insert a whole gallery"""
+        vectors = _normalize_rows(vectors)
+        index = cls(vectors.shape[1], nlist or default_nlist(len(vectors)), nprobe, pq_m, pq_bits)
+        index.train(vectors, seed=seed)
+        index.add(list(ids), vectors)
+        return index
+
+
+def load_or_build(path, ids, vectors, **options):
+    """Open the index at path and sync it with the gallery, rebuilding when it is missing or outgrown"""
+    index = None
+    if os.path.exists(path):
+        try:
+            index = IVFIndex.load(path)
+        except Exception as e:
+            print(f"⚠️ Could not read ANN index {path}: {e}")
+    if index is None or index.dim != np.asarray(vectors).shape[1]:
+        index = IVFIndex.build(ids, vectors, **options)
+    else:
+        added, removed = index.sync(ids, vectors)
+        if index.needs_retrain:
+            index = IVFIndex.build(ids, vectors, **options)
+        elif not (added or removed):
+            return index
+    index.save(path)
+    return index
+
+
+def exact_search(matrix, queries, k):
+    """Brute-force top-k row indices for each query (ground truth for recall)"""
+    scores = _normalize_rows(queries) @ _normalize_rows(matrix).T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+
+def recall_at_k(index, ids, matrix, queries, k=10, nprobe=None, truth=None, rerank=None):
+    """Fraction of the exact top-k found by the index, plus queries per second"""
+    truth = exact_search(matrix, queries, k) if truth is None else truth
+    hits = 0
+    started = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        found = {id_ for id_, _ in index.search(query, k=k, nprobe=nprobe, rerank=rerank)}
+        hits += sum(1 for row in expected if ids[row] in found)
+    elapsed = time.perf_counter() - started
+    return hits / (len(queries) * k), len(queries) / elapsed
@@ -0,0 +1,350 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from PIL import Image
+
+from services.embedding_codec import encode_embedding
+from services.repository import FIRESTORE_BATCH_LIMIT
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ("reg_no", "email", "password")
+PROFILE_COLUMNS = ("phone", "class", "department", "hod_name", "incharge_name", "valid_until")
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+AUTH_IMPORT_LIMIT = 1000
+AUTH_LOOKUP_LIMIT = 100
+# A chunk's profiles and templates must fit one WriteBatch so it commits all-or-nothing
+MAX_BATCH_SIZE = FIRESTORE_BATCH_LIMIT // 2
+PBKDF2_ROUNDS = 100000
+# Decode photos no larger than this; MTCNN sees faces at a fraction of it anyway
+DECODE_MAX_SIDE = 1024
+
+
+def load_roster(path):
+    """Read a CSV or JSONL roster into a list of dicts ("class_name" is accepted for "class")"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    for row in rows:
+        if "class_name" in row and "class" not in row:
+            row["class"] = row.pop("class_name")
+    return rows
+
+
+class PhotoSource:
+    """Photos from a directory or a zip archive, looked up by file name or reg_no stem"""
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+        if self.zip is not None:
+            names = [n for n in self.zip.namelist() if n.lower().endswith(PHOTO_EXTENSIONS)]
+        else:
+            names = [
+                os.path.relpath(os.path.join(root, n), path)
+                for root, _, files in os.walk(path) for n in files
+                if n.lower().endswith(PHOTO_EXTENSIONS)
+            ]
+        self.by_name = {os.path.basename(n): n for n in names}
+        self.by_stem = {os.path.splitext(os.path.basename(n))[0]: n for n in names}
+
+    def find(self, row):
+        if row.get("photo"):
+            return self.by_name.get(os.path.basename(row["photo"]))
+        return self.by_stem.get(row["reg_no"])
+
+    def read(self, name):
+        if self.zip is not None:
+            return self.zip.read(name)
+        with open(os.path.join(self.path, name), "rb") as f:
+            return f.read()
+
+
+def _decode(data):
+    img = Image.open(io.BytesIO(data))
+    # draft() lets libjpeg decode straight to a reduced scale for large photos
+    img.draft("RGB", (DECODE_MAX_SIDE, DECODE_MAX_SIDE))
+    img = img.convert("RGB")
+    img.thumbnail((DECODE_MAX_SIDE, DECODE_MAX_SIDE))
+    return img
+
+
+def _normalized_email(row):
+    return row["email"].strip().lower()
+
+
+def bulk_uid(reg_no):
+    """Auth uid for a bulk-enrolled reg_no; stable so a resumed run overwrites instead of duplicating"""
+    return hashlib.sha256(f"bulk:{reg_no}".encode()).hexdigest()[:28]
+
+
+def dedupe_roster(rows):
+    """Keep the first row per reg_no and per email; returns (rows, failures)"""
+    kept, failures, reg_nos, emails = [], [], set(), set()
+    for row in rows:
+        email = _normalized_email(row)
+        if row["reg_no"] in reg_nos:
+            failures.append((row["reg_no"], "roster", "duplicate reg_no in roster"))
+        elif email in emails:
+            failures.append((row["reg_no"], "roster", f"duplicate email in roster: {email}"))
+        else:
+            reg_nos.add(row["reg_no"])
+            emails.add(email)
+            kept.append(row)
+    return kept, failures
+
+
+def _password_hash(password):
+    salt = os.urandom(16)
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PBKDF2_ROUNDS), salt
+
+
+class BulkEnroller:
+    """
+    Enrolls a roster in chunks: photos are read and decoded on worker
+    threads (the next chunk decodes while the current one is embedded),
+    faces are detected and embedded in batches, Auth accounts are created
+    with import_users and profiles are written with batched commits.
+    Finished reg_nos are appended to a checkpoint file so an interrupted
+    run resumes where it stopped; every failure lands in a CSV report.
+    """
+
+    def __init__(self, face_service, repo, auth, image_store, batch_size=32, workers=None,
+                 checkpoint_path="bulk_import.checkpoint", report_path="bulk_import_failures.csv"):
+        self.face_service = face_service
+        self.repo = repo
+        self.auth = auth
+        self.image_store = image_store
+        if not 1 <= batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+        self.batch_size = batch_size
+        self.decoder = ThreadPoolExecutor(max_workers=workers or os.cpu_count(), thread_name_prefix="decode")
+        self.model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self.checkpoint_path = checkpoint_path
+        self.report_path = report_path
+        self.progress = {"total": 0, "skipped": 0, "enrolled": 0, "failed": 0, "images_per_sec": 0.0}
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path) as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def _checkpoint(self, reg_nos):
+        with open(self.checkpoint_path, "a") as f:
+            f.writelines(f"{reg_no}\n" for reg_no in reg_nos)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _report(self, failures):
+        if not failures:
+            return
+        new_file = not os.path.exists(self.report_path)
+        with open(self.report_path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["reg_no", "stage", "reason"])
+            writer.writerows(failures)
+        self.progress["failed"] += len(failures)
+
+    def _prepare(self, rows, photos):
+        """Read, store and decode one chunk (runs on the decode pool)"""
+        def one(row):
+            name = photos.find(row)
+            if name is None:
+                return row, None, None, "photo not found"
+            try:
+                data = photos.read(name)
+                stored = self.image_store.save_bytes(data, name)
+                return row, stored, _decode(data), None
+            except Exception as e:
+                return row, None, None, f"unreadable photo: {e}"
+        return list(self.decoder.map(one, rows))
+
+    def _email_owners(self, rows):
+        """{email: uid} for the rows' emails that already have an Auth account"""
+        from firebase_admin import auth as firebase_auth
+
+        owners = {}
+        for start in range(0, len(rows), AUTH_LOOKUP_LIMIT):
+            identifiers = [firebase_auth.EmailIdentifier(_normalized_email(row))
+                           for row in rows[start:start + AUTH_LOOKUP_LIMIT]]
+            for user in self.auth.get_users(identifiers).users:
+                owners[user.email.lower()] = user.uid
+        return owners
+
+    def _import_auth(self, rows):
+        """Create Auth accounts in one call per 1000 users; returns {reg_no: uid} and failures"""
+        from firebase_admin import auth as firebase_auth
+
+        # import_users skips Firebase's uniqueness checks, so refuse emails owned by another account here.
+        # An account under the row's own uid is a leftover of an interrupted run and gets overwritten.
+        owners = self._email_owners(rows)
+        uids, failures, accepted = {}, [], []
+        for row in rows:
+            owner = owners.get(_normalized_email(row))
+            if owner is not None and owner != bulk_uid(row["reg_no"]):
+                failures.append((row["reg_no"], "auth", "email already in use by another account"))
+            else:
+                accepted.append(row)
+
+        for start in range(0, len(accepted), AUTH_IMPORT_LIMIT):
+            chunk = accepted[start:start + AUTH_IMPORT_LIMIT]
+            records = []
+            hashes = self.decoder.map(_password_hash, [row["password"] for row in chunk])
+            for row, (password_hash, salt) in zip(chunk, hashes):
+                uid = bulk_uid(row["reg_no"])
+                uids[row["reg_no"]] = uid
+                records.append(firebase_auth.ImportUserRecord(
+                    uid=uid, email=_normalized_email(row), display_name=row["reg_no"],
+                    password_hash=password_hash, password_salt=salt
+                ))
+            result = self.auth.import_users(
+                records, hash_alg=firebase_auth.UserImportHash.pbkdf2_sha256(rounds=PBKDF2_ROUNDS)
+            )
+            for error in result.errors:
+                reg_no = chunk[error.index]["reg_no"]
+                uids.pop(reg_no, None)
+                failures.append((reg_no, "auth", error.reason))
+        return uids, failures
+
+    async def _enroll_chunk(self, prepared):
+        loop = asyncio.get_running_loop()
+        failures = [(row.get("reg_no"), "photo", error) for row, _, _, error in prepared if error]
+        ready = [(row, stored, img) for row, stored, img, error in prepared if not error]
+        if not ready:
+            return [], failures
+
+        embeddings = await loop.run_in_executor(
+            self.model_executor, self.face_service.get_embeddings_batch, [img for _, _, img in ready], self.batch_size
+        )
+        with_face = []
+        for (row, stored, _), embedding in zip(ready, embeddings):
+            if embedding is None:
+                failures.append((row["reg_no"], "face", "no face detected"))
+            else:
+                with_face.append((row, stored, embedding))
+        if not with_face:
+            return [], failures
+
+        uids, auth_failures = await loop.run_in_executor(None, self._import_auth, [r for r, _, _ in with_face])
+        failures.extend(auth_failures)
+
+        users, templates = {}, {}
+        now = datetime.now().isoformat()
+        for row, stored, embedding in with_face:
+            if row["reg_no"] not in uids:
+                continue
+            users[row["reg_no"]] = {
+                "uid": uids[row["reg_no"]],
+                "reg_no": row["reg_no"],
+                "password": row["password"],
+                "email": _normalized_email(row),
+                **{column: row.get(column, "") for column in PROFILE_COLUMNS},
+                "created_at": now,
+                "image_path": stored.path,
+                "image_filename": stored.relpath,
+                "image_sha256": stored.sha256,
+            }
+            templates[row["reg_no"]] = encode_embedding(embedding)
+        committed = set()
+        try:
+            # batch_size <= MAX_BATCH_SIZE keeps this to one commit; the loop guards direct callers
+            reg_nos = list(users)
+            for start in range(0, len(reg_nos), MAX_BATCH_SIZE):
+                part = reg_nos[start:start + MAX_BATCH_SIZE]
+                await self.repo.create_users_batch({r: users[r] for r in part}, {r: templates[r] for r in part})
+                committed.update(part)
+        except Exception as e:
+            # Only roll back what did not commit: committed profiles keep their Auth account
+            lost = [reg_no for reg_no in users if reg_no not in committed]
+            await loop.run_in_executor(None, self.auth.delete_users, [users[r]["uid"] for r in lost])
+            failures.extend((reg_no, "database", str(e)) for reg_no in lost)
+        return [reg_no for reg_no in users if reg_no in committed], failures
+
+    async def run(self, roster_path, photos_path):
+        rows = load_roster(roster_path)
+        photos = PhotoSource(photos_path)
+        done = self._load_checkpoint()
+        self.progress["total"] = len(rows)
+
+        valid = [r for r in rows if all(r.get(c) for c in REQUIRED_COLUMNS)]
+        self._report([(r.get("reg_no", ""), "roster", "missing reg_no, email or password")
+                      for r in rows if not all(r.get(c) for c in REQUIRED_COLUMNS)])
+        valid, duplicates = dedupe_roster(valid)
+        self._report(duplicates)
+        pending = [r for r in valid if r["reg_no"] not in done]
+        existing = await self.repo.get_users([r["reg_no"] for r in pending], fields=["reg_no"]) if pending else {}
+        self._report([(reg_no, "roster", "user already exists") for reg_no in existing])
+        pending = [r for r in pending if r["reg_no"] not in existing]
+        self.progress["skipped"] = len(valid) - len(pending) - len(existing)
+
+        loop = asyncio.get_running_loop()
+        chunks = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        started = time.perf_counter()
+        next_chunk = loop.run_in_executor(None, self._prepare, chunks[0], photos) if chunks else None
+        for index in range(len(chunks)):
+            prepared = await next_chunk
+            if index + 1 < len(chunks):
+                next_chunk = loop.run_in_executor(None, self._prepare, chunks[index + 1], photos)
+            enrolled, failures = await self._enroll_chunk(prepared)
+            self._checkpoint(enrolled)
+            self._report(failures)
+            self.progress["enrolled"] += len(enrolled)
+            processed = sum(len(c) for c in chunks[:index + 1])
+            self.progress["images_per_sec"] = round(processed / (time.perf_counter() - started), 2)
+            logger.info(f"Bulk import: {processed}/{len(pending)} processed, {self.progress}")
+        return self.progress
+
+
+class ImportAlreadyRunning(Exception):
+    pass
+
+
+class BulkImportJobs:
+    """Bulk imports started over HTTP; one runs at a time so gate traffic keeps its CPU"""
+
+    def __init__(self, work_dir="Storage/Imports"):
+        self.work_dir = work_dir
+        self.jobs = {}
+        self._running = None
+        self._lock = threading.Lock()
+
+    def running(self):
+        return self._running is not None and not self._running.done()
+
+    def start(self, enroller, roster_path, photos_path, job_id):
+        """Schedule the import; raises ImportAlreadyRunning if another one holds the slot"""
+        job = {"job_id": job_id, "status": "running", "progress": enroller.progress,
+               "report": enroller.report_path, "detail": None}
+
+        async def run():
+            try:
+                await enroller.run(roster_path, photos_path)
+                job["status"] = "completed"
+            except Exception as e:
+                logger.exception("Bulk import failed")
+                job["status"] = "failed"
+                job["detail"] = str(e)
+
+        with self._lock:
+            if self.running():
+                raise ImportAlreadyRunning("A bulk import is already running")
+            self.jobs[job_id] = job
+            self._running = asyncio.get_running_loop().create_task(run())
+        return job
+
+
+bulk_import_jobs = BulkImportJobs()
@@ -0,0 +1,286 @@
+import json
+import logging
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_WRITES = 500
+
+
+class DeviceNotFound(Exception):
+    pass
+
+
+class LocalDeviceStore:
+    """In-memory stand-in for the Firestore devices collection (tests, offline runs)"""
+
+    def __init__(self, initial=None):
+        self._docs = {k: dict(v) for k, v in (initial or {}).items()}
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def watch(self, on_change):
+        """Emit the current contents, then every later change, to on_change"""
+        with self._lock:
+            self._listeners.append(on_change)
+            changes = [("ADDED", doc_id, dict(data)) for doc_id, data in self._docs.items()]
+        on_change(changes)
+
+    def _emit(self, changes):
+        for listener in list(self._listeners):
+            listener(changes)
+
+    def create(self, data):
+        doc_id = uuid.uuid4().hex[:20]
+        with self._lock:
+            self._docs[doc_id] = dict(data)
+        self._emit([("ADDED", doc_id, dict(data))])
+        return doc_id
+
+    def update(self, doc_id, data):
+        with self._lock:
+            if doc_id not in self._docs:
+                raise DeviceNotFound(doc_id)
+            self._docs[doc_id].update(data)
+            merged = dict(self._docs[doc_id])
+        self._emit([("MODIFIED", doc_id, merged)])
+
+    def delete(self, doc_id):
+        with self._lock:
+            if self._docs.pop(doc_id, None) is None:
+                raise DeviceNotFound(doc_id)
+        self._emit([("REMOVED", doc_id, None)])
+
+    def commit_batch(self, upserts):
+        """Apply {doc_id: fields} merges as one atomic step"""
+        changes = []
+        with self._lock:
+            for doc_id, data in upserts.items():
+                kind = "MODIFIED" if doc_id in self._docs else "ADDED"
+                self._docs.setdefault(doc_id, {}).update(data)
+                changes.append((kind, doc_id, dict(self._docs[doc_id])))
+        self._emit(changes)
+
+    def close(self):
+        self._listeners.clear()
+
+
+class FirestoreDeviceStore:
+    """Devices collection in Firestore, replicated through a snapshot listener"""
+
+    def __init__(self, db, collection="devices"):
+        from google.api_core.exceptions import NotFound
+
+        self._not_found = NotFound
+        self.db = db
+        self.collection = db.collection(collection)
+        self._watch = None
+
+    def watch(self, on_change):
+        def on_snapshot(_snapshot, changes, _read_time):
+            on_change([
+                (change.type.name, change.document.id,
+                 change.document.to_dict() if change.type.name != "REMOVED" else None)
+                for change in changes
+            ])
+
+        self._watch = self.collection.on_snapshot(on_snapshot)
+
+    def create(self, data):
+        doc_ref = self.collection.document()
+        doc_ref.create(data)
+        return doc_ref.id
+
+    def update(self, doc_id, data):
+        # update() carries an implicit exists precondition, so a missing
+        # device fails server side without a separate read
+        try:
+            self.collection.document(doc_id).update(data)
+        except self._not_found:
+            raise DeviceNotFound(doc_id)
+
+    def delete(self, doc_id):
+        try:
+            self.collection.document(doc_id).delete(option=self.db.write_option(exists=True))
+        except self._not_found:
+            raise DeviceNotFound(doc_id)
+
+    def commit_batch(self, upserts):
+        items = list(upserts.items())
+        for start in range(0, len(items), MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for doc_id, data in items[start:start + MAX_BATCH_WRITES]:
+                batch.set(self.collection.document(doc_id), data, merge=True)
+            batch.commit()
+
+    def close(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+
+class SqliteDeviceStore:
+    """Devices table in the embedded SQLite database (single-process deployments)"""
+
+    def __init__(self, database):
+        self.database = database
+        self._listeners = []
+
+    def watch(self, on_change):
+        # The process owning the database is the only writer, so the initial
+        # load plus local write-through keeps the replica exact
+        self._listeners.append(on_change)
+        rows = self.database.execute("SELECT id, data FROM devices").fetchall()
+        on_change([("ADDED", doc_id, json.loads(data)) for doc_id, data in rows])
+
+    def create(self, data):
+        doc_id = uuid.uuid4().hex[:20]
+        self.database.execute("INSERT INTO devices (id, data) VALUES (?, ?)", (doc_id, json.dumps(data)))
+        return doc_id
+
+    def update(self, doc_id, data):
+        # json_patch merges in a single conditional UPDATE; no prior read needed
+        cursor = self.database.execute(
+            "UPDATE devices SET data = json_patch(data, ?) WHERE id = ?", (json.dumps(data), doc_id)
+        )
+        if cursor.rowcount == 0:
+            raise DeviceNotFound(doc_id)
+
+    def delete(self, doc_id):
+        cursor = self.database.execute("DELETE FROM devices WHERE id = ?", (doc_id,))
+        if cursor.rowcount == 0:
+            raise DeviceNotFound(doc_id)
+
+    def commit_batch(self, upserts):
+        self.database.executemany(
+            "INSERT INTO devices (id, data) VALUES (?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = json_patch(data, excluded.data)",
+            [(doc_id, json.dumps(data)) for doc_id, data in upserts.items()]
+        )
+
+    def close(self):
+        self._listeners.clear()
+
+
+class DeviceRegistry:
+    """
+    In-memory replica of the devices collection.
+    Reads are served from memory; the backing store's change feed keeps the
+    replica current, and every mutation is applied locally as soon as the
+    store accepts it so callers read their own writes.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._devices = {}
+        self._generations = {}
+        self._generation = 0
+        self._epoch = uuid.uuid4().hex[:8]
+        self._listing = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def start(self):
+        self.store.watch(self._apply_changes)
+
+    def wait_ready(self, timeout=10.0):
+        return self._ready.wait(timeout)
+
+    def close(self):
+        self.store.close()
+
+    def _apply_changes(self, changes):
+        with self._lock:
+            for kind, doc_id, data in changes:
+                self._generation += 1
+                if kind == "REMOVED":
+                    self._devices.pop(doc_id, None)
+                    self._generations.pop(doc_id, None)
+                else:
+                    self._devices[doc_id] = data
+                    self._generations[doc_id] = self._generation
+            if changes:
+                self._listing = None
+        self._ready.set()
+
+    @property
+    def etag(self):
+        return f'"{self._epoch}-{self._generation}"'
+
+    def device_etag(self, device_id):
+        return f'"{self._epoch}-{self._generations.get(device_id, 0)}"'
+
+    def list(self):
+        with self._lock:
+            if self._listing is None:
+                self._listing = [{"id": doc_id, **data} for doc_id, data in self._devices.items()]
+            return self._listing
+
+    def get(self, device_id):
+        data = self._devices.get(device_id)
+        if data is None:
+            return None
+        return {"id": device_id, **data}
+
+    def create(self, data):
+        device_id = self.store.create(data)
+        self._apply_changes([("ADDED", device_id, dict(data))])
+        return device_id
+
+    def update(self, device_id, data):
+        self.store.update(device_id, data)
+        merged = {**self._devices.get(device_id, {}), **data}
+        self._apply_changes([("MODIFIED", device_id, merged)])
+
+    def delete(self, device_id):
+        self.store.delete(device_id)
+        self._apply_changes([("REMOVED", device_id, None)])
+
+    def bulk_upsert(self, upserts):
+        """Update or provision many devices in a single batched commit"""
+        self.store.commit_batch(upserts)
+        self._apply_changes([
+            ("MODIFIED" if doc_id in self._devices else "ADDED", doc_id,
+             {**self._devices.get(doc_id, {}), **data})
+            for doc_id, data in upserts.items()
+        ])
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_device_registry():
+    """
+    Application-wide registry. The store follows STORAGE_BACKEND unless
+    DEVICE_STORE overrides it; DEVICE_STORE=local selects the in-memory stand-in.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                backend = os.getenv("DEVICE_STORE") or os.getenv("STORAGE_BACKEND", "firestore")
+                if backend == "local":
+                    store = LocalDeviceStore()
+                elif backend == "sqlite":
+                    from services.sqlite_repository import get_sqlite_database
+                    store = SqliteDeviceStore(get_sqlite_database())
+                else:
+                    from config.firebase_config import get_firestore_client
+                    store = FirestoreDeviceStore(get_firestore_client())
+                registry = DeviceRegistry(store)
+                registry.start()
+                if not registry.wait_ready():
+                    logger.warning("Device registry started before the initial snapshot arrived")
+                _registry = registry
+    return _registry
+
+
+def close_device_registry():
+    global _registry
+    if _registry is not None:
+        _registry.close()
+        _registry = None
@@ -0,0 +1,80 @@
+"""
+Versioned binary encoding for face embeddings stored in user documents.
+
+    magic "FE" | version u8 | dtype u8 | dim u16 | scale f32 | model length u8 | model | payload
+
+The payload is float32, float16 or int8 (multiplied by scale on decode).
+Firestore stores the result as a bytes field: 2 KB for float32, 0.5 KB for
+int8, against 4 KB for the legacy array of 512 doubles. decode_embedding
+still accepts the legacy list form, so documents can migrate lazily.
+"""
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"FE"
+VERSION = 1
+HEADER = struct.Struct("<2sBBHfB")
+DTYPE_CODES = {"float32": 0, "float16": 1, "int8": 2}
+CODE_DTYPES = {code: name for name, code in DTYPE_CODES.items()}
+
+# Embeddings from different models are not comparable; every encoded vector records its model
+EMBEDDING_MODEL = "facenet-vggface2/1"
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32")
+
+
+def encode_embedding(vector, dtype=EMBEDDING_DTYPE, model=EMBEDDING_MODEL):
+    """Pack an embedding into the binary format"""
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    scale = 1.0
+    if dtype == "int8":
+        peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = peak / 127.0 if peak else 1.0
+        payload = np.clip(np.round(vector / scale), -127, 127).astype(np.int8)
+    elif dtype in ("float32", "float16"):
+        payload = vector.astype("<f4" if dtype == "float32" else "<f2")
+    else:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    model_bytes = model.encode("utf-8")
+    header = HEADER.pack(MAGIC, VERSION, DTYPE_CODES[dtype], vector.size, scale, len(model_bytes))
+    return header + model_bytes + payload.tobytes()
+
+
+def embedding_info(value):
+    """Metadata of a stored embedding: {"format", "dtype", "dim", "model"} (legacy lists have no model)"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        magic, version, code, dim, scale, model_len = HEADER.unpack_from(value)
+        if magic != MAGIC:
+            raise ValueError("Not an encoded face embedding")
+        model = bytes(value[HEADER.size:HEADER.size + model_len]).decode("utf-8")
+        return {"format": f"v{version}", "dtype": CODE_DTYPES[code], "dim": dim, "model": model}
+    return {"format": "legacy", "dtype": "float64", "dim": len(value), "model": None}
+
+
+def decode_embedding(value):
+    """float32 vector from an encoded embedding, a legacy list or an ndarray; None stays None"""
+    if value is None:
+        return None
+    if isinstance(value, np.ndarray):
+        return value.astype(np.float32).reshape(-1)
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        return np.asarray(value, dtype=np.float32).reshape(-1)
+
+    magic, version, code, dim, scale, model_len = HEADER.unpack_from(value)
+    if magic != MAGIC:
+        raise ValueError("Not an encoded face embedding")
+    if version != VERSION:
+        raise ValueError(f"Unsupported embedding format version {version}")
+    dtype = {"float32": "<f4", "float16": "<f2", "int8": "i1"}[CODE_DTYPES[code]]
+    vector = np.frombuffer(value, dtype=dtype, count=dim, offset=HEADER.size + model_len).astype(np.float32)
+    return vector * scale if CODE_DTYPES[code] == "int8" else vector
+
+
+def needs_reencoding(value, dtype=EMBEDDING_DTYPE):
+    """True for legacy lists and for encodings in a different dtype"""
+    if not value:
+        return False
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        return True
+    return embedding_info(value)["dtype"] != dtype
@@ -0,0 +1,173 @@
+"""
+Interchangeable face detectors behind one interface.
+Also runs on iot-edge, which vendors this file (iot-edge/shared_modules.py).
+
+Every detector takes RGB uint8 arrays and returns, per image, either None
+(no face) or (boxes, probs, landmarks):
+
+    boxes      float32 (n, 4)     x1, y1, x2, y2 in input pixels, largest face first
+    probs      float32 (n,)       detector confidence (1.0 for cascades, which have none)
+    landmarks  float32 (n, 5, 2)  eyes, nose, mouth corners in MTCNN's order
+                                  (image-left point of each pair first), or None
+
+MTCNN.extract crops the FaceNet input from the box alone, so the embedding
+code does not care which detector found it.
+
+    mtcnn   three-stage MTCNN cascade (accurate, slowest on a Pi)
+    haar    OpenCV's bundled frontal-face Haar cascade
+    lbp     an LBP cascade file (model_path), faster than Haar
+    dnn     OpenCV DNN model from model_path: YuNet .onnx (with landmarks)
+            or the res10 SSD .caffemodel (deploy.prototxt next to it)
+"""
+import logging
+import os
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DETECTORS = ("mtcnn", "haar", "lbp", "dnn")
+
+
+def _sorted(boxes, probs, landmarks=None):
+    """Common output for one image: float32 arrays, largest box first, or None"""
+    if boxes is None or len(boxes) == 0:
+        return None
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    probs = np.asarray(probs, dtype=np.float32).reshape(-1)
+    order = np.argsort((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]))[::-1]
+    if landmarks is not None:
+        landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 5, 2)[order]
+    return boxes[order], probs[order], landmarks
+
+
+class FaceDetector:
+    name = "base"
+
+    def detect(self, image):
+        """(boxes, probs, landmarks) for one RGB array, or None"""
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, images):
+        return [self._detect_one(image) for image in images]
+
+    def _detect_one(self, image):
+        raise NotImplementedError
+
+
+class MTCNNDetector(FaceDetector):
+    """facenet-pytorch MTCNN; batches equal-sized images in one pass"""
+    name = "mtcnn"
+
+    def __init__(self, mtcnn):
+        self.mtcnn = mtcnn
+
+    def detect_batch(self, images):
+        boxes, probs, points = self.mtcnn.detect(images, landmarks=True)
+        return [_sorted(b, p, l) if b is not None else None for b, p, l in zip(boxes, probs, points)]
+
+
+class CascadeDetector(FaceDetector):
+    """Haar or LBP cascade: no landmarks or scores, a few ms per VGA frame"""
+
+    def __init__(self, path, name="haar", min_size=40, scale_factor=1.1, min_neighbors=5):
+        if not hasattr(cv2, "CascadeClassifier"):
+            raise RuntimeError("This OpenCV build has no CascadeClassifier (moved to contrib in 5.x)")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Cascade file not found: {path}")
+        self.name = name
+        self.cascade = cv2.CascadeClassifier(path)
+        self.min_size = min_size
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def _detect_one(self, image):
+        gray = cv2.equalizeHist(cv2.cvtColor(image, cv2.COLOR_RGB2GRAY))
+        found = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                              minSize=(self.min_size, self.min_size))
+        if len(found) == 0:
+            return None
+        boxes = [(x, y, x + w, y + h) for x, y, w, h in found]
+        return _sorted(boxes, np.ones(len(boxes)))
+
+
+class YuNetDetector(FaceDetector):
+    """OpenCV FaceDetectorYN with a local YuNet .onnx; boxes, scores and 5 landmarks"""
+    name = "dnn"
+
+    def __init__(self, model_path, score_threshold=0.7, min_size=40):
+        self.model = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold)
+        self.min_size = min_size
+
+    def _detect_one(self, image):
+        height, width = image.shape[:2]
+        self.model.setInputSize((width, height))
+        _, faces = self.model.detect(cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+        if faces is None:
+            return None
+        faces = faces[np.minimum(faces[:, 2], faces[:, 3]) >= self.min_size]
+        boxes = np.column_stack([faces[:, 0], faces[:, 1], faces[:, 0] + faces[:, 2], faces[:, 1] + faces[:, 3]])
+        landmarks = faces[:, 4:14].reshape(-1, 5, 2).copy()
+        # YuNet names the pairs from the subject's side; put the image-left point first like MTCNN
+        mirrored = landmarks[:, 0, 0] > landmarks[:, 1, 0]
+        landmarks[mirrored] = landmarks[mirrored][:, [1, 0, 2, 4, 3]]
+        return _sorted(boxes, faces[:, 14], landmarks)
+
+
+class SSDDetector(FaceDetector):
+    """OpenCV's res10 300x300 SSD face model (Caffe); boxes and scores"""
+    name = "dnn"
+
+    def __init__(self, model_path, config_path, score_threshold=0.7, min_size=40):
+        self.net = cv2.dnn.readNetFromCaffe(config_path, model_path)
+        self.score_threshold = score_threshold
+        self.min_size = min_size
+
+    def _detect_one(self, image):
+        height, width = image.shape[:2]
+        bgr = cv2.cvtColor(cv2.resize(image, (300, 300)), cv2.COLOR_RGB2BGR)
+        blob = cv2.dnn.blobFromImage(bgr, 1.0, (300, 300), (104, 177, 123))
+        self.net.setInput(blob)
+        detections = self.net.forward().reshape(-1, 7)
+        detections = detections[detections[:, 2] >= self.score_threshold]
+        boxes = np.clip(detections[:, 3:7], 0, 1) * [width, height, width, height]
+        keep = np.minimum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]) >= self.min_size
+        return _sorted(boxes[keep], detections[keep, 2])
+
+
+def make_detector(name="mtcnn", model_path=None, mtcnn=None, min_size=40):
+    """Detector for a deployment setting (FACE_DETECTOR / FACE_DETECTOR_MODEL)"""
+    name = (name or "mtcnn").lower()
+    if name == "mtcnn":
+        if mtcnn is None:
+            raise ValueError("The mtcnn detector needs an MTCNN instance")
+        return MTCNNDetector(mtcnn)
+    if name == "haar":
+        path = model_path or os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        return CascadeDetector(path, "haar", min_size)
+    if name == "lbp":
+        if not model_path:
+            raise ValueError("The lbp detector needs model_path (e.g. lbpcascade_frontalface_improved.xml)")
+        return CascadeDetector(model_path, "lbp", min_size)
+    if name == "dnn":
+        if not model_path or not os.path.exists(model_path):
+            raise FileNotFoundError(f"DNN face model not found: {model_path}")
+        if model_path.endswith(".onnx"):
+            return YuNetDetector(model_path, min_size=min_size)
+        config_path = os.path.join(os.path.dirname(model_path), "deploy.prototxt")
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(f"Caffe model needs {config_path}")
+        return SSDDetector(model_path, config_path, min_size=min_size)
+    raise ValueError(f"Unknown face detector '{name}' (choose from {', '.join(DETECTORS)})")
+
+
+def load_detector(name="mtcnn", model_path=None, mtcnn=None, min_size=40):
+    """make_detector, falling back to MTCNN when the configured detector cannot be loaded"""
+    try:
+        return make_detector(name, model_path, mtcnn, min_size)
+    except (ValueError, RuntimeError, OSError, cv2.error) as e:
+        if mtcnn is None:
+            raise
+        logger.warning(f"Face detector '{name}' unavailable ({e}), using MTCNN")
+        return MTCNNDetector(mtcnn)
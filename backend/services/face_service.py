@@ -1,92 +1,296 @@
+import cv2
 import torch
 from facenet_pytorch import MTCNN, InceptionResnetV1
-from PIL import Image
 import numpy as np
 import os
-import io
+import time
+from scipy.optimize import linear_sum_assignment
 from scipy.spatial.distance import cosine
 
+from services.embedding_codec import EMBEDDING_MODEL, decode_embedding, embedding_info
+from services.face_detectors import load_detector
+from services.gallery import Gallery
+from services.image_decode import to_rgb_array
+from services.metrics import metrics
+
+# The detector runs on a copy capped at this long side (0 = full resolution); crops still come from the original
+DETECT_MAX_SIDE = int(os.getenv("FACE_DETECT_MAX_SIDE", "640"))
+# mtcnn, haar, lbp or dnn (see services/face_detectors.py); the model file for lbp/dnn
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "mtcnn")
+FACE_DETECTOR_MODEL = os.getenv("FACE_DETECTOR_MODEL")
+MATCH_THRESHOLD = 0.6
+# Group mode: faces considered per frame and the detector confidence a face needs to count
+MAX_GROUP_FACES = 8
+GROUP_MIN_PROB = 0.9
+
 class FaceService:
-    def __init__(self, known_faces_dir="known_faces"):
+    def __init__(self, known_faces_dir="known_faces", detect_max_side=DETECT_MAX_SIDE,
+                 detector=FACE_DETECTOR, detector_model=FACE_DETECTOR_MODEL):
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.known_faces_dir = known_faces_dir
+        self.detect_max_side = detect_max_side
         os.makedirs(self.known_faces_dir, exist_ok=True)
         
+        started = time.perf_counter()
         self.mtcnn = MTCNN(
             image_size=160, margin=20, min_face_size=40,
             thresholds=[0.6, 0.7, 0.7], factor=0.709,
             post_process=True, device=self.device
         )
+        # MTCNN always crops and aligns; detection itself is per deployment
+        self.detector = load_detector(detector, detector_model, mtcnn=self.mtcnn)
         self.model = InceptionResnetV1(pretrained='vggface2').eval().to(self.device)
-        self.embeddings = {}
+        metrics.gauge("face_model_load_seconds", round(time.perf_counter() - started, 3),
+                      "Time taken to load MTCNN and InceptionResnetV1 at startup")
+        self.gallery = None
         self.load_known_faces()
 
     def load_known_faces(self):
-        """Load all registered face embeddings from the known_faces directory"""
-        # For now, we expect .npy files or we'll process .jpg files on the fly
+        """Open the known_faces gallery (memory-mapped), migrating legacy files on first run"""
+        self.gallery = Gallery(os.path.join(self.known_faces_dir, "gallery.bin"))
+        imported = self.gallery.import_npy_dir(self.known_faces_dir)
+        if imported:
+            print(f"Migrated {imported} legacy embedding file(s) into the face gallery")
+        # Photos dropped into known_faces/ are still enrolled on the fly, once
+        done = self.gallery.imported()
+        enrolled = []
         for filename in os.listdir(self.known_faces_dir):
-            if filename.endswith(".npy"):
-                name = filename.replace("_embedding.npy", "")
-                self.embeddings[name] = np.load(os.path.join(self.known_faces_dir, filename))
-            elif filename.endswith((".jpg", ".png")):
+            if filename.endswith((".jpg", ".png")):
                 name = os.path.splitext(filename)[0]
-                self.register_face(name, os.path.join(self.known_faces_dir, filename))
-
-    def get_embedding(self, image_input):
-        """Generate a 128D embedding from an image (PIL object or path or bytes)"""
-        if isinstance(image_input, (str, bytes)):
-            if isinstance(image_input, bytes):
-                img = Image.open(io.BytesIO(image_input)).convert('RGB')
-            else:
-                img = Image.open(image_input).convert('RGB')
-        else:
-            img = image_input.convert('RGB')
-            
-        face = self.mtcnn(img)
+                if name not in self.gallery and name not in done:
+                    self.register_face(name, os.path.join(self.known_faces_dir, filename))
+                if name in self.gallery and name not in done:
+                    enrolled.append(name)
+        if enrolled:
+            self.gallery.mark_imported(enrolled)
+
+    def get_embedding(self, image_input, channel_order="BGR"):
+        """
+        Generate a 512D embedding from an image: encoded bytes, a path, a PIL
+        image or a numpy frame (BGR as OpenCV captures it, or channel_order="RGB")
+        """
+        with metrics.stage("face.decode"):
+            img = to_rgb_array(image_input, channel_order)
+
+        face = self.detect_faces([img])[0]
         if face is None:
             return None
         
-        with torch.no_grad():
+        with metrics.stage("face.resnet"), torch.no_grad():
             embedding = self.model(face.unsqueeze(0).to(self.device)).detach().cpu().numpy()
         
         # Normalize
         embedding = embedding / np.linalg.norm(embedding)
         return embedding
 
+    def detect_boxes(self, images):
+        """
+        (boxes, probs) per equal-sized RGB array, in full-resolution
+        coordinates, largest face first. The detector sees copies capped at
+        detect_max_side, so its cost no longer grows with the upload.
+        """
+        height, width = images[0].shape[:2]
+        scale = self.detect_max_side / max(height, width) if self.detect_max_side else 1.0
+        small = images
+        if scale < 1.0:
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            with metrics.stage("face.resize"):
+                small = [cv2.resize(img, size, interpolation=cv2.INTER_AREA) for img in images]
+        with metrics.stage("face.detect"):
+            found = self.detector.detect_batch(small)
+        boxes = [None if f is None else f[0] for f in found]
+        probs = [None if f is None else f[1] for f in found]
+        if scale < 1.0:
+            to_original = np.array([width / size[0], height / size[1]] * 2, dtype=np.float32)
+            boxes = [None if b is None else b * to_original for b in boxes]
+        return boxes, probs
+
+    def detect_faces(self, images):
+        """
+        Aligned 160x160 face tensors (None where no face was found) for
+        equal-sized RGB arrays, cropped from the full-resolution images.
+        """
+        boxes, _ = self.detect_boxes(images)
+        with metrics.stage("face.align"):
+            return self.mtcnn.extract(images, boxes, None)
+
+    def get_all_embeddings(self, image_input, channel_order="BGR", max_faces=MAX_GROUP_FACES):
+        """
+        Every confidently detected face in one image, largest first, embedded
+        in a single batched forward pass: (n x 512 unit embeddings, n x 4 boxes)
+        """
+        with metrics.stage("face.decode"):
+            img = to_rgb_array(image_input, channel_order)
+        (boxes,), (probs,) = self.detect_boxes([img])
+        if boxes is None:
+            return np.zeros((0, 512), dtype=np.float32), np.zeros((0, 4))
+        boxes = boxes[probs >= GROUP_MIN_PROB][:max_faces]
+        if not len(boxes):
+            return np.zeros((0, 512), dtype=np.float32), np.zeros((0, 4))
+        # extract() keeps one box per entry with keep_all=False, so pass the boxes one by one
+        with metrics.stage("face.align"):
+            faces = self.mtcnn.extract([img] * len(boxes), [boxes[[i]] for i in range(len(boxes))], None)
+        with metrics.stage("face.resnet"), torch.no_grad():
+            vectors = self.model(torch.stack(faces).to(self.device)).detach().cpu().numpy()
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True), boxes
+
+    def get_embeddings_batch(self, images, batch_size=32):
+        """
+        Embed many PIL images or RGB ndarrays at once. MTCNN only batches
+        equal-sized images, so detection runs per size group; the aligned faces
+        are then embedded in batches of batch_size. Returns one embedding (or
+        None) per input.
+        """
+        images = [to_rgb_array(img, "RGB") for img in images]
+        faces = [None] * len(images)
+        groups = {}
+        for idx, img in enumerate(images):
+            groups.setdefault(img.shape[:2], []).append(idx)
+        for indices in groups.values():
+            for start in range(0, len(indices), batch_size):
+                chunk = indices[start:start + batch_size]
+                detected = self.detect_faces([images[i] for i in chunk])
+                for i, face in zip(chunk, detected):
+                    faces[i] = face
+
+        embeddings = [None] * len(images)
+        found = [i for i, face in enumerate(faces) if face is not None]
+        for start in range(0, len(found), batch_size):
+            chunk = found[start:start + batch_size]
+            batch = torch.stack([faces[i] for i in chunk]).to(self.device)
+            with metrics.stage("face.resnet"), torch.no_grad():
+                vectors = self.model(batch).detach().cpu().numpy()
+            vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            for i, vector in zip(chunk, vectors):
+                embeddings[i] = vector.reshape(1, -1)
+        return embeddings
+
     def register_face(self, name, image_path):
-        """Process an image and save its embedding"""
+        """Process an image and append its embedding to the gallery"""
         embedding = self.get_embedding(image_path)
         if embedding is not None:
-            output_path = os.path.join(self.known_faces_dir, f"{name}_embedding.npy")
-            np.save(output_path, embedding)
-            self.embeddings[name] = embedding
+            self.gallery.add(name, embedding)
             return True
         return False
 
     def verify_embedding(self, target_face_bytes, known_embedding_list):
-        """Verify face bytes against a specific known embedding"""
+        """Verify face bytes or a BGR frame (or a list of frames of the same person) against a specific known embedding"""
+        if isinstance(target_face_bytes, (list, tuple)):
+            return self.verify_embedding_fused(target_face_bytes, known_embedding_list)
+
+        # Encoded bytes, a legacy float list or an ndarray
+        if isinstance(known_embedding_list, (bytes, bytearray)):
+            model = embedding_info(known_embedding_list)["model"]
+            if model != EMBEDDING_MODEL:
+                return False, f"Stored embedding was made by {model}, re-enrollment required"
+        known_embedding = decode_embedding(known_embedding_list)
+
         target_embedding = self.get_embedding(target_face_bytes)
         if target_embedding is None:
             return False, "No face detected in submitted image"
             
-        # Ensure known is numpy array
-        if isinstance(known_embedding_list, list):
-            known_embedding = np.array(known_embedding_list)
-        else:
-            known_embedding = known_embedding_list
-            
-        distance = cosine(target_embedding.flatten(), known_embedding.flatten())
+        with metrics.stage("face.compare"):
+            distance = float(cosine(target_embedding.flatten(), known_embedding.flatten()))
         
         if distance < 0.6: # Threshold
             return True, distance
         else:
             return False, distance
 
+    def verify_vector(self, embedding, known_embedding_list):
+        """Verify an embedding computed on the gate against a specific known embedding"""
+        known_embedding = self._known_vector(known_embedding_list)
+        if known_embedding is None:
+            return False, "Stored embedding was made by another model, re-enrollment required"
+        with metrics.stage("face.compare"):
+            distance = float(cosine(np.asarray(embedding, dtype=np.float32).flatten(), known_embedding))
+        return bool(distance < MATCH_THRESHOLD), distance
+
+    def verify_embedding_fused(self, face_bytes_list, known_embedding_list):
+        """
+        Verify several frames of one person (an edge burst) in a single batched
+        pass. The unit embeddings of every frame with a face are averaged and
+        re-normalised, which smooths out blur and pose noise of single frames.
+        """
+        if len(face_bytes_list) == 1:
+            return self.verify_embedding(face_bytes_list[0], known_embedding_list)
+        if isinstance(known_embedding_list, (bytes, bytearray)):
+            model = embedding_info(known_embedding_list)["model"]
+            if model != EMBEDDING_MODEL:
+                return False, f"Stored embedding was made by {model}, re-enrollment required"
+        known_embedding = decode_embedding(known_embedding_list)
+
+        with metrics.stage("face.decode"):
+            images = [to_rgb_array(data) for data in face_bytes_list]
+        found = [e.flatten() for e in self.get_embeddings_batch(images) if e is not None]
+        if not found:
+            return False, "No face detected in submitted images"
+
+        fused = np.mean(found, axis=0)
+        distance = float(cosine(fused / np.linalg.norm(fused), known_embedding.flatten()))
+
+        if distance < 0.6: # Threshold
+            return True, distance
+        else:
+            return False, distance
+
+    def _known_vector(self, template):
+        """Unit vector of a stored template, or None when it was made by another model"""
+        if isinstance(template, (bytes, bytearray)) and embedding_info(template)["model"] != EMBEDDING_MODEL:
+            return None
+        vector = decode_embedding(template).flatten().astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def match_faces(self, embeddings, candidates, threshold=MATCH_THRESHOLD):
+        """
+        One-to-one assignment of face embeddings to candidate ids
+        ({id: unit vector}) minimising the total cosine distance, so two
+        faces are never granted the same pass. Returns (id or None, distance)
+        per face; faces left over or farther than threshold get None.
+        """
+        ids = list(candidates)
+        if not len(embeddings) or not ids:
+            return [(None, 1.0)] * len(embeddings)
+        with metrics.stage("face.compare"):
+            distances = 1.0 - embeddings @ np.stack([candidates[i] for i in ids]).T
+            rows, cols = linear_sum_assignment(distances)
+        results = [(None, float(distances[i].min())) for i in range(len(embeddings))]
+        for row, col in zip(rows, cols):
+            if distances[row, col] < threshold:
+                results[row] = (ids[col], float(distances[row, col]))
+        return results
+
+    def verify_group(self, image_input, templates=None, channel_order="BGR", threshold=MATCH_THRESHOLD):
+        """
+        Verify everyone in a group frame at once. Faces are matched against
+        templates ({reg_no: stored embedding}, e.g. the passes just scanned)
+        or, without templates, against the nearest entries of the local gallery.
+        Returns one {"box", "reg_no", "distance", "match"} decision per face.
+        """
+        embeddings, boxes = self.get_all_embeddings(image_input, channel_order)
+        if templates is not None:
+            candidates = {}
+            for reg_no, template in templates.items():
+                vector = self._known_vector(template) if template is not None else None
+                if vector is not None:
+                    candidates[reg_no] = vector
+        else:
+            # A few nearest gallery entries per face are enough to resolve conflicts
+            ids = {id_ for e in embeddings for id_, _ in self.gallery.search(e, k=3)}
+            candidates = {id_: self.gallery.get(id_).flatten() for id_ in ids}
+        matches = self.match_faces(embeddings, candidates, threshold)
+        return [
+            {"box": [round(float(v), 1) for v in box], "reg_no": reg_no,
+             "distance": round(distance, 4), "match": reg_no is not None}
+            for box, (reg_no, distance) in zip(boxes, matches)
+        ]
+
     def verify_face(self, face_image_bytes, expected_name):
         """Verify if the face in face_image_bytes matches expected_name (from loaded files)"""
         # ... existing implementation or wrapper ...
-        if expected_name not in self.embeddings:
+        known_embedding = self.gallery.get(expected_name)
+        if known_embedding is None:
              return False, "User not registered with a face (locally)"
-        return self.verify_embedding(face_image_bytes, self.embeddings[expected_name])
+        return self.verify_embedding(face_image_bytes, known_embedding)
 
 face_service = FaceService()
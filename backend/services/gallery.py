@@ -0,0 +1,372 @@
+"""
+Face gallery file: every enrolled embedding in one memory-mapped matrix.
+
+Layout of <name>.bin
+    64-byte header   magic, version, dtype, dim, count, matrix/index offsets
+    matrix           count x dim float32 or float16, row-major (np.memmap)
+    index            UTF-8 JSON {"ids": [...], "names": [...]}
+
+New enrollments and removals are appended to <name>.bin.log as
+checksummed records and folded into a fresh .bin by compact(), so opening
+a gallery costs one small JSON parse no matter how many faces it holds.
+The same module ships on the edge devices (vendored by iot-edge/shared_modules.py).
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+
+import numpy as np
+
+MAGIC = b"FGAL"
+VERSION = 1
+HEADER = struct.Struct("<4sHBxIQQQQ")
+HEADER_SIZE = 64
+DTYPES = {0: np.float32, 1: np.float16}
+DTYPE_CODES = {np.dtype(v).name: k for k, v in DTYPES.items()}
+
+# Log record: crc32, op, id length, name length, then id, name and (for adds) the vector
+RECORD = struct.Struct("<IBHH")
+OP_ADD = 1
+OP_REMOVE = 2
+
+# Compact once the log holds this many records or a tenth of the gallery, whichever is larger
+COMPACT_MIN_RECORDS = 256
+SEARCH_CHUNK_ROWS = 65536
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def write_gallery(path, ids, names, matrix, dtype="float32"):
+    """Write a complete gallery file atomically (temp file + rename)"""
+    dtype = np.dtype(dtype)
+    matrix = np.ascontiguousarray(matrix, dtype=dtype)
+    dim = matrix.shape[1]
+    index = json.dumps({"ids": list(ids), "names": list(names)}).encode("utf-8")
+    matrix_offset = HEADER_SIZE
+    index_offset = matrix_offset + matrix.nbytes
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        header = HEADER.pack(MAGIC, VERSION, DTYPE_CODES[dtype.name], dim, len(ids),
+                             matrix_offset, index_offset, len(index))
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(matrix.tobytes())
+        f.write(index)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    magic, version, code, dim, count, matrix_offset, index_offset, index_length = HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a face gallery")
+    if version != VERSION:
+        raise ValueError(f"{path}: unsupported gallery version {version}")
+    return {
+        "dtype": np.dtype(DTYPES[code]).name, "dim": dim, "count": count,
+        "matrix_offset": matrix_offset, "index_offset": index_offset, "index_length": index_length,
+    }
+
+
+class Gallery:
+    """
+    Read/write view over a gallery file and its append log.
+    Lookups and searches see base rows plus the log; superseded base rows
+    are masked out. Thread-safe: one lock guards every read and write.
+    """
+
+    def __init__(self, path, dim=512, dtype="float32"):
+        self.path = path
+        self.log_path = f"{path}.log"
+        # Legacy files already migrated once; removing such an id must not let it come back
+        self.imported_path = f"{path}.imported"
+        self.dim = dim
+        self.dtype = np.dtype(dtype).name
+        self._lock = threading.RLock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._open()
+
+    # Loading
+
+    def _open(self):
+        self._base = None
+        self._base_ids = []
+        self._base_rows = {}
+        self._names = {}
+        self._dead = np.zeros(0, dtype=bool)
+        self._delta = {}
+        self._log_records = 0
+
+        if os.path.exists(self.path):
+            header = read_header(self.path)
+            self.dtype = header["dtype"]
+            self.dim = header["dim"] or self.dim
+            if header["count"]:
+                self._base = np.memmap(self.path, dtype=self.dtype, mode="r",
+                                       offset=header["matrix_offset"], shape=(header["count"], header["dim"]))
+            with open(self.path, "rb") as f:
+                f.seek(header["index_offset"])
+                index = json.loads(f.read(header["index_length"]))
+            self._base_ids = index["ids"]
+            self._base_rows = {id_: row for row, id_ in enumerate(self._base_ids)}
+            self._names = dict(zip(self._base_ids, index["names"]))
+            self._dead = np.zeros(len(self._base_ids), dtype=bool)
+        self._replay_log()
+
+    def _replay_log(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + RECORD.size <= len(data):
+            crc, op, id_len, name_len = RECORD.unpack_from(data, offset)
+            body_len = id_len + name_len + (self.dim * 4 if op == OP_ADD else 0)
+            body = data[offset + RECORD.size:offset + RECORD.size + body_len]
+            if len(body) < body_len or zlib.crc32(bytes([op]) + body) != crc:
+                break  # torn tail from an interrupted append
+            id_ = body[:id_len].decode("utf-8")
+            name = body[id_len:id_len + name_len].decode("utf-8")
+            if op == OP_ADD:
+                self._apply_add(id_, name, np.frombuffer(body[id_len + name_len:], dtype=np.float32))
+            else:
+                self._apply_remove(id_)
+            offset += RECORD.size + body_len
+            self._log_records += 1
+        if offset < len(data):
+            with open(self.log_path, "r+b") as f:
+                f.truncate(offset)
+
+    def _apply_add(self, id_, name, vector):
+        if id_ in self._base_rows:
+            self._dead[self._base_rows[id_]] = True
+        self._delta[id_] = vector
+        self._names[id_] = name
+
+    def _apply_remove(self, id_):
+        if id_ in self._base_rows:
+            self._dead[self._base_rows[id_]] = True
+        self._delta.pop(id_, None)
+        self._names.pop(id_, None)
+
+    # Reads
+
+    def __len__(self):
+        with self._lock:
+            return len(self._base_ids) - int(self._dead.sum()) + len(self._delta)
+
+    def __contains__(self, id_):
+        with self._lock:
+            return id_ in self._delta or (id_ in self._base_rows and not self._dead[self._base_rows[id_]])
+
+    @property
+    def ids(self):
+        with self._lock:
+            return [id_ for row, id_ in enumerate(self._base_ids) if not self._dead[row]] + list(self._delta)
+
+    @property
+    def log_records(self):
+        return self._log_records
+
+    def name(self, id_):
+        return self._names.get(id_)
+
+    def get(self, id_):
+        """Embedding for id_ as a float32 vector, or None"""
+        with self._lock:
+            if id_ in self._delta:
+                return self._delta[id_].copy()
+            row = self._base_rows.get(id_)
+            if row is None or self._dead[row]:
+                return None
+            return np.array(self._base[row], dtype=np.float32)
+
+    def snapshot(self):
+        """(ids, float32 matrix) of every live embedding; materializes the whole gallery"""
+        with self._lock:
+            live = np.flatnonzero(~self._dead)
+            ids = [self._base_ids[row] for row in live] + list(self._delta)
+            parts = []
+            if len(live):
+                parts.append(np.asarray(self._base[live], dtype=np.float32))
+            if self._delta:
+                parts.append(np.stack(list(self._delta.values())))
+            matrix = np.concatenate(parts) if parts else np.zeros((0, self.dim), dtype=np.float32)
+            return ids, matrix
+
+    def search(self, query, k=1):
+        """Exact top-k by cosine distance: [(id, distance), ...] nearest first"""
+        q = _normalize(query)
+        with self._lock:
+            ids, scores = [], []
+            if self._base is not None:
+                for start in range(0, len(self._base_ids), SEARCH_CHUNK_ROWS):
+                    block = np.asarray(self._base[start:start + SEARCH_CHUNK_ROWS], dtype=np.float32) @ q
+                    block[self._dead[start:start + SEARCH_CHUNK_ROWS]] = -np.inf
+                    scores.append(block)
+                ids.extend(self._base_ids)
+            if self._delta:
+                scores.append(np.stack(list(self._delta.values())) @ q)
+                ids.extend(self._delta)
+        if not ids:
+            return []
+        scores = np.concatenate(scores)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], float(1.0 - scores[i])) for i in top if np.isfinite(scores[i])]
+
+    # Writes
+
+    def _append(self, records):
+        """Append (op, id, name, vector) records to the log with a single fsync"""
+        chunks = []
+        for op, id_, name, vector in records:
+            id_bytes, name_bytes = id_.encode("utf-8"), name.encode("utf-8")
+            body = id_bytes + name_bytes + (vector.astype(np.float32).tobytes() if vector is not None else b"")
+            chunks.append(RECORD.pack(zlib.crc32(bytes([op]) + body), op, len(id_bytes), len(name_bytes)) + body)
+        with open(self.log_path, "ab") as f:
+            f.write(b"".join(chunks))
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_records += len(chunks)
+
+    def add(self, id_, embedding, name=None):
+        """Enroll or replace one embedding (durable once this returns)"""
+        self.add_many([(id_, embedding, name)])
+
+    def add_many(self, entries):
+        """Enroll or replace several (id, embedding, name) entries with one log write"""
+        records = []
+        for id_, embedding, name in entries:
+            vector = _normalize(embedding)
+            if vector.shape[0] != self.dim:
+                raise ValueError(f"Expected a {self.dim}-d embedding, got {vector.shape[0]}")
+            records.append((OP_ADD, id_, name or id_, vector))
+        if not records:
+            return
+        with self._lock:
+            self._append(records)
+            for _, id_, name, vector in records:
+                self._apply_add(id_, name, vector)
+            self._maybe_compact()
+
+    def remove(self, id_):
+        with self._lock:
+            if id_ not in self:
+                return False
+            self._append([(OP_REMOVE, id_, "", None)])
+            self._apply_remove(id_)
+            self._maybe_compact()
+            return True
+
+    def _maybe_compact(self):
+        if self._log_records >= max(COMPACT_MIN_RECORDS, len(self._base_ids) // 10):
+            self.compact()
+
+    def compact(self, dtype=None):
+        """Fold the log into a new gallery file and start an empty log"""
+        with self._lock:
+            ids, matrix = self.snapshot()
+            # Release the old mapping before the rename (required on Windows)
+            self._base = None
+            write_gallery(self.path, ids, [self._names[i] for i in ids], matrix, dtype or self.dtype)
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            self._open()
+
+    def export(self, path, dtype=None):
+        """Write a compacted copy, e.g. float16 for edge devices"""
+        with self._lock:
+            ids, matrix = self.snapshot()
+            write_gallery(path, ids, [self._names[i] for i in ids], matrix, dtype or self.dtype)
+
+    def imported(self):
+        """Names of legacy files (npy embeddings, dropped-in photos) migrated in an earlier run"""
+        if not os.path.exists(self.imported_path):
+            return set()
+        with open(self.imported_path, encoding="utf-8") as f:
+            return {line.rstrip("\n") for line in f if line.strip()}
+
+    def mark_imported(self, names):
+        with self._lock, open(self.imported_path, "a", encoding="utf-8") as f:
+            f.writelines(f"{name}\n" for name in names)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def import_npy_dir(self, directory, suffix="_embedding.npy"):
+        """Migrate legacy per-person <name>_embedding.npy files once; returns the number imported"""
+        entries = []
+        with self._lock:
+            done = self.imported()
+            found = [f[:-len(suffix)] for f in sorted(os.listdir(directory)) if f.endswith(suffix)]
+            found = [name for name in found if name not in done]
+            for name in found:
+                if name not in self:
+                    entries.append((name, np.load(os.path.join(directory, name + suffix)), name))
+            if entries:
+                self.add_many(entries)
+                self.compact()
+            if found:
+                self.mark_imported(found)
+        return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and convert face gallery files")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="print header and entry count")
+    info.add_argument("gallery")
+    npy = sub.add_parser("import-npy", help="import a folder of <name>_embedding.npy files")
+    npy.add_argument("directory")
+    npy.add_argument("gallery")
+    export = sub.add_parser("export", help="write a compacted copy (optionally float16)")
+    export.add_argument("gallery")
+    export.add_argument("output")
+    export.add_argument("--dtype", choices=sorted(DTYPE_CODES), default=None)
+    merge = sub.add_parser("merge", help="add every entry of one gallery into another")
+    merge.add_argument("source")
+    merge.add_argument("gallery")
+    compact = sub.add_parser("compact", help="fold the append log into the gallery file")
+    compact.add_argument("gallery")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        gallery = Gallery(args.gallery)
+        header = read_header(args.gallery) if os.path.exists(args.gallery) else {}
+        print(f"📁 {args.gallery}")
+        print(f"   dtype: {gallery.dtype}, dim: {gallery.dim}")
+        print(f"   base rows: {header.get('count', 0)}, pending log records: {gallery.log_records}")
+        print(f"   live entries: {len(gallery)}")
+    elif args.command == "import-npy":
+        count = Gallery(args.gallery).import_npy_dir(args.directory)
+        print(f"✅ Imported {count} embedding(s) into {args.gallery}")
+    elif args.command == "export":
+        Gallery(args.gallery).export(args.output, args.dtype)
+        print(f"✅ Exported {args.gallery} -> {args.output}")
+    elif args.command == "merge":
+        source = Gallery(args.source)
+        target = Gallery(args.gallery, dim=source.dim)
+        ids, matrix = source.snapshot()
+        target.add_many([(id_, vector, source.name(id_)) for id_, vector in zip(ids, matrix)])
+        target.compact()
+        print(f"✅ Merged {len(ids)} embedding(s) into {args.gallery}")
+    elif args.command == "compact":
+        Gallery(args.gallery).compact()
+        print(f"✅ Compacted {args.gallery}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
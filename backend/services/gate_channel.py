@@ -0,0 +1,96 @@
+"""
+Registry of connected gate channels and the push side of the protocol.
+
+Every connection gets an outgoing queue drained by its own sender task, so
+RESULT frames of concurrent verifications and PUSH frames never interleave
+mid-message. publish() may be called from any thread (request handlers,
+background jobs); the frame is handed to the event loop that owns the sockets.
+"""
+import asyncio
+import hmac
+import logging
+import os
+import time
+
+from services.gate_protocol import PUSH, device_token, encode
+
+logger = logging.getLogger(__name__)
+
+# Channel is disabled unless set; each device authenticates with device_token(secret, device_id)
+GATE_CHANNEL_SECRET = os.getenv("GATE_CHANNEL_SECRET")
+HEARTBEAT_SECONDS = 10
+MAX_IN_FLIGHT = 8  # concurrent verifications per device
+SEND_QUEUE_FRAMES = 256
+
+
+class GateConnection:
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.connected_at = time.time()
+        self.outbox = asyncio.Queue(SEND_QUEUE_FRAMES)
+        self.in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+        self.requests = 0
+
+    def send(self, frame):
+        try:
+            self.outbox.put_nowait(frame)
+        except asyncio.QueueFull:
+            logger.warning(f"Gate channel {self.device_id}: send queue full, frame dropped")
+
+
+class GateChannelHub:
+    def __init__(self, secret=GATE_CHANNEL_SECRET):
+        self.secret = secret
+        self.connections = {}  # device_id -> GateConnection
+        self.loop = None
+
+    @property
+    def enabled(self):
+        return bool(self.secret)
+
+    def authenticate(self, device_id, token):
+        if not self.secret or not device_id or not token:
+            return False
+        return hmac.compare_digest(token, device_token(self.secret, device_id))
+
+    def register(self, connection):
+        self.loop = asyncio.get_running_loop()
+        previous = self.connections.get(connection.device_id)
+        self.connections[connection.device_id] = connection
+        return previous
+
+    def unregister(self, connection):
+        if self.connections.get(connection.device_id) is connection:
+            del self.connections[connection.device_id]
+
+    def publish(self, event, data=None, device_id=None):
+        """Push an event to every connected gate (or one); safe from any thread"""
+        if self.loop is None or not self.connections:
+            return
+        frame = encode(PUSH, 0, {"event": event, **(data or {})})
+
+        def fan_out():
+            targets = [self.connections.get(device_id)] if device_id else list(self.connections.values())
+            for connection in targets:
+                if connection is not None:
+                    connection.send(frame)
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            fan_out()
+        else:
+            self.loop.call_soon_threadsafe(fan_out)
+
+    def status(self):
+        now = time.time()
+        return {
+            device_id: {"connected_seconds": round(now - c.connected_at, 1), "requests": c.requests,
+                        "queued_frames": c.outbox.qsize()}
+            for device_id, c in self.connections.items()
+        }
+
+
+gate_hub = GateChannelHub()
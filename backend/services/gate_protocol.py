@@ -0,0 +1,83 @@
+"""
+Binary framing of the gate channel, a long-lived WebSocket per edge device.
+Also runs on iot-edge, which vendors this file (iot-edge/shared_modules.py).
+
+Every WebSocket binary message is one frame (big-endian):
+
+    type u8 | flags u8 | request id u32 | meta length u16 | meta (UTF-8 JSON) | payload
+
+meta carries the small fields (QR content, the verify result), payload the
+bulk bytes: JPEG frames back to back, or a float32 embedding. A 30 kB JPEG
+travels as is, without multipart or base64 encoding. Requests and their
+RESULT/ERROR share a request id, so several can be in flight at once.
+
+    client                               server
+    HELLO {device_id, token}     ->
+                                 <-      WELCOME {heartbeat}
+    VERIFY #7 {qr, kind, sizes} + JPEGs ->
+    PING                         ->
+                                 <-      PONG
+                                 <-      RESULT #7 {status, ...}
+                                 <-      PUSH {event, ...}  (revocations, gallery updates)
+"""
+import hashlib
+import hmac
+import json
+import struct
+
+HEADER = struct.Struct("!BBIH")
+
+HELLO, WELCOME, VERIFY, RESULT, PING, PONG, PUSH, ERROR = range(1, 9)
+
+KIND_JPEG = "jpeg"
+KIND_EMBEDDING = "embedding"  # float32 little-endian, unit length
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def device_token(secret, device_id):
+    """Per-device credential derived from the shared channel secret"""
+    return hmac.new(secret.encode(), device_id.encode(), hashlib.sha256).hexdigest()
+
+
+def encode(msg_type, request_id=0, meta=None, payload=b"", flags=0):
+    meta_bytes = json.dumps(meta, separators=(",", ":")).encode() if meta else b""
+    if len(meta_bytes) > 0xFFFF:
+        raise ProtocolError("Frame metadata too large")
+    return HEADER.pack(msg_type, flags, request_id, len(meta_bytes)) + meta_bytes + payload
+
+
+def decode(data):
+    """(type, request id, meta dict, payload bytes) of one frame"""
+    if len(data) < HEADER.size:
+        raise ProtocolError("Short frame")
+    msg_type, _flags, request_id, meta_len = HEADER.unpack_from(data)
+    end = HEADER.size + meta_len
+    if len(data) < end:
+        raise ProtocolError("Truncated frame metadata")
+    try:
+        meta = json.loads(data[HEADER.size:end]) if meta_len else {}
+    except ValueError as e:
+        raise ProtocolError(f"Bad frame metadata: {e}")
+    return msg_type, request_id, meta, data[end:]
+
+
+def verify_frame(request_id, qr_content, jpegs=None, embedding=None):
+    """VERIFY with one or more JPEG frames (best first), or a precomputed embedding"""
+    if embedding is not None:
+        return encode(VERIFY, request_id, {"qr": qr_content, "kind": KIND_EMBEDDING}, embedding)
+    return encode(VERIFY, request_id, {"qr": qr_content, "kind": KIND_JPEG, "sizes": [len(j) for j in jpegs]},
+                  b"".join(jpegs))
+
+
+def split_payload(meta, payload):
+    """The JPEG frames of a VERIFY payload"""
+    parts, offset = [], 0
+    for size in meta.get("sizes", [len(payload)]):
+        parts.append(bytes(payload[offset:offset + size]))
+        offset += size
+    if offset != len(payload):
+        raise ProtocolError("Payload does not match the frame sizes")
+    return parts
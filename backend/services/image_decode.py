@@ -0,0 +1,46 @@
+"""
+Image loading for the face pipeline: everything becomes an RGB uint8 ndarray.
+
+Encoded JPEGs are opened with draft() so libjpeg decodes straight to a
+reduced DCT scale (1/2, 1/4 or 1/8) picked from the header size; a 12 MP
+upload is never expanded to full resolution only to be shrunk again by
+MTCNN. Camera frames are used as they are, without a JPEG round trip.
+"""
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Smallest long side kept by reduced decoding; a face still has plenty of pixels for a 160 px crop
+DECODE_MAX_SIDE = 1024
+
+
+def decode_image(data, max_side=DECODE_MAX_SIDE):
+    """Encoded image bytes -> RGB ndarray, JPEGs at the smallest DCT scale keeping max_side"""
+    img = Image.open(io.BytesIO(data))
+    img.draft("RGB", (max_side, max_side))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return np.asarray(img)
+
+
+def to_rgb_array(image_input, channel_order="BGR", max_side=DECODE_MAX_SIDE):
+    """
+    Bytes, a file path, a PIL image or an ndarray frame -> RGB ndarray.
+    channel_order only applies to ndarrays: "BGR" for OpenCV frames, "RGB"
+    when the frame is already RGB (it is then used without a copy).
+    """
+    if isinstance(image_input, np.ndarray):
+        if image_input.ndim == 2:
+            return cv2.cvtColor(image_input, cv2.COLOR_GRAY2RGB)
+        if channel_order.upper() == "BGR":
+            return cv2.cvtColor(image_input, cv2.COLOR_BGR2RGB)
+        return image_input
+    if isinstance(image_input, (bytes, bytearray)):
+        return decode_image(bytes(image_input), max_side)
+    if isinstance(image_input, str):
+        with open(image_input, "rb") as f:
+            return decode_image(f.read(), max_side)
+    img = image_input if image_input.mode == "RGB" else image_input.convert("RGB")
+    return np.asarray(img)
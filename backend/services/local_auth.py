@@ -0,0 +1,101 @@
+"""
+In-memory stand-in for the firebase_admin.auth calls the backend makes.
+Selected with AUTH_BACKEND=local (load tests, offline development); it
+never talks to Google and forgets every account when the process exits.
+"""
+import threading
+import uuid
+from types import SimpleNamespace
+
+
+class LocalAuthError(ValueError):
+    pass
+
+
+class LocalAuth:
+    """create_user / get_user(s) / delete_user(s) / import_users / verify_id_token, like firebase_admin.auth"""
+
+    def __init__(self):
+        self._users = {}  # uid -> record
+        self._by_email = {}
+        self._lock = threading.Lock()
+
+    def _add(self, uid, email, display_name):
+        if email in self._by_email:
+            raise LocalAuthError(f"The user with the provided email already exists (EMAIL_EXISTS): {email}")
+        record = SimpleNamespace(uid=uid, email=email, display_name=display_name, disabled=False)
+        self._users[uid] = record
+        self._by_email[email] = uid
+        return record
+
+    def create_user(self, email=None, password=None, display_name=None, uid=None, **_):
+        with self._lock:
+            return self._add(uid or uuid.uuid4().hex[:28], email, display_name)
+
+    def get_user(self, uid):
+        with self._lock:
+            if uid not in self._users:
+                raise LocalAuthError(f"No user record found for the provided user ID: {uid}")
+            return self._users[uid]
+
+    def get_user_by_email(self, email):
+        with self._lock:
+            if email not in self._by_email:
+                raise LocalAuthError(f"No user record found for the provided email: {email}")
+            return self._users[self._by_email[email]]
+
+    def get_users(self, identifiers):
+        """Look up UidIdentifier/EmailIdentifier objects; unknown ones land in not_found"""
+        users, not_found = [], []
+        with self._lock:
+            for identifier in identifiers:
+                uid = getattr(identifier, "uid", None) or self._by_email.get(getattr(identifier, "email", None))
+                if uid in self._users:
+                    users.append(self._users[uid])
+                else:
+                    not_found.append(identifier)
+        return SimpleNamespace(users=users, not_found=not_found)
+
+    def delete_user(self, uid):
+        with self._lock:
+            record = self._users.pop(uid, None)
+            if record is None:
+                raise LocalAuthError(f"No user record found for the provided user ID: {uid}")
+            self._by_email.pop(record.email, None)
+
+    def delete_users(self, uids):
+        with self._lock:
+            for uid in uids:
+                record = self._users.pop(uid, None)
+                if record is not None:
+                    self._by_email.pop(record.email, None)
+        return SimpleNamespace(success_count=len(uids), failure_count=0, errors=[])
+
+    def import_users(self, records, hash_alg=None):
+        errors = []
+        with self._lock:
+            for index, record in enumerate(records):
+                # Like Firebase, importing an existing uid replaces that account
+                existing = self._users.get(record.uid)
+                if existing is not None and self._by_email.get(record.email, record.uid) == record.uid:
+                    del self._users[record.uid]
+                    self._by_email.pop(existing.email, None)
+                try:
+                    self._add(record.uid, record.email, record.display_name)
+                except LocalAuthError as e:
+                    errors.append(SimpleNamespace(index=index, reason=str(e)))
+        return SimpleNamespace(success_count=len(records) - len(errors), failure_count=len(errors), errors=errors)
+
+    def create_id_token(self, uid):
+        """Token accepted by verify_id_token (the real SDK gets these from the client SDK)"""
+        return f"local:{uid}"
+
+    def verify_id_token(self, id_token):
+        prefix, _, uid = id_token.partition(":")
+        if prefix != "local":
+            raise LocalAuthError("Invalid ID token")
+        record = self.get_user(uid)
+        return {"uid": record.uid, "email": record.email}
+
+
+local_auth = LocalAuth()
@@ -0,0 +1,211 @@
+"""
+In-process latency histograms and counters, exported in Prometheus text format.
+
+Every thread writes to its own shard (no lock on the hot path); /metrics sums
+the shards when scraped. Per-request stage timings are also returned to the
+caller as a Server-Timing header by MetricsMiddleware.
+
+    with metrics.stage("face.detect"):
+        found = detector.detect(img)
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; covers a 1 ms field read up to a slow cold-start inference
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = "gatepass_stage_seconds"
+REQUEST_SECONDS = "gatepass_request_seconds"
+REQUESTS_TOTAL = "gatepass_requests_total"
+
+HELP = {
+    STAGE_SECONDS: "Time spent in one stage of a request or background job",
+    REQUEST_SECONDS: "End-to-end request latency inside the app",
+    REQUESTS_TOTAL: "Requests served, by handler and status code",
+}
+
+
+class RequestTimings:
+    """Stages recorded while serving one request"""
+    __slots__ = ("scope", "started", "stages")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.started = time.perf_counter()
+        self.stages = []
+
+    @property
+    def route(self):
+        endpoint = self.scope.get("endpoint")
+        return getattr(endpoint, "__name__", "unmatched")
+
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class _Shard:
+    __slots__ = ("histograms", "counters")
+
+    def __init__(self):
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count], sum in a 1-item list
+        self.counters = {}
+
+
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._gauges = {}  # name -> (help, value or callable returning {labels: value} / a number)
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histograms = self._shard().histograms
+        entry = histograms.get(key)
+        if entry is None:
+            entry = histograms[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect_left(self.buckets, seconds)] += 1
+        entry[1][0] += seconds
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        counters = self._shard().counters
+        counters[key] = counters.get(key, 0) + value
+
+    def gauge(self, name, value, help_text=""):
+        """Static value, or a callable evaluated at scrape time"""
+        self._gauges[name] = (help_text, value)
+
+    # Request stages
+
+    def record_stage(self, name, seconds):
+        timings = _current.get()
+        route = timings.route if timings is not None else "background"
+        self.observe(STAGE_SECONDS, seconds, route=route, stage=name)
+        if timings is not None:
+            timings.stages.append((name, seconds))
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def stage_since_request(self, name="request.parse"):
+        """Time from the request arriving to now: body/multipart parsing and validation, when called first thing in a handler"""
+        timings = _current.get()
+        if timings is not None:
+            self.record_stage(name, time.perf_counter() - timings.started)
+
+    # Export
+
+    def collect(self):
+        """Merged ({(name, labels): (buckets, sum)}, {(name, labels): value}) over every shard"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        histograms, counters = {}, {}
+        for shard in shards:
+            for key, (counts, total) in list(shard.histograms.items()):
+                merged = histograms.setdefault(key, ([0] * len(counts), [0.0]))
+                for i, count in enumerate(counts):
+                    merged[0][i] += count
+                merged[1][0] += total[0]
+            for key, value in list(shard.counters.items()):
+                counters[key] = counters.get(key, 0) + value
+        return histograms, counters
+
+    def render(self):
+        """Prometheus text exposition format 0.0.4"""
+        histograms, counters = self.collect()
+        lines = []
+        for name in sorted({key[0] for key in histograms}):
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            for (metric, labels), (counts, total) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels, le=le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {total[0]:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        for name in sorted({key[0] for key in counters}):
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} counter"]
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        for name, (help_text, value) in sorted(self._gauges.items()):
+            lines += [f"# HELP {name} {help_text or name}", f"# TYPE {name} gauge"]
+            value = value() if callable(value) else value
+            if isinstance(value, dict):
+                for labels, sample in sorted(value.items()):
+                    lines.append(f"{name}{_labels(labels)} {sample}")
+            elif value is not None:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(pairs, **extra):
+    items = list(pairs) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: times every HTTP request, counts it by handler and
+    status, and adds a Server-Timing header listing the recorded stages.
+    """
+
+    def __init__(self, app, registry=None):
+        self.app = app
+        self.metrics = registry or metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings(scope)
+        token = _current.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - timings.started
+                entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.stages]
+                entries.append(f"app;dur={elapsed * 1000:.1f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(entries).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = timings.route
+            self.metrics.observe(REQUEST_SECONDS, time.perf_counter() - timings.started, route=route)
+            self.metrics.inc(REQUESTS_TOTAL, route=route, method=scope["method"], status=str(status))
+            _current.reset(token)
+
+
+metrics = Metrics()
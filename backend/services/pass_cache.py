@@ -0,0 +1,48 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecentPassesCache:
+    """
+    Per-user cache of recent pass history pages.
+    Entries are keyed by (reg_no, status, limit) and expire after ttl seconds
+    (active/expired depends on the clock); invalidate(reg_no) drops every page
+    for a user when one of their passes is written.
+    """
+
+    def __init__(self, max_users=5000, ttl=30.0):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, reg_no, status, limit):
+        with self._lock:
+            pages = self._users.get(reg_no)
+            if pages is None:
+                return None
+            entry = pages.get((status, limit))
+            if entry is None:
+                return None
+            stored_at, passes = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del pages[(status, limit)]
+                return None
+            self._users.move_to_end(reg_no)
+            return passes
+
+    def put(self, reg_no, status, limit, passes):
+        with self._lock:
+            pages = self._users.setdefault(reg_no, {})
+            pages[(status, limit)] = (time.monotonic(), passes)
+            self._users.move_to_end(reg_no)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate(self, reg_no):
+        with self._lock:
+            self._users.pop(reg_no, None)
+
+
+pass_cache = RecentPassesCache()
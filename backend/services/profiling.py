@@ -0,0 +1,247 @@
+"""
+Opt-in sampling profiler for live traffic, plus tracemalloc snapshots.
+
+While enabled, a sampler thread walks the stacks of every thread running app
+code (the event loop and the executors) each interval and charges the samples
+to the requests in flight. A request is kept when it was picked by sample_rate,
+or when slow_ms is set and it took longer than that; kept profiles are written
+in collapsed-stack format (flamegraph.pl, speedscope, inferno):
+
+    Storage/Profiles/<timestamp>_<route>_<ms>ms.collapsed
+
+Stacks of requests that overlap in time are shared, since the event loop runs
+them all; profile slow outliers rather than averaging busy periods.
+"""
+import gc
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "Storage/Profiles")
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_PROFILE_FILES = 200
+
+
+def _collapse(frame, thread_name):
+    """'thread;outer (file:line);...;inner' for one stack, or None if no app code is on it"""
+    names = []
+    in_app = False
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename.startswith(APP_ROOT) and code.co_filename != __file__:
+            in_app = True
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    if not in_app:
+        return None
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class _Capture:
+    __slots__ = ("route", "started", "stacks")
+
+    def __init__(self):
+        self.route = None
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+
+
+class SamplingProfiler:
+    def __init__(self, output_dir=PROFILE_DIR):
+        self.output_dir = output_dir
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.slow_ms = None
+        self.interval = 0.005
+        self.written = 0
+        self._active = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        # finish() runs on the event loop; file writes and pruning happen here instead
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+
+    def configure(self, enabled, sample_rate=None, slow_ms=None, interval_ms=None):
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, sample_rate))
+        if slow_ms is not None:
+            self.slow_ms = slow_ms or None
+        if interval_ms is not None:
+            self.interval = max(0.001, interval_ms / 1000)
+        self.enabled = enabled
+        if enabled and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+            self._thread.start()
+        return self.status()
+
+    def status(self):
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "interval_ms": self.interval * 1000,
+            "in_flight": len(self._active),
+            "profiles_written": self.written,
+            "output_dir": self.output_dir,
+        }
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while self.enabled:
+            time.sleep(self.interval)
+            with self._lock:
+                idle = not self._active
+            if idle:
+                continue
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    stack = _collapse(frame, names.get(thread_id, str(thread_id)))
+                    if stack:
+                        stacks.append(stack)
+            with self._lock:
+                # Only captures still in flight: finish() hands the others to the writer
+                for capture in self._active:
+                    capture.stacks.update(stacks)
+
+    def start(self):
+        """A capture for a new request, or None when this request is not being profiled"""
+        if not self.enabled or (self.slow_ms is None and random.random() >= self.sample_rate):
+            return None
+        capture = _Capture()
+        with self._lock:
+            self._active.add(capture)
+        return capture
+
+    def finish(self, capture, route):
+        """Stop sampling for the request; a kept profile is written on the writer thread"""
+        with self._lock:
+            self._active.discard(capture)
+        elapsed_ms = (time.perf_counter() - capture.started) * 1000
+        sampled = self.slow_ms is None or elapsed_ms >= self.slow_ms
+        if not sampled or not capture.stacks:
+            return None
+
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = os.path.join(self.output_dir, f"{stamp}_{route}_{elapsed_ms:.0f}ms.collapsed")
+        self._writer.submit(self._write, path, capture.stacks, route, elapsed_ms)
+        return path
+
+    def _write(self, path, stacks, route, elapsed_ms):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(path, "w") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            self.written += 1
+            self._prune()
+            logger.info(f"Profile of {route} ({elapsed_ms:.0f} ms) written to {path}")
+        except OSError as e:
+            logger.error(f"Could not write profile {path}: {e}")
+
+    def _prune(self):
+        files = sorted(self.list_profiles())
+        for name in files[:-MAX_PROFILE_FILES]:
+            os.remove(os.path.join(self.output_dir, name))
+
+    def list_profiles(self):
+        if not os.path.isdir(self.output_dir):
+            return []
+        return [name for name in os.listdir(self.output_dir) if name.endswith(".collapsed")]
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware; a single attribute check per request while profiling is off"""
+
+    def __init__(self, app, profiler_instance=None):
+        self.app = app
+        self.profiler = profiler_instance or profiler
+
+    async def __call__(self, scope, receive, send):
+        capture = self.profiler.start() if scope["type"] == "http" else None
+        if capture is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            endpoint = scope.get("endpoint")
+            self.profiler.finish(capture, getattr(endpoint, "__name__", "unmatched"))
+
+
+class MemoryTracker:
+    """tracemalloc baseline snapshot and diffs against it, plus sizes of known long-lived containers"""
+
+    def __init__(self):
+        self.baseline = None
+        self.baseline_at = None
+        self.watched = {}  # name -> callable returning a size
+
+    def watch(self, name, size_fn):
+        self.watched[name] = size_fn
+
+    def watched_sizes(self):
+        sizes = {}
+        for name, size_fn in self.watched.items():
+            try:
+                sizes[name] = size_fn()
+            except Exception as e:
+                sizes[name] = f"error: {e}"
+        return sizes
+
+    def snapshot(self, frames=25):
+        """Start tracing if needed and store the current allocations as the baseline"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        gc.collect()
+        self.baseline = tracemalloc.take_snapshot()
+        self.baseline_at = datetime.now().isoformat()
+        current, peak = tracemalloc.get_traced_memory()
+        return {"baseline_at": self.baseline_at, "traced_bytes": current, "peak_bytes": peak,
+                "watched": self.watched_sizes()}
+
+    def diff(self, limit=25, group_by="lineno"):
+        """Top allocation growth since the baseline"""
+        if self.baseline is None:
+            return None
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen *>")]
+        stats = snapshot.filter_traces(filters).compare_to(self.baseline.filter_traces(filters), group_by)
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "baseline_at": self.baseline_at,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "watched": self.watched_sizes(),
+            "top_growth": [
+                {
+                    "location": str(stat.traceback[0]) if group_by != "traceback"
+                    else " <- ".join(str(frame) for frame in stat.traceback),
+                    "size_diff_kb": round(stat.size_diff / 1024, 1),
+                    "size_kb": round(stat.size / 1024, 1),
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:limit]
+            ],
+        }
+
+    def stop(self):
+        self.baseline = None
+        self.baseline_at = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+profiler = SamplingProfiler()
+memory_tracker = MemoryTracker()
@@ -6,6 +6,9 @@ from pyzbar.pyzbar import decode
 from PIL import Image
 import io
 
+from services.gate_channel import gate_hub
+from services.metrics import metrics
+
 class QRService:
     def __init__(self, storage_path="QR_images"):
         self.storage_path = storage_path
@@ -35,12 +38,15 @@ class QRService:
             box_size=10,
             border=4,
         )
-        qr.add_data(qr_content)
-        qr.make(fit=True)
+        with metrics.stage("qr.encode"):
+            qr.add_data(qr_content)
+            qr.make(fit=True)
         
-        img = qr.make_image(fill_color="black", back_color="white")
+        with metrics.stage("qr.render"):
+            img = qr.make_image(fill_color="black", back_color="white")
         file_path = os.path.join(self.storage_path, f"QR_{qr_id}.png")
-        img.save(file_path)
+        with metrics.stage("qr.save"):
+            img.save(file_path)
         
         self.active_qrs[qr_id] = {**qr_data, "file_path": file_path}
         return self.active_qrs[qr_id]
@@ -67,4 +73,12 @@ class QRService:
         except Exception as e:
             return False, str(e)
 
+    def revoke(self, qr_id: str):
+        """Drop a QR so it no longer validates, and tell connected gates"""
+        qr_info = self.active_qrs.pop(qr_id, None)
+        if qr_info is None:
+            return False
+        gate_hub.publish("revocation", {"qr_id": qr_id, "roll": qr_info.get("roll")})
+        return True
+
 qr_service = QRService()
@@ -0,0 +1,176 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+
+from fastapi.concurrency import run_in_threadpool
+
+from services.embedding_codec import encode_embedding
+from services.gate_channel import gate_hub
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+REGISTRATION_WORKERS = int(os.getenv("REGISTRATION_WORKERS", "2"))
+MAX_PENDING_REGISTRATIONS = int(os.getenv("MAX_PENDING_REGISTRATIONS", "200"))
+JOB_RETENTION_SECONDS = 3600
+
+
+class RegistrationError(Exception):
+    """A job step failed with a message safe to show the client"""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class RegistrationJob:
+    job_id: str
+    reg_no: str
+    status: str = "queued"  # queued -> processing -> completed | failed
+    step: str | None = None
+    detail: str | None = None
+    uid: str | None = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class RegistrationJobManager:
+    """
+    Runs the slow half of user registration off the request path.
+    At most `workers` jobs run at once; face embedding happens on a dedicated
+    thread pool so a burst of enrollments cannot starve the event loop or the
+    default threadpool that gate verification relies on. Each completed step
+    pushes a compensation, and a failure unwinds them in reverse order.
+    """
+
+    def __init__(self, workers=REGISTRATION_WORKERS, max_pending=MAX_PENDING_REGISTRATIONS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="registration")
+        self._slots = None
+        self._jobs = {}
+        self._active_reg_nos = set()
+        self._lock = threading.Lock()
+        self._tasks = set()  # the loop only keeps weak references to running tasks
+
+    def queue_depth(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status in ("queued", "processing"))
+
+    def status_counts(self):
+        """{(("status", name),): jobs} for the registration_jobs gauge"""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                key = (("status", job.status),)
+                counts[key] = counts.get(key, 0) + 1
+            return counts
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def submit(self, reg_no, user_data, stored_image, image_store, repo, auth, face_service):
+        """Register a job and schedule it on the running event loop"""
+        self._expire_finished()
+        with self._lock:
+            if reg_no in self._active_reg_nos:
+                raise RegistrationError("A registration for this Registration Number is already in progress", 409)
+            if sum(1 for job in self._jobs.values() if job.status == "queued") >= self.max_pending:
+                raise QueueFull("Registration queue is full, please retry shortly")
+            job = RegistrationJob(job_id=uuid.uuid4().hex, reg_no=reg_no)
+            self._jobs[job.job_id] = job
+            self._active_reg_nos.add(reg_no)
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        task = asyncio.get_running_loop().create_task(
+            self._run(job, user_data, stored_image, image_store, repo, auth, face_service)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job, user_data, stored_image, image_store, repo, auth, face_service):
+        # The stored image is not a compensation: identical uploads share it, so storage_gc.py reclaims it
+        compensations = []
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            job.status = "processing"
+            metrics.record_stage("registration.queue_wait", time.time() - job.created_at)
+            try:
+                # 1. Face embedding first: it is the step most likely to reject the upload
+                job.step = "embedding"
+                with metrics.stage("registration.embedding"):
+                    # Copied context: the face.* stages stay labelled with the register_user route
+                    embedding = await loop.run_in_executor(
+                        self.executor, contextvars.copy_context().run, face_service.get_embedding, stored_image.path
+                    )
+                if embedding is None:
+                    raise RegistrationError("No face detected in the image. Please upload a clear photo.", 400)
+
+                # 2. Firebase Auth account
+                job.step = "auth"
+                try:
+                    with metrics.stage("registration.auth"):
+                        user_record = await run_in_threadpool(
+                            auth.create_user,
+                            email=user_data["email"],
+                            password=user_data["password"],
+                            display_name=job.reg_no
+                        )
+                except Exception as e:
+                    raise RegistrationError(f"Firebase Auth Error: {str(e)}", 400)
+                compensations.append(("delete auth user", lambda: auth.delete_user(user_record.uid)))
+
+                # 3. Firestore profile and face template (one atomic batch)
+                job.step = "database"
+                with metrics.stage("registration.database"):
+                    await repo.create_user(
+                        job.reg_no,
+                        {**user_data, "uid": user_record.uid},
+                        face_template=encode_embedding(embedding)
+                    )
+
+                job.uid = user_record.uid
+                job.status = "completed"
+                gate_hub.publish("gallery_update", {"reg_no": job.reg_no})
+                job.step = None
+                job.detail = "User registered successfully"
+                print(f"Registration job {job.job_id} completed for {job.reg_no}")
+                await run_in_threadpool(image_store.make_variants, stored_image.relpath)
+            except Exception as e:
+                job.status = "failed"
+                job.detail = str(e) if isinstance(e, RegistrationError) else f"{job.step} failed: {str(e)}"
+                logger.warning(f"Registration job {job.job_id} for {job.reg_no} failed: {job.detail}")
+                for name, undo in reversed(compensations):
+                    try:
+                        await run_in_threadpool(undo)
+                    except Exception as undo_error:
+                        logger.error(f"Rollback step '{name}' failed for {job.reg_no}: {undo_error}")
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self._active_reg_nos.discard(job.reg_no)
+
+    def _expire_finished(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        with self._lock:
+            for job_id in [j.job_id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+
+registration_jobs = RegistrationJobManager()
@@ -0,0 +1,271 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Field masks for the hot paths, so reads only ship the fields a route uses
+USER_LOGIN_FIELDS = ["reg_no", "password", "email", "department", "class", "image_filename"]
+USER_PROFILE_FIELDS = ["email", "class", "department", "image_filename"]
+# Legacy home of the embedding, read only for users not yet moved to face_templates
+USER_EMBEDDING_FIELDS = ["face_embedding"]
+
+PASS_HISTORY_LIMIT = 20
+FIRESTORE_BATCH_LIMIT = 500
+
+
+def face_template_document(template):
+    """face_templates/{reg_no} body for an encoded embedding"""
+    from services.embedding_codec import embedding_info
+
+    info = embedding_info(template)
+    return {
+        "embedding": template,
+        "model": info["model"],
+        "dtype": info["dtype"],
+        "updated_at": datetime.now().isoformat(),
+    }
+
+
+class CallTimings:
+    """Per-operation call count, total and worst latency for the data layer"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed):
+        with self._lock:
+            stat = self._stats.setdefault(name, [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += elapsed
+            stat[2] = max(stat[2], elapsed)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    "calls": count,
+                    "avg_ms": round(total / count * 1000, 3),
+                    "max_ms": round(worst * 1000, 3),
+                }
+                for name, (count, total, worst) in self._stats.items()
+            }
+
+
+def timed(func):
+    """Record the wall time of a repository coroutine under its method name"""
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings.record(func.__name__, elapsed)
+            logger.debug(f"{func.__name__} took {elapsed * 1000:.1f} ms")
+    return wrapper
+
+
+class FirestoreRepository:
+    """Async data access for the users, face_templates, gate_passes and sensor_data collections"""
+
+    def __init__(self, db):
+        self.db = db
+        self.timings = CallTimings()
+
+    @staticmethod
+    def _to_dict(snapshot):
+        return snapshot.to_dict() if snapshot.exists else None
+
+    async def gather(self, *calls):
+        """Run independent repository calls concurrently"""
+        return await asyncio.gather(*calls)
+
+    # Users
+
+    @timed
+    async def get_user(self, reg_no, fields=None):
+        doc = await self.db.collection("users").document(reg_no).get(field_paths=fields)
+        return self._to_dict(doc)
+
+    @timed
+    async def get_users(self, reg_nos, fields=None):
+        refs = [self.db.collection("users").document(reg_no) for reg_no in reg_nos]
+        users = {}
+        async for doc in self.db.get_all(refs, field_paths=fields):
+            if doc.exists:
+                users[doc.id] = doc.to_dict()
+        return users
+
+    @timed
+    async def user_exists(self, reg_no):
+        doc = await self.db.collection("users").document(reg_no).get(field_paths=["reg_no"])
+        return doc.exists
+
+    async def stream_users(self, fields=None):
+        """Yield (reg_no, data) for every user, fetching only `fields` when given"""
+        query = self.db.collection("users")
+        if fields:
+            query = query.select(fields)
+        async for doc in query.stream():
+            yield doc.id, doc.to_dict()
+
+    @timed
+    async def create_user(self, reg_no, data, face_template=None):
+        """Write the profile, and its face template in the same atomic batch when given"""
+        batch = self.db.batch()
+        batch.set(self.db.collection("users").document(reg_no), data)
+        if face_template is not None:
+            batch.set(self.db.collection("face_templates").document(reg_no), face_template_document(face_template))
+        await batch.commit()
+
+    @timed
+    async def create_users_batch(self, users, face_templates=None):
+        """Write {reg_no: data} (plus {reg_no: template}) with WriteBatch commits of up to 500 writes"""
+        face_templates = face_templates or {}
+        items = list(users.items())
+        per_batch = FIRESTORE_BATCH_LIMIT // 2 if face_templates else FIRESTORE_BATCH_LIMIT
+        for start in range(0, len(items), per_batch):
+            batch = self.db.batch()
+            for reg_no, data in items[start:start + per_batch]:
+                batch.set(self.db.collection("users").document(reg_no), data)
+                if reg_no in face_templates:
+                    batch.set(self.db.collection("face_templates").document(reg_no),
+                              face_template_document(face_templates[reg_no]))
+            await batch.commit()
+
+    @timed
+    async def update_users_batch(self, updates):
+        """Merge {reg_no: partial data} into existing users, 500 per WriteBatch"""
+        items = list(updates.items())
+        for start in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for reg_no, data in items[start:start + FIRESTORE_BATCH_LIMIT]:
+                batch.update(self.db.collection("users").document(reg_no), data)
+            await batch.commit()
+
+    # Face templates: biometric vectors live apart from the profile so each path reads only what it needs
+
+    @timed
+    async def get_face_template(self, reg_no):
+        """Encoded embedding bytes for reg_no, or None"""
+        doc = await self.db.collection("face_templates").document(reg_no).get(field_paths=["embedding"])
+        return doc.get("embedding") if doc.exists else None
+
+    async def stream_face_templates(self):
+        """Yield (reg_no, encoded embedding) for every template"""
+        async for doc in self.db.collection("face_templates").select(["embedding"]).stream():
+            yield doc.id, doc.get("embedding")
+
+    @timed
+    async def set_face_templates_batch(self, templates, clear_user_embedding=False):
+        """
+        Write {reg_no: encoded embedding}. With clear_user_embedding the legacy
+        users.face_embedding field is deleted in the same batch (backfill).
+        """
+        from google.cloud.firestore import DELETE_FIELD
+
+        items = list(templates.items())
+        per_batch = FIRESTORE_BATCH_LIMIT // 2 if clear_user_embedding else FIRESTORE_BATCH_LIMIT
+        for start in range(0, len(items), per_batch):
+            batch = self.db.batch()
+            for reg_no, template in items[start:start + per_batch]:
+                batch.set(self.db.collection("face_templates").document(reg_no), face_template_document(template))
+                if clear_user_embedding:
+                    batch.update(self.db.collection("users").document(reg_no), {"face_embedding": DELETE_FIELD})
+            await batch.commit()
+
+    # Gate passes
+
+    @timed
+    async def get_pass(self, pass_id, fields=None):
+        doc = await self.db.collection("gate_passes").document(pass_id).get(field_paths=fields)
+        return self._to_dict(doc)
+
+    @timed
+    async def create_pass(self, pass_id, data):
+        await self.db.collection("gate_passes").document(pass_id).set(data)
+
+    @timed
+    async def update_pass(self, pass_id, data):
+        await self.db.collection("gate_passes").document(pass_id).update(data)
+
+    async def stream_passes(self, fields=None):
+        """Yield (pass_id, data) for every gate pass, fetching only `fields` when given"""
+        query = self.db.collection("gate_passes")
+        if fields:
+            query = query.select(fields)
+        async for doc in query.stream():
+            yield doc.id, doc.to_dict()
+
+    @timed
+    async def list_passes(self, reg_no, status=None, limit=PASS_HISTORY_LIMIT):
+        """
+        Newest passes first, served by the composite indexes in
+        firestore.indexes.json. status="active"/"expired" filters on expires_at,
+        which the range filter requires to be the leading sort key.
+        """
+        query = self.db.collection("gate_passes").where("reg_no", "==", reg_no)
+        if status is None:
+            query = query.order_by("created_at", direction="DESCENDING")
+        else:
+            now = datetime.now().isoformat()
+            op = ">=" if status == "active" else "<"
+            query = query.where("expires_at", op, now).order_by("expires_at", direction="DESCENDING")
+        return [doc.to_dict() async for doc in query.limit(limit).stream()]
+
+    # Sensor data
+
+    @timed
+    async def add_sensor_reading(self, data):
+        _, doc_ref = await self.db.collection("sensor_data").add(data)
+        return doc_ref.id
+
+    @timed
+    async def add_sensor_readings(self, readings):
+        """Insert many readings with WriteBatch commits of up to 500; returns the new ids"""
+        ids = []
+        for start in range(0, len(readings), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for data in readings[start:start + FIRESTORE_BATCH_LIMIT]:
+                doc_ref = self.db.collection("sensor_data").document()
+                batch.set(doc_ref, data)
+                ids.append(doc_ref.id)
+            await batch.commit()
+        return ids
+
+    @timed
+    async def list_sensor_readings(self, device_id=None, limit=100):
+        query = self.db.collection("sensor_data")
+        if device_id:
+            query = query.where("device_id", "==", device_id)
+        query = query.order_by("timestamp", direction="DESCENDING").limit(limit)
+        return [{"id": doc.id, **doc.to_dict()} async for doc in query.stream()]
+
+
+_repository = None
+
+
+def create_repository(backend=None):
+    """Build a repository for STORAGE_BACKEND ("firestore" or "sqlite")"""
+    backend = backend or os.getenv("STORAGE_BACKEND", "firestore")
+    if backend == "sqlite":
+        from services.sqlite_repository import SqliteRepository, get_sqlite_database
+        return SqliteRepository(get_sqlite_database())
+    if backend == "firestore":
+        from config.firebase_config import get_async_firestore_client
+        return FirestoreRepository(get_async_firestore_client())
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def get_repository():
+    """FastAPI dependency returning the application-scoped repository"""
+    global _repository
+    if _repository is None:
+        _repository = create_repository()
+    return _repository
@@ -0,0 +1,397 @@
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from services.embedding_codec import embedding_info
+from services.repository import CallTimings, timed, PASS_HISTORY_LIMIT
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    reg_no TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS face_templates (
+    reg_no TEXT PRIMARY KEY,
+    embedding BLOB NOT NULL,
+    model TEXT,
+    dtype TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS gate_passes (
+    pass_id TEXT PRIMARY KEY,
+    reg_no TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT '',
+    expires_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_gate_passes_reg_no_created
+    ON gate_passes (reg_no, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_gate_passes_reg_no_expires
+    ON gate_passes (reg_no, expires_at DESC);
+CREATE TABLE IF NOT EXISTS devices (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sensor_data (
+    id TEXT PRIMARY KEY,
+    device_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sensor_data_device_ts
+    ON sensor_data (device_id, timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_sensor_data_ts
+    ON sensor_data (timestamp DESC);
+"""
+
+
+def _encode_bytes(value):
+    # Firestore has a native bytes type; in JSON it round-trips as {"__bytes__": base64}
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_bytes(obj):
+    if len(obj) == 1 and "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"])
+    return obj
+
+
+def _dumps(data):
+    return json.dumps(data, default=_encode_bytes)
+
+
+def _loads(text):
+    return json.loads(text, object_hook=_decode_bytes)
+
+
+def _project(data, fields):
+    if fields is None:
+        return data
+    return {k: data[k] for k in fields if k in data}
+
+
+class SqliteDatabase:
+    """
+    Embedded SQLite file shared by the repository and the device store.
+    Each worker thread keeps its own connection; statements are constant
+    parameterised SQL, so sqlite3's per-connection statement cache reuses
+    the prepared form on every call.
+    """
+
+    def __init__(self, path, max_workers=4):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sqlite")
+        conn = self.connection()
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(gate_passes)")]
+        if columns and "expires_at" not in columns:
+            conn.execute("ALTER TABLE gate_passes ADD COLUMN expires_at TEXT")
+        conn.executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=256,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def executemany(self, sql, rows):
+        with self.transaction() as conn:
+            conn.executemany(sql, rows)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+
+class SqliteRepository:
+    """SQLite implementation of the repository used by the routes"""
+
+    def __init__(self, database):
+        self.database = database
+        self.timings = CallTimings()
+
+    async def gather(self, *calls):
+        return await asyncio.gather(*calls)
+
+    # Users
+
+    def _get_user(self, reg_no, fields):
+        row = self.database.execute("SELECT data FROM users WHERE reg_no = ?", (reg_no,)).fetchone()
+        return _project(_loads(row[0]), fields) if row else None
+
+    @timed
+    async def get_user(self, reg_no, fields=None):
+        return await self.database.run(self._get_user, reg_no, fields)
+
+    def _get_users(self, reg_nos, fields):
+        placeholders = ",".join("?" * len(reg_nos))
+        rows = self.database.execute(
+            f"SELECT reg_no, data FROM users WHERE reg_no IN ({placeholders})", tuple(reg_nos)
+        ).fetchall()
+        return {reg_no: _project(_loads(data), fields) for reg_no, data in rows}
+
+    @timed
+    async def get_users(self, reg_nos, fields=None):
+        if not reg_nos:
+            return {}
+        return await self.database.run(self._get_users, list(reg_nos), fields)
+
+    def _user_exists(self, reg_no):
+        return self.database.execute("SELECT 1 FROM users WHERE reg_no = ?", (reg_no,)).fetchone() is not None
+
+    @timed
+    async def user_exists(self, reg_no):
+        return await self.database.run(self._user_exists, reg_no)
+
+    def _users_page(self, after, fields, size):
+        rows = self.database.execute(
+            "SELECT reg_no, data FROM users WHERE reg_no > ? ORDER BY reg_no LIMIT ?", (after, size)
+        ).fetchall()
+        return [(reg_no, _project(_loads(data), fields)) for reg_no, data in rows]
+
+    async def stream_users(self, fields=None, page_size=500):
+        """Yield (reg_no, data) for every user, paging by primary key"""
+        after = ""
+        while page := await self.database.run(self._users_page, after, fields, page_size):
+            for item in page:
+                yield item
+            after = page[-1][0]
+
+    def _create_users_batch(self, users, face_templates):
+        with self.database.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO users (reg_no, data) VALUES (?, ?)",
+                [(reg_no, _dumps(data)) for reg_no, data in users.items()]
+            )
+            self._write_templates(conn, face_templates or {})
+
+    @timed
+    async def create_user(self, reg_no, data, face_template=None):
+        templates = {reg_no: face_template} if face_template is not None else None
+        await self.database.run(self._create_users_batch, {reg_no: data}, templates)
+
+    @timed
+    async def create_users_batch(self, users, face_templates=None):
+        await self.database.run(self._create_users_batch, users, face_templates)
+
+    def _update_users_batch(self, updates):
+        conn = self.database.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for reg_no, data in updates.items():
+                row = conn.execute("SELECT data FROM users WHERE reg_no = ?", (reg_no,)).fetchone()
+                if row is not None:
+                    merged = {**_loads(row[0]), **data}
+                    conn.execute("UPDATE users SET data = ? WHERE reg_no = ?", (_dumps(merged), reg_no))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @timed
+    async def update_users_batch(self, updates):
+        await self.database.run(self._update_users_batch, updates)
+
+    # Face templates
+
+    @staticmethod
+    def _write_templates(conn, templates):
+        now = datetime.now().isoformat()
+        rows = []
+        for reg_no, template in templates.items():
+            info = embedding_info(template)
+            rows.append((reg_no, bytes(template), info["model"], info["dtype"], now))
+        conn.executemany(
+            "INSERT OR REPLACE INTO face_templates (reg_no, embedding, model, dtype, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)", rows
+        )
+
+    def _get_face_template(self, reg_no):
+        row = self.database.execute("SELECT embedding FROM face_templates WHERE reg_no = ?", (reg_no,)).fetchone()
+        return row[0] if row else None
+
+    @timed
+    async def get_face_template(self, reg_no):
+        return await self.database.run(self._get_face_template, reg_no)
+
+    def _templates_page(self, after, size):
+        return self.database.execute(
+            "SELECT reg_no, embedding FROM face_templates WHERE reg_no > ? ORDER BY reg_no LIMIT ?", (after, size)
+        ).fetchall()
+
+    async def stream_face_templates(self, page_size=500):
+        after = ""
+        while page := await self.database.run(self._templates_page, after, page_size):
+            for reg_no, embedding in page:
+                yield reg_no, embedding
+            after = page[-1][0]
+
+    def _set_face_templates_batch(self, templates, clear_user_embedding):
+        with self.database.transaction() as conn:
+            self._write_templates(conn, templates)
+            if clear_user_embedding:
+                # Same statement for every row, so executemany reuses one prepared statement
+                conn.executemany(
+                    "UPDATE users SET data = json_remove(data, '$.face_embedding') WHERE reg_no = ?",
+                    [(reg_no,) for reg_no in templates]
+                )
+
+    @timed
+    async def set_face_templates_batch(self, templates, clear_user_embedding=False):
+        await self.database.run(self._set_face_templates_batch, templates, clear_user_embedding)
+
+    # Gate passes
+
+    def _get_pass(self, pass_id, fields):
+        row = self.database.execute("SELECT data FROM gate_passes WHERE pass_id = ?", (pass_id,)).fetchone()
+        return _project(_loads(row[0]), fields) if row else None
+
+    @timed
+    async def get_pass(self, pass_id, fields=None):
+        return await self.database.run(self._get_pass, pass_id, fields)
+
+    def _passes_page(self, after, fields, size):
+        rows = self.database.execute(
+            "SELECT pass_id, data FROM gate_passes WHERE pass_id > ? ORDER BY pass_id LIMIT ?", (after, size)
+        ).fetchall()
+        return [(pass_id, _project(_loads(data), fields)) for pass_id, data in rows]
+
+    async def stream_passes(self, fields=None, page_size=500):
+        """Yield (pass_id, data) for every gate pass, paging by primary key"""
+        after = ""
+        while page := await self.database.run(self._passes_page, after, fields, page_size):
+            for item in page:
+                yield item
+            after = page[-1][0]
+
+    def _create_pass(self, pass_id, data):
+        self.database.execute(
+            "INSERT OR REPLACE INTO gate_passes (pass_id, reg_no, created_at, expires_at, data) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (pass_id, data["reg_no"], data.get("created_at", ""), data.get("expires_at"), _dumps(data))
+        )
+
+    @timed
+    async def create_pass(self, pass_id, data):
+        await self.database.run(self._create_pass, pass_id, data)
+
+    def _update_pass(self, pass_id, data):
+        conn = self.database.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM gate_passes WHERE pass_id = ?", (pass_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"Gate pass {pass_id} not found")
+            merged = {**_loads(row[0]), **data}
+            conn.execute("UPDATE gate_passes SET data = ? WHERE pass_id = ?", (_dumps(merged), pass_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @timed
+    async def update_pass(self, pass_id, data):
+        await self.database.run(self._update_pass, pass_id, data)
+
+    def _list_passes(self, reg_no, status, limit):
+        if status is None:
+            rows = self.database.execute(
+                "SELECT data FROM gate_passes WHERE reg_no = ? ORDER BY created_at DESC LIMIT ?",
+                (reg_no, limit)
+            ).fetchall()
+        else:
+            op = ">=" if status == "active" else "<"
+            rows = self.database.execute(
+                f"SELECT data FROM gate_passes WHERE reg_no = ? AND expires_at {op} ? "
+                "ORDER BY expires_at DESC LIMIT ?",
+                (reg_no, datetime.now().isoformat(), limit)
+            ).fetchall()
+        return [_loads(row[0]) for row in rows]
+
+    @timed
+    async def list_passes(self, reg_no, status=None, limit=PASS_HISTORY_LIMIT):
+        return await self.database.run(self._list_passes, reg_no, status, limit)
+
+    # Sensor data
+
+    def _add_sensor_reading(self, data):
+        doc_id = uuid.uuid4().hex[:20]
+        self.database.execute(
+            "INSERT INTO sensor_data (id, device_id, timestamp, data) VALUES (?, ?, ?, ?)",
+            (doc_id, data["device_id"], data["timestamp"], _dumps(data))
+        )
+        return doc_id
+
+    @timed
+    async def add_sensor_reading(self, data):
+        return await self.database.run(self._add_sensor_reading, data)
+
+    def _add_sensor_readings(self, readings):
+        rows = [(uuid.uuid4().hex[:20], data["device_id"], data["timestamp"], _dumps(data)) for data in readings]
+        self.database.executemany("INSERT INTO sensor_data (id, device_id, timestamp, data) VALUES (?, ?, ?, ?)", rows)
+        return [row[0] for row in rows]
+
+    @timed
+    async def add_sensor_readings(self, readings):
+        return await self.database.run(self._add_sensor_readings, readings)
+
+    def _list_sensor_readings(self, device_id, limit):
+        if device_id:
+            rows = self.database.execute(
+                "SELECT id, data FROM sensor_data WHERE device_id = ? ORDER BY timestamp DESC LIMIT ?",
+                (device_id, limit)
+            ).fetchall()
+        else:
+            rows = self.database.execute(
+                "SELECT id, data FROM sensor_data ORDER BY timestamp DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [{"id": doc_id, **_loads(data)} for doc_id, data in rows]
+
+    @timed
+    async def list_sensor_readings(self, device_id=None, limit=100):
+        return await self.database.run(self._list_sensor_readings, device_id, limit)
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_sqlite_database():
+    """Process-wide SQLite database at SQLITE_PATH"""
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _database = SqliteDatabase(os.getenv("SQLITE_PATH", "Storage/gatepass.db"))
+    return _database
@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+
+import aiofiles
+from PIL import Image
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Whole request body for multipart uploads: one capped file plus form fields and a few verify frames
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(MAX_UPLOAD_BYTES + 2 * 1024 * 1024)))
+# Roster + photo archive; streamed to the job directory by the route itself
+UNLIMITED_UPLOAD_PATHS = ("/api/users/bulk-import",)
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "bmp"}
+VARIANT_SIDES = (1024, 320)
+# Unreferenced files younger than this may belong to a request still in flight
+GC_MIN_AGE_SECONDS = 24 * 3600
+_STORED_NAME = re.compile(r"^([0-9a-f]{64})(?:_\d+)?\.\w+$")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """
+    Pure ASGI middleware: rejects an oversized multipart body with 413 before
+    Starlette spools it to a temp file. Content-Length is checked up front;
+    chunked bodies are counted as they arrive and cut off at the cap.
+    """
+
+    def __init__(self, app, max_bytes=MAX_REQUEST_BYTES, exempt=UNLIMITED_UPLOAD_PATHS):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH")
+                or scope["path"].startswith(self.exempt)):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/"):
+            await self.app(scope, receive, send)
+            return
+        too_large = JSONResponse({"detail": f"Request body exceeds {self.max_bytes} bytes"}, status_code=413)
+        length = headers.get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            await too_large(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise UploadTooLarge(f"Request body exceeds {self.max_bytes} bytes")
+            return message
+
+        async def guarded_send(message):
+            # The app turns the aborted form parse into its own error; 413 replaces it
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            pass
+        if exceeded:
+            await too_large(scope, receive, send)
+
+
+@dataclass
+class StoredFile:
+    sha256: str
+    relpath: str
+    path: str
+    size: int
+    created: bool  # False when an identical upload was already stored
+
+
+def _extension(filename):
+    ext = (filename or "").rsplit(".", 1)[-1].lower()
+    return ext if ext in IMAGE_EXTENSIONS else "bin"
+
+
+class ContentStore:
+    """
+    Content-addressed file store: <root>/ab/cd/<sha256>.<ext>.
+    Uploads stream to a temp file while being hashed, are fsynced, then
+    renamed into place, so identical uploads share one file on disk.
+    Because of that sharing a failed request never deletes its file: another
+    record may point at the same digest. collect_garbage() removes files no
+    record references once they are old enough.
+    """
+
+    def __init__(self, root, max_bytes=MAX_UPLOAD_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        # Temp files live beside the root so the static /images mount never serves them
+        self.tmp_dir = os.path.join(os.path.dirname(root) or ".", ".tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path_for(self, relpath):
+        return os.path.join(self.root, relpath)
+
+    async def save_upload(self, upload):
+        """Stream an UploadFile to disk; returns once the bytes are durable"""
+        if upload.size is not None and upload.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+
+        hasher = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out:
+                while chunk := await upload.read(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+                    hasher.update(chunk)
+                    await out.write(chunk)
+                await out.flush()
+                await asyncio.get_running_loop().run_in_executor(None, os.fsync, out.fileno())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        digest = hasher.hexdigest()
+        relpath = f"{digest[:2]}/{digest[2:4]}/{digest}.{_extension(upload.filename)}"
+        path = self.path_for(relpath)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            self._touch(path)
+            return StoredFile(digest, relpath, path, size, created=False)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return StoredFile(digest, relpath, path, size, created=True)
+
+    def save_bytes(self, data, filename):
+        """Synchronous counterpart of save_upload for in-memory content (bulk imports)"""
+        if len(data) > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+        digest = hashlib.sha256(data).hexdigest()
+        relpath = f"{digest[:2]}/{digest[2:4]}/{digest}.{_extension(filename)}"
+        path = self.path_for(relpath)
+        if os.path.exists(path):
+            self._touch(path)
+            return StoredFile(digest, relpath, path, len(data), created=False)
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        with open(tmp_path, "wb") as out:
+            out.write(data)
+            out.flush()
+            os.fsync(out.fileno())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return StoredFile(digest, relpath, path, len(data), created=True)
+
+    @staticmethod
+    def _touch(path):
+        """A new reference to an existing file restarts its garbage-collection grace period"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def collect_garbage(self, referenced, min_age=GC_MIN_AGE_SECONDS, dry_run=False):
+        """
+        Delete stored files (and their variants) whose digest is not in
+        `referenced` and that were last written or reused more than min_age
+        seconds ago. Returns (files removed, bytes freed); dry_run only counts.
+        """
+        cutoff = time.time() - min_age
+        removed = freed = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                match = _STORED_NAME.match(name)
+                if match is None or match.group(1) in referenced:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime > cutoff:
+                        continue
+                    if not dry_run:
+                        os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed += 1
+                freed += stat.st_size
+        return removed, freed
+
+    def variant_relpath(self, relpath, max_side):
+        stem = os.path.splitext(relpath)[0]
+        return f"{stem}_{max_side}.jpg"
+
+    def make_variants(self, relpath, sides=VARIANT_SIDES):
+        """Write recompressed JPEG copies bounded to each max side (background job)"""
+        source = self.path_for(relpath)
+        try:
+            for max_side in sides:
+                target = self.path_for(self.variant_relpath(relpath, max_side))
+                if os.path.exists(target):
+                    continue
+                with Image.open(source) as img:
+                    # draft() lets libjpeg decode at a reduced scale directly
+                    img.draft("RGB", (max_side, max_side))
+                    img = img.convert("RGB")
+                    img.thumbnail((max_side, max_side))
+                    tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+                    img.save(tmp_path, "JPEG", quality=82, optimize=True, progressive=True)
+                os.replace(tmp_path, target)
+        except Exception as e:
+            logger.warning(f"Could not build variants for {relpath}: {e}")
+
+
+image_store = ContentStore("Storage/Images")
+proof_store = ContentStore("Storage/Proofs")
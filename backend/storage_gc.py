@@ -0,0 +1,54 @@
+"""
+Delete stored photos and gate pass proofs that no record references.
+
+Run from the backend folder, against the configured STORAGE_BACKEND:
+    python storage_gc.py --dry-run
+    python storage_gc.py --min-age-hours 24
+
+Uploads are content-addressed and shared between identical files, so a
+failed registration or pass request leaves its file behind rather than
+risk deleting one another record points at. This pass collects the
+image_sha256 of every user and the proof_sha256 of every gate pass and
+removes the other files (and their resized variants) once they are older
+than --min-age-hours, which keeps requests still in flight safe.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Add current directory to path to import config and services
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.repository import create_repository
+from services.upload_storage import GC_MIN_AGE_SECONDS, image_store, proof_store
+
+
+async def referenced_digests(repo):
+    images, proofs = set(), set()
+    async for _, data in repo.stream_users(fields=["image_sha256"]):
+        if data.get("image_sha256"):
+            images.add(data["image_sha256"])
+    async for _, data in repo.stream_passes(fields=["proof_sha256"]):
+        if data.get("proof_sha256"):
+            proofs.add(data["proof_sha256"])
+    return images, proofs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete unreferenced uploads from Storage/Images and Storage/Proofs")
+    parser.add_argument("--min-age-hours", type=float, default=GC_MIN_AGE_SECONDS / 3600,
+                        help="keep unreferenced files younger than this (requests may still be running)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be deleted without deleting")
+    args = parser.parse_args()
+
+    images, proofs = asyncio.run(referenced_digests(create_repository()))
+    print(f"🔎 {len(images)} referenced photo(s), {len(proofs)} referenced proof(s)")
+    verb = "would remove" if args.dry_run else "removed"
+    for name, store, referenced in (("photos", image_store, images), ("proofs", proof_store, proofs)):
+        removed, freed = store.collect_garbage(referenced, min_age=args.min_age_hours * 3600, dry_run=args.dry_run)
+        print(f"🧹 {name}: {verb} {removed} file(s), {freed / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -73,9 +73,18 @@ export default function RegisterScreen() {
                 },
             });
 
-            if (response.data.status === 'success') {
+            // Registration is processed in the background; poll the job until it finishes
+            let job = response.data;
+            while (job.status === 'accepted' || job.status === 'queued' || job.status === 'processing') {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                job = (await axios.get(`${BACKEND_URL}/users/register/jobs/${job.job_id}`)).data;
+            }
+
+            if (job.status === 'completed') {
                 Alert.alert("Success", "Registration Successful! Please Login.");
                 router.back(); // Go back to Login
+            } else {
+                Alert.alert("Error", job.detail || "Registration failed.");
             }
         } catch (error: any) {
             console.error(error);
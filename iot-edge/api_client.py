@@ -1,21 +1,38 @@
 import requests
 import cv2
 
+import config
+
+from gate_channel import ChannelUnavailable
+
 class APIClient:
-    def __init__(self, base_url):
+    def __init__(self, base_url, timeout=config.VERIFY_TIMEOUT_SECONDS, channel=None):
         self.base_url = base_url
+        self.timeout = timeout
+        # Keep-alive connection: no TCP/TLS handshake per person
+        self.session = requests.Session()
+        # Optional GateChannel: one WebSocket round trip per verify, HTTP while it is down
+        self.channel = channel
 
-    def verify_access(self, qr_content, face_frame):
-        """Send verification request to backend"""
+    def verify_access(self, qr_content, face_frames):
+        """Send verification request to backend (one frame, or best-first frames for fusion)"""
         try:
-            # Encode face frame as JPG
-            _, img_encoded = cv2.imencode('.jpg', face_frame)
-            face_bytes = img_encoded.tobytes()
-
-            files = {'face_image': ('face.jpg', face_bytes, 'image/jpeg')}
+            if not isinstance(face_frames, (list, tuple)):
+                face_frames = [face_frames]
+            jpegs = [cv2.imencode('.jpg', frame)[1].tobytes() for frame in face_frames]
+            if self.channel is not None and self.channel.connected:
+                try:
+                    return self.channel.verify(qr_content, jpegs=jpegs, timeout=self.timeout)
+                except ChannelUnavailable:
+                    pass
+            # Extra frames go in face_images
+            files = []
+            for i, jpeg in enumerate(jpegs):
+                field = 'face_image' if i == 0 else 'face_images'
+                files.append((field, (f'face{i}.jpg', jpeg, 'image/jpeg')))
             data = {'qr_content': qr_content}
             
-            response = requests.post(f"{self.base_url}/verify", data=data, files=files)
+            response = self.session.post(f"{self.base_url}/verify", data=data, files=files, timeout=self.timeout)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -23,3 +40,10 @@ class APIClient:
         except Exception as e:
             return {"status": "FAIL", "message": f"Connection Error: {str(e)}"}
 
+    def post_sensor_batch(self, readings):
+        """Send many sensor readings in one request; the HTTP status, or None when unreachable"""
+        try:
+            response = self.session.post(f"{self.base_url}/sensors/batch", json=readings, timeout=self.timeout)
+            return response.status_code
+        except Exception:
+            return None
@@ -1,5 +1,8 @@
 import cv2
 import logging
+import threading
+import time
+from collections import deque
 
 class Camera:
     def __init__(self, device_id=0):
@@ -17,3 +20,65 @@ class Camera:
 
     def release(self):
         self.cap.release()
+
+
+class FrameGrabber:
+    """Reads frames on a background thread so neither the display nor any stage waits on the camera"""
+
+    def __init__(self, camera, history=30, telemetry=None):
+        self.camera = camera
+        self.telemetry = telemetry
+        self._frames = deque(maxlen=history)  # (seq, timestamp, frame)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            frame = self.camera.capture_frame()
+            if frame is None:
+                time.sleep(0.05)
+                continue
+            if self.telemetry:
+                self.telemetry.record("frame_grab", time.perf_counter() - started)
+                self.telemetry.frame()
+            with self._cond:
+                self._seq += 1
+                self._frames.append((self._seq, time.perf_counter(), frame))
+                self._cond.notify_all()
+
+    def latest(self):
+        """(sequence number, frame) of the newest frame, or (0, None) before the first one"""
+        with self._cond:
+            if not self._frames:
+                return 0, None
+            seq, _, frame = self._frames[-1]
+            return seq, frame
+
+    def frames_since(self, timestamp, limit=None):
+        """Frames captured at or after timestamp (perf_counter), oldest first"""
+        with self._cond:
+            frames = [frame for _, ts, frame in self._frames if ts >= timestamp]
+        return frames[:limit] if limit else frames
+
+    def wait_for(self, seq, timeout=1.0):
+        """Block until a frame newer than seq arrives; returns (seq, frame) or (seq, None) on timeout"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > seq or self._stop.is_set(), timeout)
+            if self._seq > seq:
+                new_seq, _, frame = self._frames[-1]
+                return new_seq, frame
+            return seq, None
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join(timeout=1.0)
@@ -1,5 +1,11 @@
 # Configuration for the IoT Edge Device
 BACKEND_URL = "http://localhost:8000/api"
+GATE_ID = "GATE_01"
+
+# Gate channel: persistent WebSocket for verify requests and backend pushes.
+# Token = device_token(GATE_CHANNEL_SECRET, GATE_ID) from gate_protocol.py; None = HTTP only
+GATE_CHANNEL_URL = "ws://localhost:8000/api/gatepass/channel"
+GATE_CHANNEL_TOKEN = None
 
 # Pin Mappings (for real Raspberry Pi)
 PINS = {
@@ -11,3 +17,23 @@ PINS = {
 CAMERA_ID = 0
 FRAME_WIDTH = 640
 FRAME_HEIGHT = 480
+
+# Face detector: "mtcnn", "haar", "lbp" (needs a cascade .xml) or "dnn" (YuNet .onnx or
+# res10 SSD .caffemodel). MTCNN still aligns the crops; compare with backend/benchmarks/detectors.py
+FACE_DETECTOR = "mtcnn"
+FACE_DETECTOR_MODEL = None
+
+# Gate cycle timing (seconds)
+FACE_SETTLE_SECONDS = 0.3   # pause after the QR so the person can look up at the camera
+HOLD_SECONDS = 3.0          # how long the granted/denied signal is held
+QR_COOLDOWN_SECONDS = 5.0   # ignore the same QR while it stays in view after its session
+VERIFY_TIMEOUT_SECONDS = 10.0
+
+# Performance telemetry: one batch of summaries per interval to /sensors/batch
+TELEMETRY_INTERVAL_SECONDS = 60
+
+# Burst capture: several frames are scored on the device and only the best are uploaded
+BURST_FRAMES = 6            # frames scored per person
+BURST_WINDOW_SECONDS = 0.4  # upper bound on the burst length
+UPLOAD_TOP_K = 1            # >1 sends extra frames for server-side fusion
+BURST_RETRIES = 1           # re-capture the burst if no frame shows a face
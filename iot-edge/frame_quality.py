@@ -0,0 +1,93 @@
+import cv2
+import logging
+import numpy as np
+from dataclasses import dataclass
+
+from face_detectors import make_detector
+
+# Laplacian variance of a sharp, in-focus face crop; anything above counts as fully sharp
+SHARPNESS_REF = 120.0
+# Face box area (fraction of the frame) that counts as "close enough"
+FACE_AREA_REF = 0.12
+# Weights of the combined score for frames with a detected face
+WEIGHTS = {"sharpness": 0.4, "size": 0.25, "centrality": 0.15, "exposure": 0.2}
+
+
+@dataclass
+class FrameScore:
+    total: float
+    face: bool
+    sharpness: float
+    size: float
+    centrality: float
+    exposure: float
+
+
+class FrameScorer:
+    """
+    Cheap per-frame quality score used to pick the frame(s) worth uploading.
+    A fast detector from face_detectors.py (the Haar cascade unless one is
+    passed in) finds the face box on a downscaled frame, a few ms on a Pi;
+    sharpness and exposure are measured inside that box. Without any detector
+    (OpenCV 5.x moved the cascade to contrib) no frame claims a face and
+    frames are ranked by sharpness and exposure alone.
+    """
+
+    def __init__(self, detect_width=320, detector=None):
+        self.detect_width = detect_width
+        self.detector = detector
+        if self.detector is None:
+            try:
+                self.detector = make_detector("haar", min_size=24)
+            except (RuntimeError, OSError) as e:
+                logging.warning(f"No face detector for frame scoring ({e}), ranking by sharpness and exposure")
+
+    @property
+    def detects_faces(self):
+        return self.detector is not None
+
+    def score(self, frame):
+        if frame.shape[1] > self.detect_width:
+            ratio = self.detect_width / frame.shape[1]
+            frame = cv2.resize(frame, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+
+        found = self.detector.detect(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) if self.detector else None
+        if found is not None:
+            # Largest box first; clipped, since DNN boxes can overhang the frame
+            x1, y1, x2, y2 = found[0][0]
+            x, y = max(0, int(x1)), max(0, int(y1))
+            w, h = min(width, int(x2)) - x, min(height, int(y2)) - y
+        if found is None or w <= 1 or h <= 1:
+            # No face: rank only by sharpness/exposure, always below any frame with a face
+            sharpness, exposure = self._sharpness(gray), self._exposure(gray)
+            return FrameScore(0.1 * sharpness * exposure, False, sharpness, 0.0, 0.0, exposure)
+
+        region = gray[y:y + h, x:x + w]
+        sharpness = self._sharpness(region)
+        exposure = self._exposure(region)
+        size = min(1.0, (w * h) / (width * height) / FACE_AREA_REF)
+        offset = np.hypot(x + w / 2 - width / 2, y + h / 2 - height / 2)
+        centrality = 1.0 - offset / np.hypot(width / 2, height / 2)
+
+        parts = {"sharpness": sharpness, "size": size, "centrality": centrality, "exposure": exposure}
+        total = 0.1 + 0.9 * sum(WEIGHTS[name] * value for name, value in parts.items())
+        return FrameScore(total, True, sharpness, size, centrality, exposure)
+
+    @staticmethod
+    def _sharpness(gray):
+        return min(1.0, cv2.Laplacian(gray, cv2.CV_64F).var() / SHARPNESS_REF)
+
+    @staticmethod
+    def _exposure(gray):
+        """1.0 for mid-grey with no clipped pixels, falling towards 0 for dark/blown-out crops"""
+        mean = gray.mean() / 255.0
+        clipped = np.count_nonzero((gray < 8) | (gray > 247)) / gray.size
+        return max(0.0, 1.0 - abs(mean - 0.5) * 2) * (1.0 - clipped)
+
+    def select(self, frames, k=1):
+        """Top-k (score, frame) pairs from a burst, best first"""
+        scored = [(self.score(frame), frame) for frame in frames]
+        scored.sort(key=lambda item: item[0].total, reverse=True)
+        return scored[:k]
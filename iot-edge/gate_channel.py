@@ -0,0 +1,146 @@
+import asyncio
+import itertools
+import logging
+import threading
+
+import gate_protocol as protocol
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelUnavailable(Exception):
+    """Not connected (the caller falls back to HTTP)"""
+
+
+class GateChannel:
+    """
+    Persistent WebSocket to the backend for this gate (framing in gate_protocol.py).
+    Runs its own asyncio loop on a background thread: reconnects with backoff,
+    sends heartbeats, and matches RESULT frames to requests by id so several
+    verifications can be in flight. PUSH frames go to on_push(meta).
+    """
+
+    def __init__(self, url, device_id, token, on_push=None, connect_timeout=5.0):
+        self.url = url
+        self.device_id = device_id
+        self.token = token
+        self.on_push = on_push
+        self.connect_timeout = connect_timeout
+        self.heartbeat = 10.0  # replaced by the server's value on WELCOME
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._ws = None
+        self._closed = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self._run(),),
+                                        name="gate-channel", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def connected(self):
+        return self._ws is not None
+
+    def verify(self, qr_content, jpegs=None, embedding=None, timeout=10.0):
+        """Verify result dict; raises ChannelUnavailable when the channel is down"""
+        if self._ws is None:
+            raise ChannelUnavailable("Gate channel not connected")
+        request_id = next(self._ids) & 0xFFFFFFFF
+        frame = protocol.verify_frame(request_id, qr_content, jpegs=jpegs, embedding=embedding)
+        future = asyncio.run_coroutine_threadsafe(self._request(request_id, frame), self._loop)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise ChannelUnavailable("Gate channel request timed out")
+
+    async def _request(self, request_id, frame):
+        ws = self._ws
+        if ws is None:
+            raise ChannelUnavailable("Gate channel not connected")
+        waiter = self._loop.create_future()
+        self._pending[request_id] = waiter
+        try:
+            await ws.send(frame)
+            return await waiter
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _run(self):
+        import websockets
+
+        backoff = 0.5
+        while not self._closed:
+            try:
+                async with websockets.connect(self.url, open_timeout=self.connect_timeout, max_size=None,
+                                              ping_interval=None) as ws:
+                    await ws.send(protocol.encode(protocol.HELLO, 0, {"device_id": self.device_id, "token": self.token}))
+                    msg_type, _, meta, _ = protocol.decode(await asyncio.wait_for(ws.recv(), self.connect_timeout))
+                    if msg_type != protocol.WELCOME:
+                        raise ConnectionError(meta.get("message", "Gate channel rejected the device"))
+                    self.heartbeat = meta.get("heartbeat", self.heartbeat)
+                    self._ws = ws
+                    backoff = 0.5
+                    logger.info(f"Gate channel connected to {self.url}")
+                    await asyncio.gather(self._read(ws), self._send_heartbeats(ws))
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                if not self._closed:
+                    logger.warning(f"Gate channel unavailable ({e}), retrying in {backoff:.1f}s")
+            finally:
+                self._ws = None
+                for waiter in self._pending.values():
+                    if not waiter.done():
+                        waiter.set_exception(ChannelUnavailable("Gate channel disconnected"))
+            if not self._closed:
+                try:
+                    await asyncio.sleep(backoff)
+                except asyncio.CancelledError:
+                    break
+                backoff = min(backoff * 2, 30.0)
+
+    async def _read(self, ws):
+        async for data in ws:
+            msg_type, request_id, meta, _ = protocol.decode(data)
+            if msg_type in (protocol.RESULT, protocol.ERROR) and request_id in self._pending:
+                waiter = self._pending[request_id]
+                if waiter.done():
+                    continue
+                if msg_type == protocol.RESULT:
+                    waiter.set_result(meta)
+                else:
+                    waiter.set_result({"status": "FAIL", "message": f"Server Error: {meta.get('message')}"})
+            elif msg_type == protocol.PONG:
+                self._last_pong = self._loop.time()
+            elif msg_type == protocol.PUSH and self.on_push:
+                try:
+                    self.on_push(meta)
+                except Exception as e:
+                    logger.error(f"Gate channel push handler failed: {e}")
+        raise ConnectionError("Gate channel closed by the server")
+
+    async def _send_heartbeats(self, ws):
+        self._last_pong = self._loop.time()
+        while True:
+            await ws.send(protocol.encode(protocol.PING))
+            await asyncio.sleep(self.heartbeat)
+            if self._loop.time() - self._last_pong > self.heartbeat * 2:
+                await ws.close()
+                raise ConnectionError("Gate channel heartbeat lost")
+
+    def close(self):
+        self._closed = True
+
+        async def shutdown():
+            if self._ws is not None:
+                await self._ws.close()
+            for task in asyncio.all_tasks():
+                if task is not asyncio.current_task():
+                    task.cancel()
+
+        if self._thread.is_alive():
+            asyncio.run_coroutine_threadsafe(shutdown(), self._loop)
+            self._thread.join(timeout=2.0)
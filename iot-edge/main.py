@@ -1,11 +1,13 @@
 import cv2
-import time
 import logging
-from camera import Camera
+from camera import Camera, FrameGrabber
 from qr_scanner import QRScanner
 from api_client import APIClient
+from gate_channel import GateChannel
 from gpio_control import GPIOControl
 from voice import VoiceFeedback
+from pipeline import GatePipeline
+from telemetry import Telemetry
 import config
 
 # Setup logging
@@ -14,65 +16,44 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 def main():
     # Initialize components
     cam = Camera(config.CAMERA_ID)
-    qr_scanner = QRScanner()
-    api = APIClient(config.BACKEND_URL)
+    channel = None
+    if config.GATE_CHANNEL_TOKEN:
+        channel = GateChannel(config.GATE_CHANNEL_URL, config.GATE_ID, config.GATE_CHANNEL_TOKEN,
+                              on_push=lambda event: logging.info(f"Backend push: {event}")).start()
+    api = APIClient(config.BACKEND_URL, channel=channel)
+    telemetry = Telemetry(api).start()
+    grabber = FrameGrabber(cam, telemetry=telemetry).start()
     gpio = GPIOControl()
     voice = VoiceFeedback()
+    pipeline = GatePipeline(grabber, QRScanner(), api, gpio, voice, telemetry=telemetry).start()
 
     logging.info("Smart Gate Pass Terminal - Edge Controller Active")
     voice.speak("System ready. Please show your QR code.")
 
     try:
+        # The UI loop only displays; capture, QR, verification and actuation run on their own threads
+        last_seq = 0
         while True:
-            frame = cam.capture_frame()
-            if frame is None:
-                continue
+            seq, frame = grabber.wait_for(last_seq, timeout=0.1)
+            if frame is not None:
+                last_seq = seq
+                cv2.imshow("Smart Gate Pass Terminal", pipeline.draw_overlay(frame.copy()))
 
-            # 1. Look for QR Code
-            qr_content = qr_scanner.scan(frame)
-            if qr_content:
-                logging.info(f"QR Scanned: {qr_content}")
-                voice.speak("QR detected. Holding for face capture.")
-                
-                # Visual feedback on frame
-                cv2.putText(frame, "SCANNED! Processing...", (50, 50), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                cv2.imshow("Smart Gate Pass Terminal", frame)
-                cv2.waitKey(1000)
-
-                # 2. Re-capture frame for face (better quality/pose)
-                face_frame = cam.capture_frame()
-                
-                # 3. Verify with Backend
-                logging.info("Verifying identity...")
-                result = api.verify_access(qr_content, face_frame)
-
-                if result.get("status") == "SUCCESS":
-                    user = result.get("user", "User")
-                    logging.info(f"Access Granted: {user}")
-                    gpio.access_granted()
-                    voice.speak(f"Access Granted. Welcome {user}.")
-                else:
-                    reason = result.get("message", "Unknown error")
-                    logging.warning(f"Access Denied: {reason}")
-                    gpio.access_denied()
-                    voice.speak("Access Denied.")
-
-                # Hold feedback state
-                time.sleep(3)
-                gpio.reset()
-                logging.info("Ready for next scan")
-                voice.speak("Ready.")
-
-            # Display preview
-            cv2.imshow("Smart Gate Pass Terminal", frame)
-            
             if cv2.waitKey(1) & 0xFF == 27: # ESC
                 break
 
     except KeyboardInterrupt:
         logging.info("Shutting down...")
     finally:
+        pipeline.stop()
+        grabber.stop()
+        voice.close()
+        telemetry.close()
+        if channel is not None:
+            channel.close()
+        gpio.reset()
+        logging.info("Stage timings:")
+        pipeline.log_stats()
         cam.release()
         cv2.destroyAllWindows()
 
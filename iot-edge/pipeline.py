@@ -0,0 +1,275 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import cv2
+
+import config
+from face_detectors import DETECTORS, make_detector
+from frame_quality import FrameScorer
+
+# Gate states. QR decoding keeps running during ACTUATING, so the next
+# person's pass is already queued when the previous signal releases.
+IDLE = "IDLE"
+FACE_CAPTURE = "FACE_CAPTURE"
+VERIFYING = "VERIFYING"
+ACTUATING = "ACTUATING"
+
+STAGES = ("qr_decode", "face_capture", "frame_select", "verify", "actuation", "total")
+
+
+@dataclass
+class Session:
+    """One person passing the gate"""
+    qr_content: str
+    started: float = field(default_factory=time.perf_counter)
+    burst: list = field(default_factory=list)
+    face_frames: list = field(default_factory=list)
+    result: dict = None
+
+
+class StageTimings:
+    """Rolling per-stage durations and persons/minute over recent sessions"""
+
+    def __init__(self, window=50, telemetry=None):
+        self.window = window
+        self.telemetry = telemetry
+        self._samples = {stage: deque(maxlen=window * 20 if stage == "qr_decode" else window) for stage in STAGES}
+        self._completed = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._samples[stage].append(seconds)
+        if self.telemetry:
+            self.telemetry.record(stage, seconds)
+
+    def complete(self):
+        with self._lock:
+            self._completed.append(time.perf_counter())
+
+    def persons_per_minute(self):
+        with self._lock:
+            if len(self._completed) < 2:
+                return 0.0
+            span = self._completed[-1] - self._completed[0]
+            return (len(self._completed) - 1) * 60 / span if span else 0.0
+
+    def summary(self):
+        with self._lock:
+            result = {}
+            for stage, samples in self._samples.items():
+                if samples:
+                    ordered = sorted(samples)
+                    result[stage] = {
+                        "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+                        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 1),
+                    }
+            return result
+
+
+class GatePipeline:
+    """
+    Concurrent gate controller. Stages run on their own threads:
+      capture   - FrameGrabber keeps the newest camera frame
+      qr        - decodes QR codes from new frames while the gate can accept one
+      control   - the state machine: burst capture, verify, actuation hold
+      verify    - best-frame selection and the HTTP call, on a one-worker executor
+      voice     - text-to-speech queue (VoiceFeedback)
+    The caller's thread only draws the preview, so the display never freezes.
+    """
+
+    def __init__(self, grabber, qr_scanner, api, gpio, voice, telemetry=None):
+        self.grabber = grabber
+        self.qr_scanner = qr_scanner
+        self.api = api
+        self.gpio = gpio
+        self.voice = voice
+        self.scorer = FrameScorer(detector=self._scoring_detector())
+        self.timings = StageTimings(telemetry=telemetry)
+        self.state = IDLE
+        self.current = None
+        self.pending = None
+        self.last_result = None
+        self._verifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="verify")
+        self._future = None
+        self._capture_at = 0.0
+        self._release_at = 0.0
+        self._actuated_at = 0.0
+        self._last_qr = (None, 0.0)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._qr_loop, name="qr", daemon=True),
+            threading.Thread(target=self._control_loop, name="control", daemon=True),
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._verifier.shutdown(wait=False)
+
+    # QR stage
+
+    def _accepting_qr(self):
+        with self._lock:
+            return self.pending is None and self.state in (IDLE, ACTUATING)
+
+    def _qr_loop(self):
+        seen_seq = 0
+        while not self._stop.is_set():
+            if not self._accepting_qr():
+                time.sleep(0.02)
+                continue
+            seq, frame = self.grabber.wait_for(seen_seq, timeout=0.5)
+            if frame is None:
+                continue
+            seen_seq = seq
+
+            started = time.perf_counter()
+            qr_content = self.qr_scanner.scan(frame)
+            self.timings.record("qr_decode", time.perf_counter() - started)
+            if not qr_content:
+                continue
+
+            now = time.monotonic()
+            with self._lock:
+                last_qr, last_seen = self._last_qr
+                self._last_qr = (qr_content, now)
+                # Same pass still held up after its session: not a new person
+                if qr_content == last_qr and now - last_seen < config.QR_COOLDOWN_SECONDS:
+                    continue
+                self.pending = Session(qr_content)
+            logging.info(f"QR Scanned: {qr_content}")
+            self.voice.speak("QR detected. Please look at the camera.")
+
+    # State machine
+
+    def _control_loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                self._step(time.perf_counter())
+            time.sleep(0.005)
+
+    def _step(self, now):
+        if self.state == IDLE and self.pending is not None:
+            self.current, self.pending = self.pending, None
+            self._capture_at = now + config.FACE_SETTLE_SECONDS
+            self.state = FACE_CAPTURE
+
+        elif self.state == FACE_CAPTURE and now >= self._capture_at:
+            # Burst: up to BURST_FRAMES frames taken after the settle pause
+            burst = self.grabber.frames_since(self._capture_at, config.BURST_FRAMES)
+            if not burst or (len(burst) < config.BURST_FRAMES
+                             and now < self._capture_at + config.BURST_WINDOW_SECONDS):
+                return
+            self.current.burst = burst
+            self.timings.record("face_capture", now - self.current.started)
+            logging.info("Verifying identity...")
+            self._future = self._verifier.submit(self._verify, self.current)
+            self.state = VERIFYING
+
+        elif self.state == VERIFYING and self._future.done():
+            self.current.result = self._future.result()
+            self._actuate(self.current.result)
+            self._actuated_at = now
+            self._release_at = now + config.HOLD_SECONDS
+            self.state = ACTUATING
+
+        elif self.state == ACTUATING and now >= self._release_at:
+            self.gpio.reset()
+            self.timings.record("actuation", now - self._actuated_at)
+            self.timings.record("total", now - self.current.started)
+            self.timings.complete()
+            with_next = " (next pass already queued)" if self.pending else ""
+            logging.info(
+                f"Gate cycle {now - self.current.started:.2f}s, "
+                f"{self.timings.persons_per_minute():.1f} persons/min{with_next}"
+            )
+            self.current = None
+            self.state = IDLE
+
+    @staticmethod
+    def _scoring_detector():
+        """The configured detector when it is one of the fast OpenCV ones, else the scorer's default"""
+        if config.FACE_DETECTOR in DETECTORS and config.FACE_DETECTOR != "mtcnn":
+            try:
+                return make_detector(config.FACE_DETECTOR, config.FACE_DETECTOR_MODEL, min_size=24)
+            except (ValueError, RuntimeError, OSError, cv2.error) as e:
+                logging.warning(f"Face detector '{config.FACE_DETECTOR}' unavailable for frame scoring ({e})")
+        return None
+
+    def _select_frames(self, session):
+        """Score the burst on the device and keep the best UPLOAD_TOP_K frames"""
+        burst = session.burst
+        for attempt in range(config.BURST_RETRIES + 1):
+            best = self.scorer.select(burst, config.UPLOAD_TOP_K)
+            # Without a detector no frame can show a face, so another burst would not help
+            if best[0][0].face or not self.scorer.detects_faces or attempt == config.BURST_RETRIES:
+                break
+            # Nobody facing the camera yet: one more burst instead of a wasted backend call
+            self.voice.speak("Please look at the camera.")
+            started = time.perf_counter()
+            time.sleep(config.BURST_WINDOW_SECONDS)
+            burst = self.grabber.frames_since(started, config.BURST_FRAMES) or burst
+
+        frames = [frame for score, frame in best if score.face] or [best[0][1]]
+        top = best[0][0]
+        logging.info(
+            f"Best of {len(burst)} frames: score {top.total:.2f} (face={top.face}, "
+            f"sharpness {top.sharpness:.2f}, size {top.size:.2f}, exposure {top.exposure:.2f})"
+        )
+        return frames
+
+    def _verify(self, session):
+        started = time.perf_counter()
+        session.face_frames = self._select_frames(session)
+        self.timings.record("frame_select", time.perf_counter() - started)
+
+        started = time.perf_counter()
+        try:
+            return self.api.verify_access(session.qr_content, session.face_frames)
+        finally:
+            self.timings.record("verify", time.perf_counter() - started)
+
+    def _actuate(self, result):
+        if result.get("status") == "SUCCESS":
+            user = result.get("user", "User")
+            logging.info(f"Access Granted: {user}")
+            self.gpio.access_granted()
+            self.voice.speak(f"Access Granted. Welcome {user}.")
+        else:
+            reason = result.get("message", "Unknown error")
+            logging.warning(f"Access Denied: {reason}")
+            self.gpio.access_denied()
+            self.voice.speak("Access Denied.")
+        self.last_result = result
+
+    # Display
+
+    def draw_overlay(self, frame):
+        """Annotate a preview frame with the gate state and throughput"""
+        with self._lock:
+            state, pending = self.state, self.pending is not None
+        color = (0, 255, 255)
+        if state == ACTUATING and self.last_result is not None:
+            color = (0, 255, 0) if self.last_result.get("status") == "SUCCESS" else (0, 0, 255)
+        label = f"{state}{' +1 queued' if pending else ''}"
+        cv2.putText(frame, label, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+        cv2.putText(frame, f"{self.timings.persons_per_minute():.1f} persons/min", (10, 60),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        return frame
+
+    def log_stats(self):
+        for stage, stats in self.timings.summary().items():
+            logging.info(f"  {stage:<13} avg {stats['avg_ms']:>8.1f} ms   p95 {stats['p95_ms']:>8.1f} ms")
+        logging.info(f"  throughput    {self.timings.persons_per_minute():.1f} persons/min")
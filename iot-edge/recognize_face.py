@@ -6,6 +6,10 @@ import time
 from pathlib import Path
 import sys
 
+# Switch from exact gallery search to the ANN index at this many faces
+ANN_MIN_GALLERY = 5000
+ANN_NPROBE = 8
+
 def check_dependencies():
     """Check if required modules are installed"""
     try:
@@ -19,44 +23,42 @@ def check_dependencies():
         return False
 
 def load_embeddings():
-    """Load all registered face embeddings"""
-    embeddings = {}
-    names = []
+    """Open the registered face gallery (memory-mapped, no per-person files to read)"""
+    from gallery import Gallery
     
     if not os.path.exists('embeddings'):
         print("❌ 'embeddings/' folder not found!")
         print("📁 Please run 'register_face.py' first.")
         return None, None
     
-    embedding_files = [f for f in os.listdir('embeddings') if f.endswith('_embedding.npy')]
+    gallery = Gallery('embeddings/gallery.bin')
+    migrated = gallery.import_npy_dir('embeddings')
+    if migrated:
+        print(f"📦 Migrated {migrated} legacy embedding file(s) into embeddings/gallery.bin")
     
-    if not embedding_files:
+    if len(gallery) == 0:
         print("❌ No registered faces found!")
         print("📁 Please run 'register_face.py' first.")
         return None, None
     
-    print(f"📂 Loading {len(embedding_files)} registered face(s)...")
-    
-    for file in embedding_files:
-        try:
-            name = file.replace('_embedding.npy', '')
-            embedding = np.load(os.path.join('embeddings', file))
-            
-            # Ensure embedding is normalized
-            embedding = embedding / np.linalg.norm(embedding)
-            embeddings[name] = embedding
-            names.append(name)
-            
-            print(f"   ✅ {name}")
-        except Exception as e:
-            print(f"   ❌ Error loading {file}: {e}")
+    print(f"📂 Loaded {len(gallery)} registered face(s)")
+    names = gallery.ids
     
-    return embeddings, names
+    # Large galleries are searched through the IVF index instead of exhaustively
+    if len(gallery) >= ANN_MIN_GALLERY:
+        from ann_index import load_or_build
+        ids, matrix = gallery.snapshot()
+        index = load_or_build('embeddings/gallery.ivf.npz', ids, matrix, nprobe=ANN_NPROBE)
+        print(f"⚡ Face index: {index.nlist} cells, nprobe={ANN_NPROBE}")
+        return index, names
+    return gallery, names
 
 def setup_models(device):
     """Initialize face detection and recognition models"""
     try:
         from facenet_pytorch import MTCNN, InceptionResnetV1
+        from face_detectors import load_detector
+        import config
         
         print("🔄 Loading face detection model...")
         mtcnn = MTCNN(
@@ -67,51 +69,55 @@ def setup_models(device):
             factor=0.709,
             post_process=True,
             device=device,
-            keep_all=False  # Detect only one face for simplicity
+            keep_all=False  # Boxes are detected once per frame and passed to extract() one by one
         )
+        # MTCNN aligns the crops; the detector that finds them is chosen in config.py
+        detector = load_detector(config.FACE_DETECTOR, config.FACE_DETECTOR_MODEL, mtcnn=mtcnn)
+        print(f"🔍 Face detector: {detector.name}")
         
         print("🔄 Loading face recognition model...")
         model = InceptionResnetV1(pretrained='vggface2').eval().to(device)
         
-        return mtcnn, model
+        return mtcnn, detector, model
     except Exception as e:
         print(f"❌ Error loading models: {e}")
-        return None, None
+        return None, None, None
 
-def recognize_face(face_pil, model, embeddings, device):
-    """Recognize a face from PIL image"""
-    from scipy.spatial.distance import cosine
-    
+def recognize_faces(face_tensors, model, embeddings, device):
+    """
+    Recognize every face of a frame against the gallery in one batched
+    forward pass. Faces are assigned to people one-to-one (a person standing
+    next to their look-alike cannot both be matched to the same name).
+    Returns (name, distance) per face.
+    """
+    from scipy.optimize import linear_sum_assignment
     try:
-        # Convert face to tensor and get embedding
         with torch.no_grad():
-            face_tensor = face_pil.unsqueeze(0).to(device)
-            embedding = model(face_tensor).detach().cpu().numpy()
-        
-        # Normalize embedding
-        embedding = embedding / np.linalg.norm(embedding)
+            vectors = model(torch.stack(face_tensors).to(device)).detach().cpu().numpy()
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
         
-        # Compare with registered faces
-        best_match = None
-        min_distance = float('inf')
+        # A few nearest gallery entries per face are enough to resolve conflicts
+        candidates = [embeddings.search(vector, k=3) for vector in vectors]
+        names = list({name for matches in candidates for name, _ in matches})
+        if not names:
+            return [("Unknown", 1.0)] * len(vectors)
+        distances = np.full((len(vectors), len(names)), 2.0)
+        for i, matches in enumerate(candidates):
+            for name, distance in matches:
+                distances[i, names.index(name)] = distance
         
-        for name, registered_embedding in embeddings.items():
-            distance = cosine(embedding.flatten(), registered_embedding.flatten())
-            if distance < min_distance:
-                min_distance = distance
-                best_match = name
-        
-        # Threshold for recognition (adjust as needed)
-        if min_distance < 0.6:  # Lower = stricter
-            return best_match, min_distance
-        else:
-            return "Unknown", min_distance
+        results = [("Unknown", float(row.min())) for row in distances]
+        for row, col in zip(*linear_sum_assignment(distances)):
+            # Threshold for recognition (adjust as needed)
+            if distances[row, col] < 0.6:  # Lower = stricter
+                results[row] = (names[col], float(distances[row, col]))
+        return results
             
     except Exception as e:
         print(f"⚠️ Recognition error: {e}")
-        return "Error", 1.0
+        return [("Error", 1.0)] * len(face_tensors)
 
-def draw_info(frame, face_info, fps):
+def draw_info(frame, faces_info, fps):
     """Draw information on frame"""
     height, width = frame.shape[:2]
     
@@ -124,10 +130,8 @@ def draw_info(frame, face_info, fps):
     cv2.putText(frame, f"FPS: {fps:.1f}", (10, 25),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
     
-    # Draw recognition result
-    if face_info:
-        name, distance, (x1, y1, x2, y2) = face_info
-        
+    # Draw recognition results, one box per face
+    for name, distance, (x1, y1, x2, y2) in faces_info or []:
         # Draw face bounding box
         color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
         cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
@@ -140,7 +144,7 @@ def draw_info(frame, face_info, fps):
         cv2.rectangle(frame, (x1, y1 - 30), (x1 + label_size[0] + 10, y1), color, -1)
         cv2.putText(frame, label, (x1 + 5, y1 - 10),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-    else:
+    if not faces_info:
         cv2.putText(frame, "No face detected", (10, 55),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
     
@@ -158,7 +162,7 @@ def main():
     
     # Load embeddings
     embeddings, names = load_embeddings()
-    if not embeddings:
+    if embeddings is None:
         input("\nPress Enter to exit...")
         return
     
@@ -169,7 +173,7 @@ def main():
     print(f"📊 Using device: {device}")
     
     # Setup models
-    mtcnn, model = setup_models(device)
+    mtcnn, detector, model = setup_models(device)
     if not mtcnn or not model:
         return
     
@@ -193,6 +197,12 @@ def main():
     print("   • Press ESC to exit")
     print("\n" + "-"*60)
     
+    # Per-stage timings shipped to the backend as gate_telemetry readings
+    from api_client import APIClient
+    from telemetry import Telemetry
+    import config
+    telemetry = Telemetry(APIClient(config.BACKEND_URL)).start()
+    
     # For FPS calculation
     frame_count = 0
     start_time = time.time()
@@ -206,10 +216,13 @@ def main():
     last_face_info = None
     
     while True:
+        grab_started = time.perf_counter()
         ret, frame = cap.read()
         if not ret:
             print("❌ Failed to grab frame")
             break
+        telemetry.record("frame_grab", time.perf_counter() - grab_started)
+        telemetry.frame()
         
         frame_counter += 1
         
@@ -225,41 +238,34 @@ def main():
         # Process face every 'skip_frames' frames
         if frame_counter % skip_frames == 0:
             try:
-                from PIL import Image
-                
-                # Convert to RGB for MTCNN
+                # Convert to RGB for the detector and MTCNN
                 rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                 
                 # Detect face
-                boxes, probs = mtcnn.detect(rgb_frame)
+                detect_started = time.perf_counter()
+                found = detector.detect(rgb_frame)
+                telemetry.record("face_detect", time.perf_counter() - detect_started)
                 
-                if boxes is not None and len(boxes) > 0:
-                    # Get the first face (most prominent)
-                    box = boxes[0]
-                    prob = probs[0]
+                if found is not None:
+                    boxes, probs, _ = found
+                    # Every confident face: a group walking through is recognized together
+                    kept = [box for box, prob in zip(boxes, probs) if prob > 0.9]  # Confidence threshold
                     
-                    if prob > 0.9:  # Confidence threshold
-                        x1, y1, x2, y2 = [int(coord) for coord in box]
-                        
-                        # Ensure coordinates are within frame
-                        x1, y1 = max(0, x1), max(0, y1)
-                        x2, y2 = min(frame.shape[1], x2), min(frame.shape[0], y2)
-                        
-                        # Extract face region
-                        face_rgb = rgb_frame[y1:y2, x1:x2]
+                    if kept:
+                        # Align all faces from the frame already in memory, no second detection pass
+                        recognize_started = time.perf_counter()
+                        face_tensors = mtcnn.extract([rgb_frame] * len(kept), [np.array([box]) for box in kept], None)
                         
-                        if face_rgb.size > 0:
-                            # Convert to PIL Image
-                            face_pil = Image.fromarray(face_rgb)
-                            
-                            # Get face embedding (resize to 160x160)
-                            face_tensor = mtcnn(face_pil)
-                            
-                            if face_tensor is not None:
-                                # Recognize face
-                                name, distance = recognize_face(face_tensor, model, embeddings, device)
-                                face_info = (name, distance, (x1, y1, x2, y2))
-                                last_face_info = face_info
+                        results = recognize_faces(face_tensors, model, embeddings, device)
+                        telemetry.record("recognize", time.perf_counter() - recognize_started)
+                        face_info = []
+                        for (name, distance), box in zip(results, kept):
+                            x1, y1, x2, y2 = [int(coord) for coord in box]
+                            # Ensure coordinates are within frame
+                            x1, y1 = max(0, x1), max(0, y1)
+                            x2, y2 = min(frame.shape[1], x2), min(frame.shape[0], y2)
+                            face_info.append((name, distance, (x1, y1, x2, y2)))
+                        last_face_info = face_info
             except Exception as e:
                 # Silently handle errors during processing
                 pass
@@ -280,6 +286,7 @@ def main():
             break
     
     # Cleanup
+    telemetry.close()
     cap.release()
     cv2.destroyAllWindows()
     print("\n🛑 Recognition stopped.")
@@ -5,6 +5,15 @@ import torch
 import os
 from pathlib import Path
 import cv2
+import argparse
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from face_detectors import DETECTORS, load_detector
+from gallery import Gallery
 
 def display_welcome():
     print("\n" + "="*60)
@@ -13,7 +22,7 @@ def display_welcome():
     print("This will:")
     print("1. Detect faces in images from 'faces/' folder")
     print("2. Extract facial features (128D embeddings)")
-    print("3. Save embeddings to 'embeddings/' folder")
+    print("3. Save embeddings to 'embeddings/gallery.bin'")
     print("="*60)
 
 def check_dependencies():
@@ -27,7 +36,93 @@ def check_dependencies():
         print("\n📦 Install with: pip install facenet-pytorch torch torchvision")
         return False
 
+GALLERY_PATH = 'embeddings/gallery.bin'
+MANIFEST_PATH = 'embeddings/manifest.json'
+PROGRESS_LOG = 'embeddings/register_progress.log'
+SUPPORTED_FORMATS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Register faces from the 'faces/' folder")
+    parser.add_argument('--batch-size', type=int, default=16, help="faces per MTCNN/FaceNet batch")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help="image hashing/decoding threads")
+    parser.add_argument('--force', action='store_true', help="re-embed every image, ignoring the manifest")
+    parser.add_argument('--detector', choices=DETECTORS, default=config.FACE_DETECTOR, help="face detector")
+    parser.add_argument('--detector-model', default=config.FACE_DETECTOR_MODEL, help="cascade/DNN model file")
+    return parser.parse_args()
+
+def load_manifest():
+    """Manifest of {file name: {sha256, name, status, reason}} plus any entries from an interrupted run"""
+    manifest = {}
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH) as f:
+            manifest = json.load(f)
+    resumed = 0
+    if os.path.exists(PROGRESS_LOG):
+        with open(PROGRESS_LOG) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn last line from a crash
+                manifest[entry.pop('file')] = entry
+                resumed += 1
+    return manifest, resumed
+
+def append_progress(entries):
+    """Record finished images durably so a crash mid-run loses at most one batch"""
+    with open(PROGRESS_LOG, 'a') as f:
+        f.writelines(json.dumps(entry) + "\n" for entry in entries)
+        f.flush()
+        os.fsync(f.fileno())
+
+def save_manifest(manifest):
+    tmp_path = MANIFEST_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, MANIFEST_PATH)
+    if os.path.exists(PROGRESS_LOG):
+        os.remove(PROGRESS_LOG)
+
+def hash_file(path):
+    with open(path, 'rb') as f:
+        return path, hashlib.sha256(f.read()).hexdigest()
+
+def load_image(path):
+    try:
+        return path, Image.open(path).convert('RGB'), None
+    except Exception as e:
+        return path, None, str(e)
+
+def embed_batch(mtcnn, detector, model, device, images):
+    """Detect faces and embed them in one forward pass; returns an embedding (or None) per image"""
+    faces = [None] * len(images)
+    # MTCNN only batches images of identical size
+    by_size = {}
+    for i, img in enumerate(images):
+        by_size.setdefault(img.size, []).append(i)
+    for indexes in by_size.values():
+        arrays = [np.asarray(images[i]) for i in indexes]
+        # Largest face per image, aligned by MTCNN whichever detector found it
+        boxes = [None if found is None else found[0][:1] for found in detector.detect_batch(arrays)]
+        detected = mtcnn.extract(arrays, boxes, None)
+        for i, face in zip(indexes, detected):
+            faces[i] = face
+
+    found = [i for i, face in enumerate(faces) if face is not None]
+    embeddings = [None] * len(images)
+    if found:
+        with torch.no_grad():
+            batch = model(torch.stack([faces[i] for i in found]).to(device)).detach().cpu().numpy()
+        batch = batch / np.linalg.norm(batch, axis=1, keepdims=True)
+        for i, embedding in zip(found, batch):
+            embeddings[i] = embedding.reshape(1, -1)
+    return embeddings
+
 def main():
+    args = parse_args()
     display_welcome()
     
     if not check_dependencies():
@@ -44,6 +139,51 @@ def main():
         input("\nPress Enter to exit...")
         return
     
+    # Get all image files
+    faces_dir = Path('faces')
+    image_files = sorted(f for f in faces_dir.glob('*') if f.suffix.lower() in SUPPORTED_FORMATS)
+    
+    print(f"\n📁 Found {len(image_files)} image(s) in 'faces/' folder")
+    
+    if not image_files:
+        print("❌ No valid images found.")
+        return
+    
+    gallery = Gallery(GALLERY_PATH)
+    migrated = gallery.import_npy_dir('embeddings')
+    if migrated:
+        print(f"📦 Migrated {migrated} legacy embedding file(s) into {GALLERY_PATH}")
+    
+    # Skip images whose content is unchanged since they were last processed
+    manifest, resumed = load_manifest()
+    if resumed:
+        print(f"↩️  Resuming: {resumed} image(s) recovered from the interrupted run")
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    hashes = dict(pool.map(hash_file, image_files))
+    pending = []
+    unchanged = 0
+    for img_path in image_files:
+        entry = manifest.get(img_path.name)
+        up_to_date = (
+            entry is not None and entry['sha256'] == hashes[img_path]
+            and (entry['status'] == 'failed' or img_path.stem in gallery)
+        )
+        if up_to_date and not args.force:
+            unchanged += 1
+        else:
+            pending.append(img_path)
+    # Forget images that were deleted from faces/
+    for file in set(manifest) - {p.name for p in image_files}:
+        del manifest[file]
+    
+    print(f"⏭️  Unchanged since last run: {unchanged}")
+    print(f"🆕 To process: {len(pending)}")
+    
+    if not pending:
+        save_manifest(manifest)
+        print("\n✅ Everything is up to date!")
+        return
+    
     # Initialize device
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     print(f"\n📊 Using device: {device}")
@@ -63,6 +203,9 @@ def main():
             device=device
         )
         
+        detector = load_detector(args.detector, args.detector_model, mtcnn=mtcnn)
+        print(f"🔍 Face detector: {detector.name}")
+        
         print("🔄 Loading face recognition model (FaceNet)...")
         model = InceptionResnetV1(pretrained='vggface2').eval().to(device)
         
@@ -71,57 +214,66 @@ def main():
         print("📦 Make sure facenet-pytorch is properly installed.")
         return
     
-    # Get all image files
-    faces_dir = Path('faces')
-    supported_formats = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
-    image_files = [f for f in faces_dir.glob('*') if f.suffix.lower() in supported_formats]
-    
-    print(f"\n📁 Found {len(image_files)} image(s) in 'faces/' folder")
-    
-    if not image_files:
-        print("❌ No valid images found.")
-        return
-    
-    print("\n🔄 Processing faces...")
+    print(f"\n🔄 Processing faces (batch size {args.batch_size}, {args.workers} worker(s))...")
     print("-" * 50)
     
     success_count = 0
     failed_count = 0
     failed_files = []
     
-    for idx, img_path in enumerate(image_files, 1):
+    batches = [pending[i:i + args.batch_size] for i in range(0, len(pending), args.batch_size)]
+    started = time.perf_counter()
+    # Decode the next batch on the worker threads while the current one is embedded
+    prefetch = ThreadPoolExecutor(max_workers=1)
+    decode = lambda batch: list(pool.map(load_image, batch))
+    next_batch = prefetch.submit(decode, batches[0])
+    for idx, batch in enumerate(batches):
+        loaded = next_batch.result()
+        if idx + 1 < len(batches):
+            next_batch = prefetch.submit(decode, batches[idx + 1])
+    
+        entries = []
+        enrolled = []
+        decoded = [(path, img) for path, img, error in loaded if error is None]
+        for path, img, error in loaded:
+            if error is not None:
+                failed_files.append((path.name, error))
+                entries.append({'file': path.name, 'sha256': hashes[path], 'name': path.stem,
+                                'status': 'failed', 'reason': error})
+    
         try:
-            print(f"[{idx}/{len(image_files)}] Processing: {img_path.name}...", end=" ")
-            
-            # Load and convert image
-            img = Image.open(img_path).convert('RGB')
-            
-            # Detect and align face
-            face = mtcnn(img)
-            
-            if face is None:
-                print("❌ No face detected")
-                failed_count += 1
-                failed_files.append((img_path.name, "No face detected"))
-            else:
-                # Generate embedding
-                with torch.no_grad():
-                    embedding = model(face.unsqueeze(0).to(device)).detach().cpu().numpy()
-                
-                # Normalize embedding
-                embedding = embedding / np.linalg.norm(embedding)
-                
-                # Save embedding
-                name = img_path.stem
-                output_path = f'embeddings/{name}_embedding.npy'
-                np.save(output_path, embedding)
-                print(f"✅ Registered as '{name}'")
-                success_count += 1
-                
+            embeddings = embed_batch(mtcnn, detector, model, device, [img for _, img in decoded]) if decoded else []
         except Exception as e:
-            print(f"❌ Error: {str(e)[:50]}...")
-            failed_count += 1
-            failed_files.append((img_path.name, str(e)))
+            embeddings = [e] * len(decoded)
+    
+        for (path, _), embedding in zip(decoded, embeddings):
+            entry = {'file': path.name, 'sha256': hashes[path], 'name': path.stem}
+            if isinstance(embedding, np.ndarray):
+                enrolled.append((path.stem, embedding, path.stem))
+                entries.append({**entry, 'status': 'registered'})
+                success_count += 1
+            else:
+                reason = "No face detected" if embedding is None else str(embedding)
+                failed_files.append((path.name, reason))
+                entries.append({**entry, 'status': 'failed', 'reason': reason})
+        failed_count = len(failed_files)
+    
+        gallery.add_many(enrolled)
+        append_progress(entries)
+        for entry in entries:
+            manifest[entry['file']] = {k: v for k, v in entry.items() if k != 'file'}
+    
+        processed = sum(len(b) for b in batches[:idx + 1])
+        rate = processed / (time.perf_counter() - started)
+        print(f"[{processed}/{len(pending)}] ✅ {success_count} registered, ❌ {failed_count} failed "
+              f"({rate:.1f} images/sec)")
+    
+    prefetch.shutdown()
+    pool.shutdown()
+    # Fold this run's enrollments into the memory-mapped matrix for fast startup
+    gallery.compact()
+    save_manifest(manifest)
+    elapsed = time.perf_counter() - started
     
     # Display summary
     print("\n" + "="*50)
@@ -129,20 +281,20 @@ def main():
     print("="*50)
     print(f"✅ Successfully registered: {success_count} face(s)")
     print(f"❌ Failed: {failed_count} face(s)")
+    print(f"⏭️  Skipped (unchanged): {unchanged} face(s)")
+    print(f"⚡ Throughput: {len(pending) / elapsed:.1f} images/sec")
     
     if failed_files:
         print("\n⚠️  Failed files:")
         for file, reason in failed_files:
             print(f"   • {file}: {reason}")
     
-    print(f"\n📁 Embeddings saved in: embeddings/")
+    print(f"\n📁 Embeddings saved in: {GALLERY_PATH}")
     
     # List registered people
     if success_count > 0:
-        embedding_files = [f for f in os.listdir('embeddings') if f.endswith('_embedding.npy')]
         print(f"\n👤 Registered people:")
-        for emb_file in embedding_files:
-            name = emb_file.replace('_embedding.npy', '')
+        for name in gallery.ids:
             print(f"   • {name}")
     
     print("\n✅ Registration complete!")
@@ -2,6 +2,8 @@ import subprocess
 import sys
 import os
 
+from shared_modules import vendor
+
 def run_command(command):
     """Run shell command and return success status"""
     try:
@@ -72,6 +74,16 @@ def main():
     for folder in folders:
         os.makedirs(folder, exist_ok=True)
         print(f"✅ Verified: {folder}/")
+
+    # Gallery, ANN index, detectors and gate protocol come from backend/services
+    print(f"\n{'='*40}")
+    print("🔗 Vendoring modules shared with the backend...")
+    try:
+        copied = vendor()
+        print(f"✅ Vendored: {', '.join(copied)}" if copied else "✅ Shared modules are up to date")
+    except OSError as e:
+        print(f"❌ {e}")
+        fail_count += 1
     
     # Summary
     print(f"\n{'='*60}")
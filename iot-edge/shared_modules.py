@@ -0,0 +1,56 @@
+"""
+Modules the edge shares with the backend. backend/services holds the only
+committed copy; they are vendored into this folder at setup time.
+
+    python shared_modules.py            # copy missing or outdated modules
+    python shared_modules.py --check    # exit 1 when a copy differs from its source
+
+setup_iot_edge.py runs the copy step. When the edge folder is deployed on
+its own, copy the files listed in SHARED_MODULES from backend/services.
+"""
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+
+SHARED_MODULES = ("gallery.py", "ann_index.py", "face_detectors.py", "gate_protocol.py")
+EDGE_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_SERVICES = os.path.join(os.path.dirname(EDGE_DIR), "backend", "services")
+
+
+def stale_modules(source_dir=BACKEND_SERVICES, target_dir=EDGE_DIR):
+    """Shared modules missing from target_dir or differing from source_dir"""
+    stale = []
+    for name in SHARED_MODULES:
+        target = os.path.join(target_dir, name)
+        if not os.path.exists(target) or not filecmp.cmp(os.path.join(source_dir, name), target, shallow=False):
+            stale.append(name)
+    return stale
+
+
+def vendor(source_dir=BACKEND_SERVICES, target_dir=EDGE_DIR):
+    """Copy every stale shared module; returns the names copied"""
+    if not os.path.isdir(source_dir):
+        raise FileNotFoundError(f"Backend services not found at {source_dir}")
+    copied = stale_modules(source_dir, target_dir)
+    for name in copied:
+        shutil.copy2(os.path.join(source_dir, name), os.path.join(target_dir, name))
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vendor the modules shared with backend/services")
+    parser.add_argument("--check", action="store_true", help="only report modules that differ from the backend")
+    args = parser.parse_args()
+    if args.check:
+        stale = stale_modules()
+        for name in stale:
+            print(f"❌ {name} is missing or differs from backend/services/{name}")
+        sys.exit(1 if stale else 0)
+    copied = vendor()
+    print(f"✅ Vendored {', '.join(copied)}" if copied else "✅ Shared modules are up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timezone
+
+import config
+
+# Upper bounds (ms) of the histogram buckets shipped with every summary; the last bucket is open
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+SENSOR_TYPE = "gate_telemetry"
+# Backend limit per /sensors/batch call (MAX_BATCH_READINGS in backend/routes/sensors.py)
+MAX_BATCH_READINGS = 500
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; percentiles are read from the bucket bounds"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def percentile(self, pct):
+        target = pct / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS + (self.max,), self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class Telemetry:
+    """
+    Per-gate performance counters, shipped as compact summaries.
+    Stages record durations (record) and frames are counted (frame); every
+    interval the current window is turned into one gate_telemetry reading
+    per metric and posted in a single /sensors/batch call. Windows that
+    cannot be delivered are kept (up to max_pending) and retried in chunks
+    the backend accepts; readings it rejects outright (4xx) are dropped.
+    """
+
+    def __init__(self, api, device_id=config.GATE_ID, interval=config.TELEMETRY_INTERVAL_SECONDS, max_pending=500):
+        self.api = api
+        self.device_id = device_id
+        self.interval = interval
+        self.max_pending = max_pending
+        self._histograms = {}
+        self._frames = 0
+        self._window_start = time.time()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def record(self, metric, seconds):
+        with self._lock:
+            histogram = self._histograms.get(metric)
+            if histogram is None:
+                histogram = self._histograms[metric] = Histogram()
+            histogram.add(seconds * 1000)
+
+    def frame(self):
+        with self._lock:
+            self._frames += 1
+
+    def _summarize(self):
+        """Close the current window; returns its readings"""
+        now = time.time()
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+            frames, self._frames = self._frames, 0
+            window_start, self._window_start = self._window_start, now
+        window = max(now - window_start, 1e-6)
+        window_end = datetime.fromtimestamp(now, timezone.utc).replace(tzinfo=None).isoformat()
+
+        readings = [{
+            "device_id": self.device_id, "sensor_type": SENSOR_TYPE, "value": round(frames / window, 2),
+            "unit": "fps", "metadata": {"metric": "fps", "frames": frames, "window_s": round(window, 1),
+                                        "window_end": window_end},
+        }]
+        for metric, histogram in sorted(histograms.items()):
+            readings.append({
+                "device_id": self.device_id,
+                "sensor_type": SENSOR_TYPE,
+                "value": round(histogram.percentile(95), 1),
+                "unit": "ms",
+                "metadata": {
+                    "metric": metric,
+                    "count": histogram.count,
+                    "avg_ms": round(histogram.total / histogram.count, 1),
+                    "p50_ms": round(histogram.percentile(50), 1),
+                    "p95_ms": round(histogram.percentile(95), 1),
+                    "max_ms": round(histogram.max, 1),
+                    "buckets_ms": list(BUCKETS_MS),
+                    "counts": histogram.counts,
+                    "window_s": round(window, 1),
+                    "window_end": window_end,
+                },
+            })
+        return readings
+
+    def flush(self):
+        """Ship the current window plus anything left over from failed sends"""
+        self._pending.extend(self._summarize())
+        while self._pending:
+            chunk = self._pending[:MAX_BATCH_READINGS]
+            status = self.api.post_sensor_batch(chunk)
+            if status is None or status == 408 or status == 429 or status >= 500:
+                self._pending = self._pending[-self.max_pending:]
+                logging.warning(f"Telemetry upload failed, {len(self._pending)} readings queued for retry")
+                return
+            if status != 200:
+                # Retrying would be rejected the same way
+                logging.warning(f"Telemetry batch rejected with HTTP {status}, dropping {len(chunk)} readings")
+            del self._pending[:len(chunk)]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.warning(f"Telemetry flush error: {e}")
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+        try:
+            self.flush()
+        except Exception as e:
+            logging.warning(f"Final telemetry flush failed: {e}")
@@ -1,8 +1,21 @@
 import pyttsx3
 import logging
+import queue
+import threading
 
 class VoiceFeedback:
-    def __init__(self):
+    """Text-to-speech on its own thread so announcements never hold up the gate"""
+
+    def __init__(self, max_pending=2):
+        self.engine = None
+        self.max_pending = max_pending
+        self._queue = queue.Queue()
+        self._ready = threading.Event()
+        threading.Thread(target=self._run, name="voice", daemon=True).start()
+        self._ready.wait(timeout=5)
+
+    def _run(self):
+        # pyttsx3 engines must be driven from the thread that created them
         try:
             self.engine = pyttsx3.init()
             # Set properties if needed
@@ -11,10 +24,25 @@ class VoiceFeedback:
         except Exception as e:
             logging.warning(f"Voice Feedback could not be initialized: {e}")
             self.engine = None
+        self._ready.set()
+
+        while True:
+            text = self._queue.get()
+            if text is None:
+                break
+            if self.engine:
+                self.engine.say(text)
+                self.engine.runAndWait()
 
     def speak(self, text):
-        """Audible feedback for the user"""
+        """Audible feedback for the user (queued; stale prompts are dropped)"""
         print(f"🔊 [VOICE] {text}")
-        if self.engine:
-            self.engine.say(text)
-            self.engine.runAndWait()
+        while self._queue.qsize() >= self.max_pending:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._queue.put(text)
+
+    def close(self):
+        self._queue.put(None)